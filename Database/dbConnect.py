@@ -1,25 +1,256 @@
+import itertools
+import logging
 import os
-from dotenv import load_dotenv
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Annotated
-from fastapi import Depends
-from sqlalchemy import create_engine
+from fastapi import Depends, HTTPException, Request
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.orm import Session, declarative_base, sessionmaker
-load_dotenv()
+from config.config import settings
+
+logger = logging.getLogger(__name__)
 
 Base = declarative_base()
 
-DB_URL = os.environ.get("DB_URL")
+DB_URL = settings.DB_URL
 if not DB_URL:
     raise ValueError("DB_URL environment variable is not set, need .env file")
 
-engine = create_engine(DB_URL, connect_args={"check_same_thread": False}) #translates python->sql
+
+def make_engine(url: str):
+    if url.startswith("sqlite"):
+        # check_same_thread is a sqlite-only connect arg
+        return create_engine(url, connect_args={"check_same_thread": False})
+    pool_args = {"pool_size": settings.DB_POOL_SIZE} if settings.DB_POOL_SIZE else {}
+    return create_engine(url, pool_pre_ping=True, **pool_args)
+
+
+engine = make_engine(DB_URL) #translates python->sql (primary, all writes go here)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False)  # bound per session to a replica
+
+
+class ReplicaRouter:
+    """
+    Round-robin over read replicas, skipping any that are unreachable or lagging
+
+    Falls back to the primary engine when no replica is usable. Health is probed by
+    refresh(), every REPLICA_CHECK_INTERVAL on a background job (main.py), so pick() never
+    waits on a replica. Locally you can point DB_READ_URLS at a copy of the primary sqlite
+    file to exercise the routing.
+    """
+
+    def __init__(self, urls: list[str]):
+        self.engines = [make_engine(url) for url in urls]
+        self._counter = itertools.count()
+        self._healthy = None  # one bool per replica once refresh() has run
+        self._lock = threading.Lock()
+
+    def _lag_seconds(self, replica) -> float:
+        with replica.connect() as conn:
+            if replica.dialect.name == "postgresql":
+                # caught up when everything received has been replayed: an idle primary sends
+                # nothing, so the age of the last replayed transaction alone would keep growing
+                lag = conn.execute(text(
+                    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+                )).scalar()
+                return float(lag)
+            conn.execute(text("SELECT 1"))
+            return 0.0
+
+    def refresh(self):
+        """Probe every replica's reachability and lag"""
+        healthy = []
+        for i, replica in enumerate(self.engines):
+            try:
+                healthy.append(self._lag_seconds(replica) <= settings.REPLICA_MAX_LAG_SECONDS)
+            except Exception as e:
+                logger.warning(f"Read replica {i} unavailable: {e}")
+                healthy.append(False)
+        self._healthy = healthy
+
+    def pick(self):
+        if self.engines and self._healthy is None:
+            # a process without the background job (CLI tools): probe once, up front
+            with self._lock:
+                if self._healthy is None:
+                    self.refresh()
+        for _ in range(len(self.engines)):
+            i = next(self._counter) % len(self.engines)
+            if self._healthy[i]:
+                return self.engines[i]
+        return engine
+
+
+replicas = ReplicaRouter(settings.DB_READ_URLS)
+
+
+# tables every store shares, always on the primary whichever store a session is for
+GLOBAL_TABLES = {"users", "admins", "idempotency_keys"}
+
+
+class StoreSession(Session):
+    """
+    Session for a store with its own database
+
+    Store tables (orders, items, reviews, rollups, ...) go to the store's engine, the
+    GLOBAL_TABLES to info["global_bind"] (the primary, or a replica for reads). Loader
+    options must not JOIN across the two, use selectinload for e.g. Order.user.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if mapper is not None:
+            table = getattr(inspect(mapper), "local_table", None)
+            if table is not None and table.name in GLOBAL_TABLES:
+                return self.info["global_bind"]
+        return super().get_bind(mapper=mapper, clause=clause, **kw)
+
+
+class ShardRouter:
+    """
+    Maps each store to its database
+
+    Stores in STORE_DATABASES get their own engine, DEFAULT_STORE_ID lives on the primary. A store's orders, menu and stock live in one database, so one
+    store's lunch rush never waits on another store's write lock, and adding a store adds
+    capacity instead of load on the primary.
+    """
+
+    def __init__(self, urls: dict[int, str]):
+        self.engines = {store_id: make_engine(url) for store_id, url in urls.items()}
+        self._executor = None
+        self._executor_pid = None
+
+    def store_ids(self) -> list[int]:
+        return sorted({settings.DEFAULT_STORE_ID, *self.engines})
+
+    def engine(self, store_id: int):
+        return self.engines.get(store_id, engine)
+
+    def session(self, store_id: int | None = None) -> Session:
+        """Write session for a store (the default store if None)"""
+        store_id = settings.DEFAULT_STORE_ID if store_id is None else store_id
+        store_engine = self.engines.get(store_id)
+        if store_engine is None:
+            return SessionLocal(info={"store_id": store_id})
+        return StoreSession(bind=store_engine, autoflush=False, info={"store_id": store_id, "global_bind": engine})
+
+    def read_session(self, store_id: int | None = None) -> Session:
+        """Read session for a store, replicas only serve the store(s) on the primary"""
+        store_id = settings.DEFAULT_STORE_ID if store_id is None else store_id
+        store_engine = self.engines.get(store_id)
+        if store_engine is None:
+            return ReadSessionLocal(bind=replicas.pick(), info={"store_id": store_id})
+        return StoreSession(bind=store_engine, autoflush=False,
+                            info={"store_id": store_id, "global_bind": replicas.pick()})
+
+    def gather(self, fn, store_ids: list[int] | None = None) -> dict:
+        """
+        Scatter-gather: fn(read_session, store_id) for every store concurrently
+
+        Returns {store_id: result}. fn should return plain data, its session is closed
+        as soon as it returns.
+        """
+        store_ids = store_ids or self.store_ids()
+
+        def run(store_id):
+            db = self.read_session(store_id)
+            try:
+                return fn(db, store_id)
+            finally:
+                db.close()
 
-def get_db():
-    db = SessionLocal()
+        if len(store_ids) == 1:
+            return {store_ids[0]: run(store_ids[0])}
+        if self._executor_pid != os.getpid():
+            # threads don't survive a fork, build the pool in the process that uses it
+            self._executor = ThreadPoolExecutor(max_workers=settings.SHARD_GATHER_THREADS,
+                                                thread_name_prefix="shard-gather")
+            self._executor_pid = os.getpid()
+        futures = {store_id: self._executor.submit(run, store_id) for store_id in store_ids}
+        return {store_id: future.result() for store_id, future in futures.items()}
+
+
+shards = ShardRouter(settings.STORE_DATABASES)
+
+
+def store_of(db: Session | None) -> int:
+    """The store a session was opened for (the default store for None)"""
+    return db.info.get("store_id", settings.DEFAULT_STORE_ID) if db is not None else settings.DEFAULT_STORE_ID
+
+
+# In-process caches drop entries only once the write that changed them commits
+
+_commit_hooks = {}  # db.info key -> fn(db, values)
+
+
+def on_commit(key: str):
+    """Decorator: fn(db, values) runs after a commit, values = everything mark_changed() recorded under key"""
+    def register(fn):
+        _commit_hooks[key] = fn
+        return fn
+    return register
+
+
+def mark_changed(db: Session, key: str, values):
+    """Remember values until db commits (handed to the on_commit hook) or rolls back (forgotten)"""
+    db.info.setdefault(key, set()).update(values)
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(db):
+    changed = {key: db.info.pop(key) for key in _commit_hooks if db.info.get(key)}
+    for key, values in changed.items():
+        _commit_hooks[key](db, values)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(db):
+    for key in _commit_hooks:
+        db.info.pop(key, None)
+
+
+def read_session(store_id: int | None = None) -> Session:
+    """New session bound to a replica (or the primary if none are usable)"""
+    return shards.read_session(store_id)
+
+
+def request_store_id(request: Request) -> int:
+    """
+    The request's store: ?store_id=, else the X-Store-ID header, else DEFAULT_STORE_ID
+
+    A plain call from get_db / get_read_db rather than a dependency of its own: an extra
+    async dependency per request was enough to back up the checkout bulkhead under a rush.
+    """
+    raw = request.query_params.get("store_id") or request.headers.get("x-store-id")
+    if raw is None:
+        return settings.DEFAULT_STORE_ID
+    try:
+        store_id = int(raw)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="store_id must be an integer")
+    if store_id not in shards.store_ids():
+        raise HTTPException(status_code=404, detail=f"Unknown store {store_id}")
+    return store_id
+
+
+def get_db(request: Request):
+    db = shards.session(request_store_id(request))
     try:
         yield db
     finally:
         db.close()
 
-dbSession = Annotated[Session, Depends(get_db)]
\ No newline at end of file
+
+def get_read_db(request: Request):
+    db = read_session(request_store_id(request))
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+WriteSession = Annotated[Session, Depends(get_db)]
+ReadSession = Annotated[Session, Depends(get_read_db)]  # read-only endpoints, may be slightly stale
+dbSession = WriteSession
@@ -1,17 +1,22 @@
+import logging
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Float, Enum as SQLEnum, ForeignKey, Boolean, DateTime, event
-from sqlalchemy.orm import relationship, Session
+from sqlalchemy import Column, Integer, String, Float, Enum as SQLEnum, ForeignKey, Boolean, Date, DateTime, Index, event, func, select
+from sqlalchemy.orm import relationship, Session, column_property
 from pydantic import BaseModel, EmailStr, Field
 from .dbConnect import Base
+from config.config import settings
 from enum import Enum
 from owner.notifications import notify_order_ready, notify_order_cancelled
 
+logger = logging.getLogger(__name__)
+
 #Items
 class ItemResponse(BaseModel):
     id: int
     name: str
     price: float
     description: str | None = None
+    available: bool = True
 
     class Config:
         from_attributes = True
@@ -23,6 +28,10 @@ class Item(Base):
     name = Column(String, index=True)
     price = Column(Float)
     description = Column(String, nullable=True)
+    # sell-outs (Database/inventory.py): NULL daily_stock = unlimited
+    daily_stock = Column(Integer, nullable=True)
+    remaining = Column(Integer, nullable=True)
+    stock_day = Column(Date, nullable=True)  # day `remaining` was last reset
 
     reviews = relationship("Review", back_populates="item")
     order_items = relationship("OrderItem", back_populates="item")
@@ -49,14 +58,25 @@ class OrderResponse(BaseModel):
     phone_num: str | None
     items: list[OrderItemResponse] = []
     total_price: float
-    username: str
-    user_id: int
-    payment_status: str
-    stripe_session_id: str
+    username: str | None = None
+    user_id: int | None = None
+    payment_status: str | None = None
+    stripe_session_id: str | None = None
+    store_id: int | None = None
 
     class Config:
         from_attributes = True
 
+class OrderPage(BaseModel):
+    orders: list[OrderResponse]
+    next_cursor: int | None = None  # pass as ?before= to get the next page
+
+class CheckoutResponse(BaseModel):
+    order_id: int
+    checkout_url: str
+    total: float
+    message: str
+
 
 #request models for creation of orders
 class OrderItemCreate(BaseModel):
@@ -68,8 +88,15 @@ class OrderCreate(BaseModel):
     username: str
     items: list[OrderItemCreate]
 
+class OrderStatusUpdate(BaseModel):
+    order_ids: list[int] = Field(min_length=1, max_length=500)
+    status: OrderStatus
+
 class Order(Base):
     __tablename__ = "orders"
+    # AUTOINCREMENT: without it SQLite hands out max(id)+1, so archiving the newest orders
+    # would give their ids to the next ones (owner/archive.py rebuilds older files)
+    __table_args__ = {"sqlite_autoincrement": True}
     id = Column(Integer, primary_key=True)
     status = Column(SQLEnum(OrderStatus), nullable=False)
     user_id = Column(Integer, ForeignKey("users.user_id"))
@@ -77,9 +104,13 @@ class Order(Base):
     phone_num = Column(String, index=True)
     order_items = relationship("OrderItem", back_populates="order")
 
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     cancelled_at = Column(DateTime, nullable=True)
     stripe_session_id = Column(String, nullable=True)  # Stripe checkout session
     payment_status = Column(String, default="pending")  # pending, paid, refunded
+    paid_at = Column(DateTime, nullable=True, index=True)  # set by the Stripe webhook
+    # which location took the order; every store's orders live in its own database (dbConnect.shards)
+    store_id = Column(Integer, nullable=False, default=settings.DEFAULT_STORE_ID)
 
     def __repr__(self):
         return f"<Order(item='{self.id}', user_id='{self.user_id}')>"
@@ -87,15 +118,49 @@ class Order(Base):
 
 class OrderItem(Base):
     __tablename__ = "order_items"
+    __table_args__ = {"sqlite_autoincrement": True}
     id = Column(Integer, primary_key=True)
-    order_id = Column(Integer, ForeignKey("orders.id"))
+    order_id = Column(Integer, ForeignKey("orders.id"), index=True)
     item_id = Column(Integer, ForeignKey("items.id"), nullable=False)
     quantity = Column(Integer, default=1)
     price_at_order = Column(Float, nullable=False)
+    store_id = Column(Integer, nullable=False, default=settings.DEFAULT_STORE_ID)
 
     order = relationship("Order", back_populates="order_items")
     item = relationship("Item", back_populates="order_items")
 
+#Archived orders: DONE/CANCELLED orders older than ARCHIVE_AFTER_DAYS, moved here by
+#owner/archive.py so the hot tables stay small. Same columns and relationships as
+#Order/OrderItem, so serializers.order_response works on either.
+class ArchivedOrder(Base):
+    __tablename__ = "archived_orders"
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    status = Column(SQLEnum(OrderStatus), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.user_id"))
+    user = relationship("User")
+    phone_num = Column(String, index=True)
+    order_items = relationship("ArchivedOrderItem", order_by="ArchivedOrderItem.id")
+
+    created_at = Column(DateTime, index=True)
+    cancelled_at = Column(DateTime, nullable=True)
+    stripe_session_id = Column(String, nullable=True)
+    payment_status = Column(String)
+    paid_at = Column(DateTime, nullable=True)
+    store_id = Column(Integer, nullable=False, default=settings.DEFAULT_STORE_ID)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ArchivedOrderItem(Base):
+    __tablename__ = "archived_order_items"
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    order_id = Column(Integer, ForeignKey("archived_orders.id"), index=True)
+    item_id = Column(Integer, ForeignKey("items.id"), nullable=False)
+    quantity = Column(Integer)
+    price_at_order = Column(Float, nullable=False)
+    store_id = Column(Integer, nullable=False, default=settings.DEFAULT_STORE_ID)
+
+    item = relationship("Item")
+
 #Users
 class UserCreate(BaseModel):
     email: EmailStr
@@ -119,6 +184,24 @@ class User(Base):
     def __repr__(self):
         return f"<User(name=' {self.name}')>"
 
+# order history: newest-first range scan per user; status is included so the filter is answered from the index
+Index("ix_orders_user_id_id", Order.user_id, Order.id.desc(), Order.status)
+Index("ix_archived_orders_user_id_id", ArchivedOrder.user_id, ArchivedOrder.id.desc(), ArchivedOrder.status)
+
+# Deferred summaries for the admin list pages, only loaded when a query asks for them
+Order.item_count = column_property(
+    select(func.count(OrderItem.id)).where(OrderItem.order_id == Order.id).correlate_except(OrderItem).scalar_subquery(),
+    deferred=True,
+)
+OrderItem.item_name = column_property(
+    select(Item.name).where(Item.id == OrderItem.item_id).correlate_except(Item).scalar_subquery(),
+    deferred=True,
+)
+User.order_count = column_property(
+    select(func.count(Order.id)).where(Order.user_id == User.user_id).correlate_except(Order).scalar_subquery(),
+    deferred=True,
+)
+
 class Admin(Base):
     __tablename__ = "admins"
     id = Column(Integer, primary_key=True, index=True)
@@ -134,6 +217,10 @@ class ReviewResponse(BaseModel):
     rating: int = Field(ge=1, le=5)
     review_content: str | None
 
+class ReviewCreatedResponse(BaseModel):
+    message: str
+    review: int
+
 class ReviewCreate(BaseModel):
     item_id: int
     rating: int
@@ -157,6 +244,41 @@ class Review(Base):
     user = relationship("User", back_populates="reviews")
     item = relationship("Item", back_populates="reviews")
 
+# moderation queue: pending reviews oldest first is a range scan, not a table scan
+Index("ix_reviews_status_id", Review.status, Review.id)
+
+class ReviewStatusUpdate(BaseModel):
+    review_ids: list[int] = Field(min_length=1, max_length=500)
+    status: ReviewStatus
+
+#Sales rollups, maintained incrementally by owner/analytics.py
+class DailySales(Base):
+    __tablename__ = "daily_sales"
+    day = Column(Date, primary_key=True)
+    orders = Column(Integer, default=0, nullable=False)
+    revenue_cents = Column(Integer, default=0, nullable=False)
+    cancellations = Column(Integer, default=0, nullable=False)
+
+
+class DailyItemSales(Base):
+    __tablename__ = "daily_item_sales"
+    day = Column(Date, primary_key=True)
+    item_id = Column(Integer, ForeignKey("items.id"), primary_key=True)
+    units = Column(Integer, default=0, nullable=False)
+    revenue_cents = Column(Integer, default=0, nullable=False)
+    order_count = Column(Integer, default=0, nullable=False)
+    cancellations = Column(Integer, default=0, nullable=False)
+
+
+#Idempotency keys (stored responses for retried POSTs)
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    key = Column(String, primary_key=True)  # "<store_id>:<user_id>:<route>:<Idempotency-Key header>"
+    response_body = Column(String, nullable=True)  # NULL while the first request is still running
+    request_hash = Column(String, nullable=True)  # sha256 of the request body the key was first used with
+    created_at = Column(DateTime, default=datetime.utcnow)  # when the current claim was taken
+    expires_at = Column(DateTime, index=True)
+
 
 @event.listens_for(Order, "before_update")
 def send_sms_on_change(mapper, connection, target):
@@ -171,8 +293,8 @@ def send_sms_on_change(mapper, connection, target):
 
         if old_status != new_status:
             if new_status == OrderStatus.DONE:
-                print(f"📱 Sending 'ready' SMS for order #{target.id}")
+                logger.info("Order ready, sending SMS", extra={"order_id": target.id})
                 notify_order_ready(target.phone_num, target.id)
             elif new_status == OrderStatus.CANCELLED:
-                print(f"📱 Sending 'cancelled' SMS for order #{target.id}")
+                logger.info("Order cancelled, sending SMS", extra={"order_id": target.id})
                 notify_order_cancelled(target.phone_num, target.id)
@@ -0,0 +1,163 @@
+"""
+Per-item daily stock
+
+Items with a daily_stock get `remaining` reset to it once a day. Orders take units with a
+conditional UPDATE ... WHERE remaining >= :quantity (never read-modify-write), so two
+checkouts racing for the last Tres Leche can't both win. The same UPDATE does the day's
+reset itself if restock hasn't run yet since midnight, so yesterday's leftovers are never
+sold. Cancelled and reaped orders give their units back to the day they were taken from.
+Items without a daily_stock are unlimited, whatever `remaining` still says.
+
+Each worker keeps a bitmap of sold-out item ids per store so /items can flag them without
+a query. It is only a hint, refreshed by reservations in this process and from each
+store's database by the periodic restock job; the UPDATE is what decides.
+"""
+import threading
+from datetime import date, datetime, time
+
+from sqlalchemy import and_, case, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from .dbConnect import shards, store_of
+from .dbModels import Item, Order, OrderItem
+
+_sold_out = {}  # store_id -> bitmap, bit n set = item n is sold out
+_lock = threading.Lock()
+
+
+def stock_day() -> date:
+    # same clock as Order.created_at
+    return datetime.utcnow().date()
+
+
+def is_sold_out(item_id: int, store_id: int) -> bool:
+    return bool(_sold_out.get(store_id, 0) >> item_id & 1)
+
+
+def _mark(store_id: int, item_ids, sold_out: bool):
+    with _lock:
+        bitmap = _sold_out.get(store_id, 0)
+        for item_id in item_ids:
+            if sold_out:
+                bitmap |= 1 << item_id
+            else:
+                bitmap &= ~(1 << item_id)
+        _sold_out[store_id] = bitmap
+
+
+def reserve(db: Session, quantities: dict[int, int]) -> list[int]:
+    """
+    Take quantities ({item_id: units}) out of stock, caller commits
+
+    Returns the item ids that didn't have enough left, in which case nothing is taken
+    (so one sold-out order doesn't need a rollback that would undo others sharing the
+    transaction). Items without a daily_stock are unlimited.
+    """
+    short = []
+    taken = {}
+    emptied = []
+    today = stock_day()
+    unlimited = Item.daily_stock.is_(None)
+    # not reset for today yet (or stock only just set): count from daily_stock, not the leftovers
+    stale = or_(Item.stock_day.is_(None), Item.stock_day < today, Item.remaining.is_(None))
+    # same lock order in every transaction, so two orders can't deadlock on each other's rows
+    for item_id in sorted(quantities):
+        quantity = quantities[item_id]
+        row = db.execute(
+            update(Item)
+            .where(Item.id == item_id, or_(
+                unlimited,
+                and_(stale, Item.daily_stock >= quantity),
+                and_(~stale, Item.remaining >= quantity),
+            ))
+            .values(
+                remaining=case((unlimited, None), (stale, Item.daily_stock - quantity),
+                               else_=Item.remaining - quantity),
+                stock_day=case((unlimited, Item.stock_day), else_=today),
+            )
+            .returning(Item.remaining)
+        ).first()
+        if row is None:
+            short.append(item_id)
+            continue
+        taken[item_id] = quantity
+        if row.remaining is not None and row.remaining <= 0:
+            emptied.append(item_id)
+
+    if short:
+        for item_id, quantity in taken.items():
+            db.execute(
+                update(Item).where(Item.id == item_id, Item.remaining.is_not(None))
+                .values(remaining=Item.remaining + quantity)
+            )
+        left = db.execute(select(Item.id).where(Item.id.in_(short), Item.daily_stock.is_not(None),
+                                                Item.remaining <= 0)).scalars()
+        _mark(store_of(db), left, True)
+    else:
+        _mark(store_of(db), emptied, True)
+    return short
+
+
+def release(db: Session, order_ids: list[int]):
+    """Give back the units held by these orders (call before deleting them), caller commits"""
+    today = stock_day()
+    # yesterday's orders don't top up today's stock
+    rows = db.execute(
+        select(OrderItem.item_id, func.sum(OrderItem.quantity))
+        .join(Order, Order.id == OrderItem.order_id)
+        .where(OrderItem.order_id.in_(order_ids), Order.created_at >= datetime.combine(today, time.min))
+        .group_by(OrderItem.item_id)
+    ).all()
+
+    for item_id, quantity in rows:
+        restored = Item.remaining + quantity
+        db.execute(
+            update(Item)
+            .where(Item.id == item_id, Item.remaining.is_not(None), Item.stock_day == today)
+            .values(remaining=case((restored > Item.daily_stock, Item.daily_stock), else_=restored))
+        )
+    _mark(store_of(db), [item_id for item_id, _ in rows], False)
+
+
+def restock():
+    """
+    Reset items to their daily_stock on a new day, then reload the sold-out bitmaps
+
+    Items whose daily_stock was cleared lose their leftover `remaining` too. With several
+    workers only one runs this, the others call reload_sold_out().
+    """
+    today = stock_day()
+    for store_id in shards.store_ids():
+        db = shards.session(store_id)
+        try:
+            db.execute(
+                update(Item)
+                .where(Item.daily_stock.is_not(None), or_(Item.stock_day.is_(None), Item.stock_day < today))
+                .values(remaining=Item.daily_stock, stock_day=today)
+            )
+            db.execute(update(Item).where(Item.daily_stock.is_(None), Item.remaining.is_not(None))
+                       .values(remaining=None))
+            db.commit()
+        finally:
+            db.close()
+    reload_sold_out()
+
+
+def reload_sold_out():
+    """Rebuild this process's sold-out bitmaps from each store's database"""
+    today = stock_day()
+    for store_id in shards.store_ids():
+        db = shards.session(store_id)
+        try:
+            # an item that ran out on an earlier day is back in stock, even before restock resets it
+            sold_out = db.execute(
+                select(Item.id).where(Item.daily_stock.is_not(None), Item.remaining <= 0, Item.stock_day >= today)
+            ).scalars().all()
+        finally:
+            db.close()
+
+        bitmap = 0
+        for item_id in sold_out:
+            bitmap |= 1 << item_id
+        with _lock:
+            _sold_out[store_id] = bitmap
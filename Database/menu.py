@@ -0,0 +1,56 @@
+"""
+Per-store menu cache
+
+GET /items is the busiest read and every store has its own menu, so each worker keeps
+each store's item list for MENU_CACHE_SECONDS. Adding, editing or deleting an item drops
+that store's entry once the session commits (never on rollback). Availability is not
+part of the entry, it comes from the sold-out bitmap on every request.
+"""
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from config.config import settings
+from .dbConnect import mark_changed, on_commit, store_of
+from .dbModels import Item
+
+_cache = {}  # store_id -> (expires, [{"id", "name", "price", "description"}, ...])
+_lock = threading.Lock()
+
+
+def items(db: Session) -> list[dict]:
+    """The menu of the store db belongs to"""
+    store_id = store_of(db)
+    cached = _cache.get(store_id)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+
+    rows = [
+        {"id": item.id, "name": item.name, "price": item.price, "description": item.description}
+        for item in db.query(Item).order_by(Item.id)
+    ]
+    with _lock:
+        _cache[store_id] = (time.monotonic() + settings.MENU_CACHE_SECONDS, rows)
+    return rows
+
+
+def invalidate(store_id: int):
+    with _lock:
+        _cache.pop(store_id, None)
+
+
+@event.listens_for(Item, "after_insert")
+@event.listens_for(Item, "after_update")
+@event.listens_for(Item, "after_delete")
+def _item_flushed(mapper, connection, target):
+    db = Session.object_session(target)
+    if db is not None:
+        mark_changed(db, "menu_stores", [store_of(db)])
+
+
+@on_commit("menu_stores")
+def _after_commit(db, store_ids):
+    for store_id in store_ids:
+        invalidate(store_id)
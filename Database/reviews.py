@@ -0,0 +1,81 @@
+"""
+Approved reviews per item, cached per worker
+
+/items/{item_id}/reviews is read far more often than reviews change, so each worker keeps
+the approved list (and its count/average) per store and item for REVIEW_CACHE_SECONDS. Anything
+that changes a review's status marks its item on the session; the entries are dropped
+after that session commits (never on rollback). Other workers catch up when their copy
+expires. Only the REVIEW_CACHE_MAX_ITEMS most recently read items are kept, so crawling
+every item id can't grow the cache without bound.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from config.config import settings
+from .dbConnect import mark_changed, on_commit, store_of
+from .dbModels import Review, ReviewStatus
+
+_cache = OrderedDict()  # LRU, (store_id, item_id) -> (expires, {"reviews": [...], "count": n, "average": x})
+_lock = threading.Lock()
+
+
+def approved(db: Session, item_id: int) -> dict:
+    """{"reviews": [...], "count", "average"} for one item's approved reviews"""
+    key = (store_of(db), item_id)
+    with _lock:
+        cached = _cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            _cache.move_to_end(key)
+            return cached[1]
+
+    rows = db.query(Review).filter(Review.item_id == item_id, Review.status == ReviewStatus.APPROVED).all()
+    reviews = [
+        {"id": r.id, "rating": r.rating, "comment": r.comment, "status": r.status,
+         "user_id": r.user_id, "item_id": r.item_id}
+        for r in rows
+    ]
+    ratings = [r["rating"] for r in reviews if r["rating"] is not None]
+    entry = {
+        "reviews": reviews,
+        "count": len(reviews),
+        "average": round(sum(ratings) / len(ratings), 2) if ratings else None,
+    }
+    with _lock:
+        _cache[key] = (time.monotonic() + settings.REVIEW_CACHE_SECONDS, entry)
+        _cache.move_to_end(key)
+        while len(_cache) > settings.REVIEW_CACHE_MAX_ITEMS:
+            _cache.popitem(last=False)
+    return entry
+
+
+def invalidate(keys):
+    """Drop cached reviews for these (store_id, item_id) pairs"""
+    with _lock:
+        for key in keys:
+            _cache.pop(key, None)
+
+
+def changed(db: Session, item_ids):
+    """Drop these items' cached reviews once db commits (bulk UPDATEs have to call this)"""
+    store_id = store_of(db)
+    mark_changed(db, "review_items", ((store_id, item_id) for item_id in item_ids if item_id is not None))
+
+
+@event.listens_for(Review, "after_insert")
+@event.listens_for(Review, "after_update")
+@event.listens_for(Review, "after_delete")
+def _review_flushed(mapper, connection, target):
+    # single-row edits and deletes (sqladmin forms) go through the ORM
+    db = Session.object_session(target)
+    if db is not None:
+        moved_from = inspect(target).attrs.item_id.history.deleted
+        changed(db, [target.item_id, *moved_from])
+
+
+@on_commit("review_items")
+def _after_commit(db, keys):
+    invalidate(keys)
@@ -0,0 +1,145 @@
+"""
+Full-text menu search
+
+SQLite: an FTS5 table over items(name, description) kept in sync by triggers.
+Postgres: a GIN index on to_tsvector('simple', name || ' ' || description).
+Every term is prefix matched ("emp chick" finds "Empanada (Chicken/Potato)"), results are
+ranked with bm25 / ts_rank, and a query with no hits is retried once with each term
+replaced by the closest indexed word to absorb small typos. The words to pick from are
+cached per store like the menu (MENU_CACHE_SECONDS, dropped when an item is written).
+"""
+import difflib
+import re
+import threading
+import time
+
+from sqlalchemy import Integer, event, func, or_, text
+from sqlalchemy.orm import Session
+
+from config.config import settings
+from .dbConnect import mark_changed, on_commit, store_of
+from .dbModels import Item
+
+_vocabularies = {}  # store_id -> (expires, [word, ...])
+_lock = threading.Lock()
+
+_SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5("
+    "name, description, content='items', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS items_fts_vocab USING fts5vocab(items_fts, 'row')",
+    "CREATE TRIGGER IF NOT EXISTS items_fts_ai AFTER INSERT ON items BEGIN "
+    "INSERT INTO items_fts(rowid, name, description) VALUES (new.id, new.name, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS items_fts_ad AFTER DELETE ON items BEGIN "
+    "INSERT INTO items_fts(items_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS items_fts_au AFTER UPDATE ON items BEGIN "
+    "INSERT INTO items_fts(items_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description); "
+    "INSERT INTO items_fts(rowid, name, description) VALUES (new.id, new.name, new.description); END",
+    # the items table may have been recreated (seeding) underneath the index
+    "INSERT INTO items_fts(items_fts) VALUES ('rebuild')",
+]
+
+_PG_DOCUMENT = "coalesce(name, '') || ' ' || coalesce(description, '')"
+_PG_DDL = [
+    f"CREATE INDEX IF NOT EXISTS ix_items_search ON items USING GIN (to_tsvector('simple', {_PG_DOCUMENT}))",
+]
+
+
+def ensure_index(engine):
+    """Create the search index/triggers if missing, safe to run on every startup"""
+    statements = {"sqlite": _SQLITE_DDL, "postgresql": _PG_DDL}.get(engine.dialect.name, [])
+    with engine.begin() as conn:
+        for statement in statements:
+            conn.execute(text(statement))
+
+
+def _terms(q: str) -> list[str]:
+    return re.findall(r"\w+", q.lower())[:8]
+
+
+def _pg_document():
+    return func.to_tsvector("simple", func.coalesce(Item.name, "") + " " + func.coalesce(Item.description, ""))
+
+
+def item_filter(q: str, dialect: str):
+    """WHERE clause on Item matching every term of q as a prefix (used by sqladmin too)"""
+    terms = _terms(q)
+    if not terms:
+        return None
+    if dialect == "sqlite":
+        ids = text("SELECT rowid FROM items_fts WHERE items_fts MATCH :q").bindparams(
+            q=" ".join(f'"{term}"*' for term in terms)
+        ).columns(rowid=Integer)
+        return Item.id.in_(ids)
+    if dialect == "postgresql":
+        return _pg_document().op("@@")(func.to_tsquery("simple", " & ".join(f"{term}:*" for term in terms)))
+    return or_(*(Item.name.ilike(f"%{term}%") | Item.description.ilike(f"%{term}%") for term in terms))
+
+
+def _ranked(db: Session, terms: list[str], limit: int) -> list[Item]:
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        return db.query(Item).from_statement(text(
+            "SELECT items.* FROM items_fts JOIN items ON items.id = items_fts.rowid "
+            "WHERE items_fts MATCH :q ORDER BY bm25(items_fts, 10.0, 1.0) LIMIT :limit"
+        ).bindparams(q=" ".join(f'"{term}"*' for term in terms), limit=limit)).all()
+
+    query = db.query(Item).filter(item_filter(" ".join(terms), dialect))
+    if dialect == "postgresql":
+        rank = func.ts_rank(_pg_document(), func.to_tsquery("simple", " & ".join(f"{term}:*" for term in terms)))
+        query = query.order_by(rank.desc())
+    return query.limit(limit).all()
+
+
+def _vocabulary(db: Session) -> list[str]:
+    """Every indexed word of the store's menu"""
+    store_id = store_of(db)
+    cached = _vocabularies.get(store_id)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+
+    if db.get_bind().dialect.name == "sqlite":
+        words = [term for (term,) in db.execute(text("SELECT term FROM items_fts_vocab"))]
+    else:
+        words = set()
+        for name, description in db.query(Item.name, Item.description):
+            words.update(_terms(f"{name or ''} {description or ''}"))
+        words = list(words)
+    with _lock:
+        _vocabularies[store_id] = (time.monotonic() + settings.MENU_CACHE_SECONDS, words)
+    return words
+
+
+def search_items(db: Session, q: str, limit: int = 20) -> list[Item]:
+    terms = _terms(q)
+    if not terms:
+        return []
+
+    items = _ranked(db, terms, limit)
+    if items:
+        return items
+
+    # typo fallback: swap each term for its closest indexed word and try once more
+    vocabulary = _vocabulary(db)
+    corrected = []
+    for term in terms:
+        match = difflib.get_close_matches(term, vocabulary, n=1, cutoff=0.7)
+        corrected.append(match[0] if match else term)
+    if corrected == terms:
+        return []
+    return _ranked(db, corrected, limit)
+
+
+@event.listens_for(Item, "after_insert")
+@event.listens_for(Item, "after_update")
+@event.listens_for(Item, "after_delete")
+def _item_flushed(mapper, connection, target):
+    db = Session.object_session(target)
+    if db is not None:
+        mark_changed(db, "vocabulary_stores", [store_of(db)])
+
+
+@on_commit("vocabulary_stores")
+def _after_commit(db, store_ids):
+    with _lock:
+        for store_id in store_ids:
+            _vocabularies.pop(store_id, None)
@@ -0,0 +1,92 @@
+"""
+Fast ORM -> JSON for response models
+
+Rows we just read from our own database don't need validating, so responses are built
+with model_construct and dumped with precompiled TypeAdapters straight into a Response,
+which also skips FastAPI's second pass against response_model. Set
+STRICT_RESPONSE_VALIDATION=true to validate everything again while debugging.
+"""
+from fastapi import Response
+from pydantic import TypeAdapter
+from sqlalchemy.orm import joinedload, object_session, selectinload
+
+from config.config import settings
+from . import inventory
+from .dbConnect import store_of
+from .dbModels import (ArchivedOrder, ArchivedOrderItem, Item, ItemResponse, Order, OrderItem, OrderItemResponse,
+                       OrderPage, OrderResponse)
+
+item_adapter = TypeAdapter(ItemResponse)
+item_list_adapter = TypeAdapter(list[ItemResponse])
+order_adapter = TypeAdapter(OrderResponse)
+order_list_adapter = TypeAdapter(list[OrderResponse])
+order_page_adapter = TypeAdapter(OrderPage)
+
+# loader options for queries whose orders are serialized with order_response(); users
+# live on the primary while a store's orders may not, so they're loaded separately
+ORDER_RESPONSE_OPTIONS = (
+    selectinload(Order.order_items).joinedload(OrderItem.item).load_only(Item.name),
+    selectinload(Order.user),
+)
+ARCHIVED_ORDER_RESPONSE_OPTIONS = (
+    selectinload(ArchivedOrder.order_items).joinedload(ArchivedOrderItem.item).load_only(Item.name),
+    selectinload(ArchivedOrder.user),
+)
+
+
+def _build(model, **fields):
+    if settings.STRICT_RESPONSE_VALIDATION:
+        return model(**fields)
+    return model.model_construct(**fields)
+
+
+def item_response(item: Item, store_id: int | None = None) -> ItemResponse:
+    if store_id is None:
+        store_id = store_of(object_session(item))
+    return _build(ItemResponse, id=item.id, name=item.name, price=item.price, description=item.description,
+                  available=not inventory.is_sold_out(item.id, store_id))
+
+
+def menu_response(rows: list[dict], store_id: int) -> list[ItemResponse]:
+    """ItemResponses for cached menu rows (Database/menu.py), with current availability"""
+    return [_build(ItemResponse, **row, available=not inventory.is_sold_out(row["id"], store_id)) for row in rows]
+
+
+def order_response(order: Order | ArchivedOrder) -> OrderResponse:
+    items = []
+    total_price = 0
+    for o_item in order.order_items:
+        items.append(_build(
+            OrderItemResponse,
+            id=o_item.id,
+            item_id=o_item.item_id,
+            item_name=o_item.item.name,
+            quantity=o_item.quantity,
+            price=o_item.price_at_order,
+        ))
+        total_price += o_item.price_at_order * o_item.quantity
+
+    return _build(
+        OrderResponse,
+        id=order.id,
+        status=order.status,
+        phone_num=order.phone_num,
+        items=items,
+        total_price=total_price,
+        username=order.user.name if order.user else None,
+        user_id=order.user_id,
+        payment_status=order.payment_status,
+        stripe_session_id=order.stripe_session_id,
+        store_id=order.store_id,
+    )
+
+
+def order_page(orders: list[Order], next_cursor: int | None) -> OrderPage:
+    return _build(OrderPage, orders=[order_response(order) for order in orders], next_cursor=next_cursor)
+
+
+def respond(adapter: TypeAdapter, value):
+    """JSON Response for value, or value itself (validated by FastAPI) in strict mode"""
+    if settings.STRICT_RESPONSE_VALIDATION:
+        return value
+    return Response(content=adapter.dump_json(value), media_type="application/json")
@@ -0,0 +1,122 @@
+"""
+sqladmin list page render time against a large order table
+
+    python benchmarks/admin_list.py --orders 100000
+
+Builds a throwaway SQLite database, then times the tuned admin list views from
+owner/admin.py against a plain view that shows the full relationships
+(the old OrderAdmin/UserAdmin column lists).
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_db_dir = tempfile.mkdtemp(prefix="jbites-bench-")
+os.environ["DB_URL"] = f"sqlite:///{_db_dir}/admin_list.db"
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqladmin import Admin, ModelView  # noqa: E402
+
+from Database.dbConnect import Base, engine  # noqa: E402
+from Database.dbModels import Item, Order, OrderItem, OrderStatus, User  # noqa: E402
+from owner.admin import OrderAdmin, OrderItemAdmin, UserAdmin  # noqa: E402
+
+
+class PlainOrderAdmin(ModelView, model=Order):
+    name = "Plain Order"
+    column_list = [Order.id, Order.user, Order.status, Order.phone_num, Order.order_items, Order.payment_status]
+
+
+class PlainUserAdmin(ModelView, model=User):
+    name = "Plain User"
+    column_list = [User.user_id, User.name, User.email, User.orders]
+
+
+class PlainOrderItemAdmin(ModelView, model=OrderItem):
+    name = "Plain Order Item"
+    column_list = [OrderItem.id, OrderItem.order_id, OrderItem.item, OrderItem.quantity, OrderItem.price_at_order]
+
+
+# the ModelView metaclass derives identity from the model, set it afterwards to get separate URLs
+PlainOrderAdmin.identity = "plain-order"
+PlainUserAdmin.identity = "plain-user"
+PlainOrderItemAdmin.identity = "plain-order-item"
+
+
+def populate(orders: int, users: int = 2000):
+    Base.metadata.create_all(engine)
+    rng = random.Random(42)
+    with engine.begin() as conn:
+        conn.execute(Item.__table__.insert(), [{"id": i, "name": f"Item {i}", "price": 3.99} for i in range(1, 21)])
+        conn.execute(User.__table__.insert(), [
+            {"user_id": i, "name": f"User {i}", "email": f"user{i}@example.com", "password": "x"}
+            for i in range(1, users + 1)
+        ])
+        line_id = 1
+        for start in range(1, orders + 1, 10_000):
+            order_rows, line_rows = [], []
+            for order_id in range(start, min(start + 10_000, orders + 1)):
+                order_rows.append({
+                    "id": order_id, "status": OrderStatus.DONE.name, "user_id": rng.randint(1, users),
+                    "phone_num": f"555-{order_id % 10_000:04d}", "payment_status": "paid",
+                })
+                for _ in range(rng.randint(1, 4)):
+                    line_rows.append({
+                        "id": line_id, "order_id": order_id, "item_id": rng.randint(1, 20),
+                        "quantity": rng.randint(1, 3), "price_at_order": 3.99,
+                    })
+                    line_id += 1
+            conn.execute(Order.__table__.insert(), order_rows)
+            conn.execute(OrderItem.__table__.insert(), line_rows)
+    return line_id - 1
+
+
+def time_page(client, url: str, runs: int) -> float:
+    client.get(url)  # warm up
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        response = client.get(url)
+        samples.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.status_code
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=100_000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--page-size", type=int, default=50)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    lines = populate(args.orders)
+    print(f"Populated {args.orders} orders / {lines} lines in {time.perf_counter() - started:.1f}s")
+
+    app = FastAPI()
+    admin = Admin(app, engine)
+    for view in (OrderAdmin, UserAdmin, OrderItemAdmin, PlainOrderAdmin, PlainUserAdmin, PlainOrderItemAdmin):
+        admin.add_view(view)
+
+    client = TestClient(app)
+    query = f"?page=2&pageSize={args.page_size}"
+    print(f"median of {args.runs} renders, page size {args.page_size}")
+    for name, tuned, plain in [
+        ("orders", "order", "plain-order"),
+        ("users", "user", "plain-user"),
+        ("order items", "order-item", "plain-order-item"),
+    ]:
+        tuned_ms = time_page(client, f"/admin/{tuned}/list{query}", args.runs)
+        plain_ms = time_page(client, f"/admin/{plain}/list{query}", args.runs)
+        print(f"  {name:12s} tuned {tuned_ms:7.1f} ms   plain {plain_ms:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
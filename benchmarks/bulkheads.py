@@ -0,0 +1,88 @@
+"""
+Menu read latency while logins saturate the server, with and without bulkheads
+
+    python benchmarks/bulkheads.py --logins 60 --reads 40
+
+Each mode runs in a fresh interpreter (settings are read at import): --logins clients
+hammer POST /login (real bcrypt) while a few clients time GET /items. Prints read p50/p99
+and how the logins fared (200 / 503 when the auth bulkhead's wait budget ran out).
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def child(logins: int, reads: int):
+    sys.path.insert(0, ROOT)
+    from fastapi.testclient import TestClient
+
+    from Database.dbConnect import Base, SessionLocal, engine
+    from Database.dbModels import Item, User
+    from middleware.security import hash_password
+
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    db.add_all(Item(name=f"Item {n}", price=5.0) for n in range(30))
+    db.add(User(name="Load", email="load@example.com", password=hash_password("hunter22")))
+    db.commit()
+    db.close()
+
+    import main as app_module
+
+    with TestClient(app_module.app) as client:
+        done = threading.Event()
+        login_statuses = Counter()
+
+        def login(_):
+            while not done.is_set():
+                response = client.post("/login", json={"name": "Load", "email": "load@example.com", "password": "hunter22"})
+                login_statuses[response.status_code] += 1
+
+        def read(_):
+            started = time.perf_counter()
+            client.get("/items")
+            return time.perf_counter() - started
+
+        with ThreadPoolExecutor(logins) as login_pool, ThreadPoolExecutor(4) as read_pool:
+            for n in range(logins):
+                login_pool.submit(login, n)
+            time.sleep(1)  # let the logins fill the server
+            latencies = sorted(read_pool.map(read, range(reads)))
+            done.set()
+
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(f"reads p50 {p50:8.1f} ms  p99 {p99:8.1f} ms   logins {dict(login_statuses)}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=60, help="concurrent login clients")
+    parser.add_argument("--reads", type=int, default=40, help="GET /items requests to time")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.logins, args.reads)
+        return
+
+    for enabled in ("false", "true"):
+        db_dir = tempfile.mkdtemp(prefix="jbites-bulkheads-")
+        env = dict(os.environ, BULKHEADS_ENABLED=enabled, RATE_LIMIT_ENABLED="false", ENABLE_SMS="false",
+                   DB_URL=f"sqlite:///{db_dir}/bulkheads.db", SECRET_KEY="benchmark")
+        print(f"bulkheads {'on ' if enabled == 'true' else 'off'}: ", end="", flush=True)
+        subprocess.run([sys.executable, __file__, "--child", "--logins", str(args.logins), "--reads", str(args.reads)],
+                       cwd=ROOT, env=env, check=True, stderr=subprocess.DEVNULL)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""
+Microbenchmarks for the hot building blocks, with a saved baseline
+
+    python benchmarks/micro.py                      # compare against micro_baseline.json
+    python benchmarks/micro.py --save-baseline      # record this machine's numbers
+    python benchmarks/micro.py --tolerance 0.10 -k token
+
+Each case is timed timeit-style: the loop count is calibrated to ~0.1 s, then the best of
+--repeat runs is kept (the least noisy estimate on a busy laptop). Every run of a case is
+paired with a run of a fixed pure-Python calibration loop; the best calibration time of
+the whole run is saved with the baseline, and the baseline is scaled by how much faster or
+slower that loop runs now, so a baseline recorded on another machine still compares.
+
+The run exits 1 if any case is slower than its scaled baseline by more than --tolerance
+(MICROBENCH_TOLERANCE, default 25%) and by more than --noise-floor-ns
+(MICROBENCH_NOISE_FLOOR_NS, default 100 ns) per call: a case that takes ~90 ns swings by a
+few tens of ns from run to run, which is well over 25% of it but says nothing about the
+code. No network or database, well under a minute.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DB_URL", "sqlite://")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from config import providers  # noqa: E402
+from Database import serializers  # noqa: E402
+from Database.dbModels import OrderStatus  # noqa: E402
+from middleware.admin_sessions import SessionStore  # noqa: E402
+from middleware.auth_middleware import auth_middleware  # noqa: E402
+from middleware.security import create_access_token, decode_access_token, hash_password, verify_password  # noqa: E402
+from owner.notifications import normalize_phone  # noqa: E402
+from owner.payments import StripeService  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "micro_baseline.json")
+
+
+def _run(coro):
+    """Drive a coroutine that never really awaits (call_next below returns at once)"""
+    try:
+        coro.send(None)
+    except StopIteration as done:
+        return done.value
+    raise RuntimeError("coroutine suspended")
+
+
+def bench_hash_password():
+    return lambda: hash_password("correct horse battery")
+
+
+def bench_verify_password():
+    hashed = hash_password("correct horse battery")
+    return lambda: verify_password("correct horse battery", hashed)
+
+
+def bench_create_access_token():
+    return lambda: create_access_token({"sub": "jordan@jbites.com", "is_admin": True})
+
+
+def bench_decode_access_token():
+    token = create_access_token({"sub": "jordan@jbites.com"})
+    return lambda: decode_access_token(token)
+
+
+def bench_auth_middleware_routes():
+    paths = ["/items", "/items/12", "/orders/search/555-1234", "/static/app.js", "/health", "/me/orders"]
+    requests = [SimpleNamespace(url=SimpleNamespace(path=path), headers={}) for path in paths]
+
+    async def call_next(request):
+        return None
+
+    def run():
+        for request in requests:
+            _run(auth_middleware(request, call_next))
+    return run
+
+
+def bench_admin_session_lookup():
+    # what an /admin page costs for auth now: one LRU hit
+    store = SessionStore()
+    sid = store.create(1, "jordan@jbites.com")
+    return lambda: store.get(sid)
+
+
+def bench_admin_session_signed_cookie():
+    # for comparison, what SessionMiddleware did on every request: unsign + decode the cookie
+    import base64
+    import itsdangerous
+    signer = itsdangerous.TimestampSigner(os.environ["SECRET_KEY"])
+    cookie = signer.sign(base64.b64encode(json.dumps({"admin_email": "jordan@jbites.com", "is_admin": True}).encode()))
+    return lambda: json.loads(base64.b64decode(signer.unsign(cookie, max_age=14 * 24 * 3600)))
+
+
+def _fake_orders(count: int, lines: int = 4):
+    user = SimpleNamespace(name="Jordan")
+    orders = []
+    for n in range(count):
+        order_items = [
+            SimpleNamespace(id=n * lines + i, item_id=i, item=SimpleNamespace(name=f"Item {i}"), quantity=2,
+                            price_at_order=5.5 + i)
+            for i in range(lines)
+        ]
+        orders.append(SimpleNamespace(id=n, status=OrderStatus.PENDING, phone_num="+15555550100",
+                                      order_items=order_items, user=user, user_id=1,
+                                      payment_status="paid", stripe_session_id=f"cs_{n}", store_id=1))
+    return orders
+
+
+def bench_order_response_by_phone():
+    # what get_order_by_phone does for a customer with 10 orders, minus the query
+    orders = _fake_orders(10)
+    return lambda: serializers.order_list_adapter.dump_json([serializers.order_response(o) for o in orders])
+
+
+class _FakeStripe:
+    class error:
+        StripeError = Exception
+
+    class checkout:
+        class Session:
+            @staticmethod
+            def create(**kwargs):
+                return SimpleNamespace(url="https://checkout.test/session")
+
+
+def bench_create_checkout():
+    providers.override("stripe", _FakeStripe)
+    items = [{"name": f"Item {i}", "quantity": 1 + i % 3, "price": 4.25 + i} for i in range(8)]
+    return lambda: StripeService.create_checkout(1, items, "+15555550100", "https://ok", "https://cancel")
+
+
+def bench_normalize_phone_cached():
+    return lambda: normalize_phone("(555) 123-4567")
+
+
+def bench_normalize_phone_uncached():
+    return lambda: normalize_phone.__wrapped__("(555) 123-4567")
+
+
+def _calibration():
+    """The yardstick, not a case: dict, str and list churn with nothing of ours in it"""
+    words = [f"item-{n}" for n in range(64)]
+
+    def run():
+        counts = {}
+        for word in words:
+            counts[word.upper()] = counts.get(word, 0) + len(word)
+        sorted(counts.items())
+    return run
+
+
+CASES = {name[len("bench_"):]: fn for name, fn in globals().items() if name.startswith("bench_")}
+
+
+def _loops(fn, target: float) -> int:
+    """How many calls of fn take about `target` seconds"""
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= target or loops >= 1_000_000:
+            return loops
+        loops *= 10 if elapsed < target / 10 else 2
+
+
+def _time(fn, loops: int) -> float:
+    started = time.perf_counter()
+    for _ in range(loops):
+        fn()
+    return (time.perf_counter() - started) / loops
+
+
+def measure(fn, repeat: int, target: float = 0.1) -> tuple[float, float]:
+    """Best seconds per call over `repeat` runs, and the calibration loop's best alongside them"""
+    calibrate = _calibration()
+    loops, calibration_loops = _loops(fn, target), _loops(calibrate, target / 2)
+    best = calibration = float("inf")
+    for _ in range(repeat):
+        calibration = min(calibration, _time(calibrate, calibration_loops))
+        best = min(best, _time(fn, loops))
+    return best, calibration
+
+
+def _fmt(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:7.2f} {unit}"
+    return f"{seconds / 1e-9:7.1f} ns"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-k", dest="filter", help="only cases whose name contains this")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=float(os.getenv("MICROBENCH_TOLERANCE", "0.25")))
+    parser.add_argument("--noise-floor-ns", type=float, default=float(os.getenv("MICROBENCH_NOISE_FLOOR_NS", "100")),
+                        help="ignore slowdowns smaller than this per call, whatever the percentage")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args()
+
+    baseline = {}
+    saved = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            saved = json.load(f)
+        baseline = saved["cases"]
+        if saved.get("python") != platform.python_version() or saved.get("machine") != platform.machine():
+            print(f"note: baseline was recorded on Python {saved.get('python')} / {saved.get('machine')}")
+
+    results = {}
+    calibration = float("inf")
+    for name, setup in CASES.items():
+        if args.filter and args.filter not in name:
+            continue
+        results[name], case_calibration = measure(setup(), args.repeat)
+        calibration = min(calibration, case_calibration)
+    scale = calibration / saved["calibration"] if saved.get("calibration") else 1.0
+
+    regressions = []
+    print(f"calibration loop {_fmt(calibration)}, baseline scaled x{scale:.2f} to this machine")
+    print(f"{'case':<30}{'per call':>12}{'baseline':>12}{'change':>9}")
+    for name, seconds in results.items():
+        line = f"{name:<30}{_fmt(seconds):>12}"
+        if name in baseline and not args.save_baseline:
+            expected = baseline[name] * scale
+            change = seconds / expected - 1
+            line += f"{_fmt(expected):>12}{change:>+8.0%}"
+            if change > args.tolerance and (seconds - expected) * 1e9 > args.noise_floor_ns:
+                line += "  REGRESSION"
+                regressions.append(name)
+        print(line)
+
+    if args.save_baseline:
+        # cases kept from the old baseline are rescaled to this run's calibration
+        cases = {**{name: seconds * scale for name, seconds in baseline.items()}, **results}
+        with open(args.baseline, "w") as f:
+            json.dump({"recorded": datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(),
+                       "machine": platform.machine(), "calibration": calibration, "cases": cases}, f, indent=2)
+            f.write("\n")
+        print(f"baseline saved to {args.baseline}")
+    elif regressions:
+        sys.exit(f"{len(regressions)} case(s) slower than baseline by more than {args.tolerance:.0%} "
+                 f"(and {args.noise_floor_ns:.0f} ns): "
+                 f"{', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Order ingestion: one commit per request vs the group-commit writer
+
+    python benchmarks/order_ingest.py --clients 1 10 50 100 200 --orders-per-client 10
+
+Each client thread places orders back to back against a throwaway SQLite file (on disk,
+so every commit pays for its fsync). "direct" is what create_order does by default,
+"group" goes through owner.ingest.OrderWriter. Prints orders/s, p50/p99 latency and
+errors (lock timeouts) per concurrency level. Pass --db-url to try Postgres.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 10, 50, 100, 200])
+    parser.add_argument("--orders-per-client", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--linger-ms", type=float, default=0)
+    parser.add_argument("--db-url", help="defaults to a new SQLite file under the system temp dir")
+    args = parser.parse_args()
+
+    os.environ["DB_URL"] = args.db_url or f"sqlite:///{tempfile.mkdtemp(prefix='jbites-ingest-')}/ingest.db"
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+
+    from Database.dbConnect import Base, SessionLocal, engine
+    from Database.dbModels import Item, OrderCreate, User
+    from owner.ingest import OrderWriter, write_order
+
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    db.add_all(Item(name=f"Item {n}", price=4.0 + n) for n in range(20))
+    db.add_all(User(name=f"Customer {n}", email=f"c{n}@example.com", password="x") for n in range(max(args.clients)))
+    db.commit()
+    db.close()
+
+    def order(n: int) -> OrderCreate:
+        return OrderCreate(phone_num="+15555550100", username="bench",
+                           items=[{"item_id": 1 + n % 20, "quantity": 1}, {"item_id": 1 + (n + 7) % 20, "quantity": 2}])
+
+    def direct(user_id: int, data: OrderCreate):
+        db = SessionLocal()
+        try:
+            write_order(db, user_id, data)
+            db.commit()
+        finally:
+            db.close()
+
+    def run(clients: int, place) -> tuple[float, list[float], int]:
+        latencies = []
+        errors = 0
+
+        def client(user_id: int):
+            nonlocal errors
+            for n in range(args.orders_per_client):
+                started = time.perf_counter()
+                try:
+                    place(user_id, order(user_id + n))
+                except Exception:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(clients) as pool:
+            list(pool.map(client, range(1, clients + 1)))
+        return time.perf_counter() - started, sorted(latencies), errors
+
+    writer = OrderWriter(batch_size=args.batch_size, linger=args.linger_ms / 1000)
+    modes = [("direct", direct), ("group", lambda user_id, data: writer.submit(user_id, data).result())]
+
+    print(f"{'clients':>7} {'mode':<7}{'orders/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    for clients in args.clients:
+        for name, place in modes:
+            elapsed, latencies, errors = run(clients, place)
+            if latencies:
+                p50 = statistics.median(latencies) * 1000
+                p99 = latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1000
+            else:
+                p50 = p99 = float("nan")
+            print(f"{clients:>7} {name:<7}{len(latencies) / elapsed:>10.1f}{p50:>9.1f}{p99:>9.1f}{errors:>8}")
+    writer.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+"Frequently bought together": in-memory co-occurrence vs a self-join per request
+
+    python benchmarks/recommendations.py --orders 1000000 --items 40
+
+Fills a throwaway SQLite file with paid orders (1-4 distinct items each, popularity
+skewed like a real menu), then times:
+  - the full rebuild (what `python -m owner.recommendations rebuild` does)
+  - writing and loading the snapshot, and its size
+  - an incremental catch-up after 1,000 more orders are paid
+  - recommend() for every item vs the equivalent self-join on order_items
+and checks that both give the same top items.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SELF_JOIN = """
+    SELECT b.item_id, COUNT(*) AS together
+    FROM order_items a
+    JOIN order_items b ON b.order_id = a.order_id AND b.item_id != a.item_id
+    JOIN orders o ON o.id = a.order_id
+    WHERE a.item_id = :item_id AND o.payment_status = 'paid'
+    GROUP BY b.item_id
+    ORDER BY together DESC, b.item_id
+    LIMIT 3
+"""
+
+
+def fill(engine, first_order: int, orders: int, items: int, paid_at: datetime, rng: random.Random):
+    weights = [1 / (rank + 1) for rank in range(items)]
+    order_rows, line_rows = [], []
+    for order_id in range(first_order, first_order + orders):
+        order_rows.append((order_id, "DONE", 1, "+15555550100", "paid", paid_at, paid_at))
+        basket = set(rng.choices(range(1, items + 1), weights, k=rng.randint(1, 4)))
+        line_rows.extend((order_id, item_id, 1, 5.0) for item_id in basket)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO orders (id, status, user_id, phone_num, payment_status, created_at, paid_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)", order_rows)
+        conn.exec_driver_sql(
+            "INSERT INTO order_items (order_id, item_id, quantity, price_at_order) VALUES (?, ?, ?, ?)", line_rows)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    parser.add_argument("--items", type=int, default=40)
+    parser.add_argument("--join-queries", type=int, default=5, help="self-joins to time (each scans order_items)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="jbites-recs-")
+    os.environ["DB_URL"] = f"sqlite:///{workdir}/recs.db"
+    os.environ["RECOMMENDATIONS_SNAPSHOT_PATH"] = f"{workdir}/recommendations.snapshot"
+    os.environ["RECOMMENDATIONS_SYNC_LAG_SECONDS"] = "0"
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+
+    from sqlalchemy import text
+    from Database.dbConnect import Base, SessionLocal, engine
+    from Database.dbModels import Item, User
+    from owner.recommendations import CoOccurrence, catch_up, rebuild
+
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    db.add_all(Item(name=f"Item {n}", price=5.0) for n in range(1, args.items + 1))
+    db.add(User(name="Customer", email="c@example.com", password="x"))
+    db.commit()
+
+    rng = random.Random(47)
+    started = time.perf_counter()
+    chunk = 100_000
+    for first in range(1, args.orders + 1, chunk):
+        fill(engine, first, min(chunk, args.orders + 1 - first), args.items, datetime.utcnow() - timedelta(days=1), rng)
+    print(f"generated {args.orders:,} paid orders in {time.perf_counter() - started:.1f} s")
+
+    started = time.perf_counter()
+    matrix = rebuild(db)
+    print(f"full rebuild                 {time.perf_counter() - started:8.2f} s")
+
+    path = os.environ["RECOMMENDATIONS_SNAPSHOT_PATH"]
+    started = time.perf_counter()
+    matrix.save(path)
+    saved = time.perf_counter() - started
+    started = time.perf_counter()
+    loaded = CoOccurrence.load(path)
+    print(f"snapshot save / load         {saved * 1000:8.1f} ms / {(time.perf_counter() - started) * 1000:.1f} ms"
+          f"  ({os.path.getsize(path) / 1024:.1f} KiB)")
+
+    fill(engine, args.orders + 1, 1_000, args.items, datetime.utcnow(), rng)
+    started = time.perf_counter()
+    catch_up(db, loaded)
+    print(f"catch-up after 1,000 orders  {(time.perf_counter() - started) * 1000:8.1f} ms")
+
+    timings = []
+    for item_id in range(1, args.items + 1):
+        started = time.perf_counter()
+        loaded.top(item_id, 3)
+        timings.append(time.perf_counter() - started)
+    cold = statistics.median(timings)
+    started = time.perf_counter()
+    for _ in range(100):
+        for item_id in range(1, args.items + 1):
+            loaded.top(item_id, 3)
+    warm = (time.perf_counter() - started) / (100 * args.items)
+    print(f"recommend() first / cached   {cold * 1e6:8.1f} us / {warm * 1e6:.2f} us")
+
+    timings = []
+    mismatches = 0
+    for item_id in range(1, min(args.join_queries, args.items) + 1):
+        started = time.perf_counter()
+        rows = db.execute(text(SELF_JOIN), {"item_id": item_id}).all()
+        timings.append(time.perf_counter() - started)
+        if [tuple(row) for row in rows] != [tuple(pair) for pair in loaded.top(item_id, 3)]:
+            mismatches += 1
+    print(f"self-join per request        {statistics.median(timings) * 1000:8.1f} ms")
+    print("results match" if not mismatches else f"{mismatches} item(s) disagree with the self-join")
+    db.close()
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Response serialization cost per response type
+
+    python benchmarks/serialization.py --rows 1000 --repeat 20
+
+Times the old path (model_validate on every row, then FastAPI validating the result
+against response_model again before dumping it) against Database/serializers.py
+(model_construct + one TypeAdapter.dump_json). Rows are plain namespaces, so only
+the serialization is measured, not the database.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("DB_URL", "sqlite://")
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+
+from Database import serializers  # noqa: E402
+from Database.dbModels import ItemResponse, OrderItemResponse, OrderResponse, OrderStatus  # noqa: E402
+
+
+def fake_items(n):
+    return [SimpleNamespace(id=i, name=f"Item {i}", price=9.5 + i % 7, description="Crispy, spicy, hot.")
+            for i in range(n)]
+
+
+def fake_orders(n, lines=3):
+    menu = fake_items(20)
+    user = SimpleNamespace(name="Jordan")
+    orders = []
+    for i in range(n):
+        order_items = [SimpleNamespace(id=i * lines + j, item_id=menu[j].id, item=menu[j], quantity=2,
+                                       price_at_order=menu[j].price) for j in range(lines)]
+        orders.append(SimpleNamespace(id=i, status=OrderStatus.PENDING, phone_num="+15555550100",
+                                      order_items=order_items, user=user, user_id=1,
+                                      payment_status="paid", stripe_session_id=f"cs_{i}"))
+    return orders
+
+
+def validated_order(order):
+    items = [OrderItemResponse(id=o.id, item_id=o.item_id, item_name=o.item.name, quantity=o.quantity,
+                               price=o.price_at_order) for o in order.order_items]
+    return OrderResponse(id=order.id, status=order.status, phone_num=order.phone_num, items=items,
+                         total_price=sum(o.price_at_order * o.quantity for o in order.order_items),
+                         username=order.user.name, user_id=order.user_id,
+                         payment_status=order.payment_status, stripe_session_id=order.stripe_session_id)
+
+
+def old_path(adapter, build, rows):
+    # what FastAPI does with a response_model: validate the returned value, then encode it
+    value = adapter.validate_python([build(row) for row in rows], from_attributes=True)
+    return jsonable_encoder(adapter.dump_python(value, mode="json"))
+
+
+def fast_path(adapter, build, rows):
+    return adapter.dump_json([build(row) for row in rows])
+
+
+def timeit(fn, repeat):
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - start)
+    return statistics.median(runs) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    cases = [
+        ("items", TypeAdapter(list[ItemResponse]), ItemResponse.model_validate, serializers.item_response,
+         fake_items(args.rows)),
+        ("orders", TypeAdapter(list[OrderResponse]), validated_order, serializers.order_response,
+         fake_orders(args.rows)),
+    ]
+
+    print(f"{'response':<10}{'validated ms':>14}{'fast ms':>10}{'speedup':>10}")
+    for name, adapter, slow_build, fast_build, rows in cases:
+        slow = timeit(lambda: old_path(adapter, slow_build, rows), args.repeat)
+        fast = timeit(lambda: fast_path(adapter, fast_build, rows), args.repeat)
+        print(f"{name:<10}{slow:>14.2f}{fast:>10.2f}{slow / fast:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
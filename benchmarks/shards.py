@@ -0,0 +1,112 @@
+"""
+Store shards: the same lunch rush against one database vs one database per store
+
+    python benchmarks/shards.py --stores 4 --clients 40 --orders-per-client 20
+
+Builds --stores throwaway SQLite files (store 1 on DB_URL, the rest in STORE_DATABASES),
+each with the same menu. Client threads place orders back to back, one commit per order
+like create_order does by default:
+  - "1 db"     every client writes to store 1, so all of them queue on one write lock
+  - "sharded"  clients are spread over the stores, each store has its own lock
+Then times a cross-store phone lookup, one query after another vs shards.gather.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stores", type=int, default=4)
+    parser.add_argument("--clients", type=int, default=40)
+    parser.add_argument("--orders-per-client", type=int, default=20)
+    parser.add_argument("--lookups", type=int, default=200)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="jbites-shards-")
+    os.environ["DB_URL"] = f"sqlite:///{workdir}/store1.db"
+    os.environ["STORE_DATABASES"] = ",".join(f"{n}=sqlite:///{workdir}/store{n}.db" for n in range(2, args.stores + 1))
+    os.environ["ORDER_GROUP_COMMIT"] = "false"
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+
+    from Database.dbConnect import Base, SessionLocal, shards
+    from Database.dbModels import Item, OrderCreate, User
+    from owner.archive import orders_by_phone
+    from owner.ingest import write_order
+
+    for store_id in shards.store_ids():
+        Base.metadata.create_all(shards.engine(store_id))
+        db = shards.session(store_id)
+        db.add_all(Item(name=f"Item {n}", price=4.0 + n) for n in range(20))
+        db.commit()
+        db.close()
+    db = SessionLocal()
+    db.add_all(User(name=f"Customer {n}", email=f"c{n}@example.com", password="x") for n in range(args.clients))
+    db.commit()
+    db.close()
+
+    def order(n: int) -> OrderCreate:
+        return OrderCreate(phone_num=f"+1555555{n % 1000:04d}", username="bench",
+                           items=[{"item_id": 1 + n % 20, "quantity": 1}, {"item_id": 1 + (n + 7) % 20, "quantity": 2}])
+
+    def run(store_for) -> tuple[float, list[float], int]:
+        latencies = []
+        errors = 0
+
+        def client(user_id: int):
+            nonlocal errors
+            for n in range(args.orders_per_client):
+                started = time.perf_counter()
+                db = shards.session(store_for(user_id))
+                try:
+                    write_order(db, user_id, order(user_id + n))
+                    db.commit()
+                except Exception:
+                    errors += 1
+                    continue
+                finally:
+                    db.close()
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(args.clients) as pool:
+            list(pool.map(client, range(1, args.clients + 1)))
+        return time.perf_counter() - started, sorted(latencies), errors
+
+    stores = shards.store_ids()
+    modes = [("1 db", lambda user_id: stores[0]), ("sharded", lambda user_id: stores[user_id % len(stores)])]
+    print(f"{args.clients} clients, {len(stores)} stores")
+    print(f"{'mode':<9}{'orders/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    for name, store_for in modes:
+        elapsed, latencies, errors = run(store_for)
+        p50 = statistics.median(latencies) * 1000 if latencies else float("nan")
+        p99 = latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1000 if latencies else float("nan")
+        print(f"{name:<9}{len(latencies) / elapsed:>10.1f}{p50:>9.1f}{p99:>9.1f}{errors:>8}")
+
+    def lookup(db, store_id):
+        return len(orders_by_phone(db, "+15555550042"))
+
+    started = time.perf_counter()
+    for _ in range(args.lookups):
+        for store_id in stores:
+            db = shards.read_session(store_id)
+            try:
+                lookup(db, store_id)
+            finally:
+                db.close()
+    sequential = (time.perf_counter() - started) / args.lookups
+    started = time.perf_counter()
+    for _ in range(args.lookups):
+        shards.gather(lookup)
+    gathered = (time.perf_counter() - started) / args.lookups
+    print(f"phone lookup over {len(stores)} stores: one by one {sequential * 1000:.2f} ms, gather {gathered * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 import os
 from dotenv import load_dotenv
 
+# the only load_dotenv in the app, everything else reads from `settings`
 load_dotenv()
 
 
@@ -12,10 +13,34 @@ class Settings:
 
     # Security
     SECRET_KEY = os.getenv("SECRET_KEY")
-    STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
+    STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY") or os.getenv("SECRET_STR_KEY")
+    STRIPE_WEBHOOK_SECRET = os.getenv("SECRET_WEBHOOK")
 
     # Database
     DB_URL = os.getenv("DB_URL")
+    # Comma separated read replica URLs, empty means every read goes to DB_URL
+    DB_READ_URLS = [url.strip() for url in os.getenv("DB_READ_URLS", "").split(",") if url.strip()]
+    # Store shards: "2=sqlite:///store2.db,3=sqlite:///store3.db" gives each listed store its
+    # own database for orders, menu, stock, reviews and sales rollups (Database/dbConnect.py).
+    # Users, admins and idempotency keys always live on DB_URL. Requests pick a store with
+    # ?store_id= or X-Store-ID, DEFAULT_STORE_ID when they don't. The default store lives on
+    # DB_URL (it's the one the /admin panel edits) so it can't be listed.
+    DEFAULT_STORE_ID = int(os.getenv("DEFAULT_STORE_ID", "1"))
+    STORE_DATABASES = {
+        int(store.strip()): url.strip()
+        for store, url in (pair.split("=", 1) for pair in os.getenv("STORE_DATABASES", "").split(",") if "=" in pair)
+    }
+    SHARD_GATHER_THREADS = int(os.getenv("SHARD_GATHER_THREADS", "8"))  # concurrent queries for cross-store views
+    REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+    REPLICA_CHECK_INTERVAL = float(os.getenv("REPLICA_CHECK_INTERVAL", "10"))
+    # Connection pool per process (non-sqlite only), server.py derives it from DB_POOL_TOTAL / workers
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "0")) or None
+    DB_POOL_TOTAL = int(os.getenv("DB_POOL_TOTAL", "40"))
+
+    # Production server (server.py)
+    WEB_WORKERS = int(os.getenv("WEB_WORKERS", "0")) or None  # None = CPU count
+    DRAIN_SECONDS = float(os.getenv("DRAIN_SECONDS", "5"))  # /health reports draining before shutdown
+    GRACEFUL_TIMEOUT = float(os.getenv("GRACEFUL_TIMEOUT", "30"))
 
     # Twilio
     TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
@@ -26,9 +51,115 @@ class Settings:
     SEED_DATABASE = os.getenv("SEED_DATABASE", "false").lower() == "true"
     ENABLE_SMS = os.getenv("ENABLE_SMS", "true").lower() == "true"
 
+    # SMS dispatch (owner/notifications.py)
+    SMS_CONCURRENCY = int(os.getenv("SMS_CONCURRENCY", "8"))  # parallel Twilio requests
+    SMS_COALESCE_SECONDS = float(os.getenv("SMS_COALESCE_SECONDS", "1.0"))  # 0 sends every message on its own
+    SMS_RETRY_MAX_SECONDS = float(os.getenv("SMS_RETRY_MAX_SECONDS", "900"))  # texts held while Twilio is down
+
+    # Outbound calls: timeout budget per provider + circuit breakers (middleware/circuit_breaker.py)
+    STRIPE_TIMEOUT_SECONDS = float(os.getenv("STRIPE_TIMEOUT_SECONDS", "10"))
+    TWILIO_TIMEOUT_SECONDS = float(os.getenv("TWILIO_TIMEOUT_SECONDS", "5"))
+    BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))  # last N calls per provider
+    BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "5"))
+    BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+    BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+
+    # Logging (middleware/log.py): json lines or text, written from a background thread
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # json, text
+    LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))  # share of high-volume info lines kept
+
+    # Validate every response against its response_model (slow, for debugging serializers)
+    STRICT_RESPONSE_VALIDATION = os.getenv("STRICT_RESPONSE_VALIDATION", "false").lower() == "true"
+
     # Auth bypass (ONLY for local development with fake data)
     DISABLE_AUTH = os.getenv("DISABLE_AUTH", "false").lower() == "true"
 
+    # Idempotency-Key handling for POST /orders and /reviews
+    IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+    IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "30"))
+    # an unfinished claim older than this belongs to a worker that died, the next retry takes it over
+    IDEMPOTENCY_LEASE_SECONDS = float(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "60"))
+    IDEMPOTENCY_PURGE_INTERVAL = int(os.getenv("IDEMPOTENCY_PURGE_INTERVAL", "600"))
+
+    # Rate limiting / admission control for bcrypt and checkout routes
+    RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # memory, sqlite (shared between workers)
+    RATE_LIMIT_SQLITE_PATH = os.getenv("RATE_LIMIT_SQLITE_PATH", "rate_limits.db")
+    RATE_LIMIT_IP_PER_MINUTE = float(os.getenv("RATE_LIMIT_IP_PER_MINUTE", "30"))
+    RATE_LIMIT_IP_BURST = int(os.getenv("RATE_LIMIT_IP_BURST", "10"))
+    RATE_LIMIT_ACCOUNT_PER_MINUTE = float(os.getenv("RATE_LIMIT_ACCOUNT_PER_MINUTE", "10"))
+    RATE_LIMIT_ACCOUNT_BURST = int(os.getenv("RATE_LIMIT_ACCOUNT_BURST", "5"))
+    RATE_LIMIT_PURGE_INTERVAL = float(os.getenv("RATE_LIMIT_PURGE_INTERVAL", "600"))  # drop refilled buckets
+
+    # /admin panel sessions (middleware/admin_sessions.py): memory (one process) or sqlite
+    # (shared between workers, server.py picks it when running more than one)
+    ADMIN_SESSION_BACKEND = os.getenv("ADMIN_SESSION_BACKEND", "memory")
+    ADMIN_SESSION_SQLITE_PATH = os.getenv("ADMIN_SESSION_SQLITE_PATH", "admin_sessions.db")
+    ADMIN_SESSION_IDLE_SECONDS = float(os.getenv("ADMIN_SESSION_IDLE_SECONDS", str(8 * 3600)))  # sliding
+    ADMIN_SESSION_MAX_ENTRIES = int(os.getenv("ADMIN_SESSION_MAX_ENTRIES", "10000"))  # LRU per worker
+    ADMIN_SESSION_RECHECK_SECONDS = float(os.getenv("ADMIN_SESSION_RECHECK_SECONDS", "5"))  # sqlite only
+    ADMIN_SESSION_PURGE_INTERVAL = float(os.getenv("ADMIN_SESSION_PURGE_INTERVAL", "600"))
+
+    # Bulkheads: concurrent requests per route group (middleware/bulkhead.py), the
+    # threadpool is sized to their sum
+    BULKHEADS_ENABLED = os.getenv("BULKHEADS_ENABLED", "true").lower() == "true"
+    BULKHEADS = {
+        "auth": int(os.getenv("BULKHEAD_AUTH", "4")),  # bcrypt
+        "checkout": int(os.getenv("BULKHEAD_CHECKOUT", "8")),  # Stripe
+        "reads": int(os.getenv("BULKHEAD_READS", "24")),
+        "admin": int(os.getenv("BULKHEAD_ADMIN", "4")),
+        "webhooks": int(os.getenv("BULKHEAD_WEBHOOKS", "4")),
+    }
+    BULKHEAD_MAX_WAIT_SECONDS = float(os.getenv("BULKHEAD_MAX_WAIT_SECONDS", "2"))
+
+    # Stock is held from order creation until payment, so checkouts expire quickly (Stripe's
+    # expires_at, 30 min to 24 h) and give their units back when they do
+    CHECKOUT_EXPIRES_MINUTES = int(os.getenv("CHECKOUT_EXPIRES_MINUTES", "30"))
+
+    # Abandoned checkout reaper (owner/reaper.py), the backstop for a missed
+    # checkout.session.expired webhook. The margin past CHECKOUT_EXPIRES_MINUTES leaves
+    # time for a late checkout.session.completed
+    REAPER_TTL_MINUTES = int(os.getenv("REAPER_TTL_MINUTES", str(CHECKOUT_EXPIRES_MINUTES + 15)))
+    REAPER_INTERVAL_SECONDS = int(os.getenv("REAPER_INTERVAL_SECONDS", "60"))
+    REAPER_BATCH_SIZE = int(os.getenv("REAPER_BATCH_SIZE", "500"))
+    REAPER_BATCH_PAUSE = float(os.getenv("REAPER_BATCH_PAUSE", "0.05"))
+
+    # Group-commit order ingestion (owner/ingest.py): one writer thread per worker commits
+    # queued orders together instead of one transaction per request
+    ORDER_GROUP_COMMIT = os.getenv("ORDER_GROUP_COMMIT", "false").lower() == "true"
+    ORDER_BATCH_SIZE = int(os.getenv("ORDER_BATCH_SIZE", "50"))
+    ORDER_BATCH_LINGER_MS = float(os.getenv("ORDER_BATCH_LINGER_MS", "0"))
+    ORDER_INGEST_TIMEOUT = float(os.getenv("ORDER_INGEST_TIMEOUT", "10"))
+
+    # How often each worker reloads sold-out items (and resets stock on a new day)
+    INVENTORY_REFRESH_SECONDS = int(os.getenv("INVENTORY_REFRESH_SECONDS", "30"))
+
+    # Approved reviews per item are cached this long in each worker (Database/reviews.py)
+    REVIEW_CACHE_SECONDS = float(os.getenv("REVIEW_CACHE_SECONDS", "60"))
+    REVIEW_CACHE_MAX_ITEMS = int(os.getenv("REVIEW_CACHE_MAX_ITEMS", "5000"))  # LRU per worker
+    # Each store's menu (GET /items) and search vocabulary are cached this long in each worker
+    # (Database/menu.py, Database/search.py)
+    MENU_CACHE_SECONDS = float(os.getenv("MENU_CACHE_SECONDS", "60"))
+    # Review ids per UPDATE when moderating in bulk (stays under SQLite's bound-variable limit)
+    MODERATION_BATCH_SIZE = int(os.getenv("MODERATION_BATCH_SIZE", "500"))
+
+    # "Frequently bought together" (owner/recommendations.py): each worker adds newly paid
+    # orders every REFRESH seconds (skipping the last LAG seconds, which may still be
+    # committing) and snapshots to disk every SNAPSHOT seconds for warm restarts
+    RECOMMENDATIONS_SNAPSHOT_PATH = os.getenv("RECOMMENDATIONS_SNAPSHOT_PATH", "recommendations.snapshot")
+    RECOMMENDATIONS_REFRESH_SECONDS = float(os.getenv("RECOMMENDATIONS_REFRESH_SECONDS", "30"))
+    RECOMMENDATIONS_SNAPSHOT_SECONDS = float(os.getenv("RECOMMENDATIONS_SNAPSHOT_SECONDS", "300"))
+    RECOMMENDATIONS_SYNC_LAG_SECONDS = float(os.getenv("RECOMMENDATIONS_SYNC_LAG_SECONDS", "5"))
+    RECOMMENDATIONS_MAX = int(os.getenv("RECOMMENDATIONS_MAX", "10"))
+
+    # Hot/cold archival (owner/archive.py): DONE/CANCELLED orders older than this many days
+    # move to the archive tables (0 turns archiving off)
+    ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+    ARCHIVE_INTERVAL_SECONDS = int(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+    ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+    ARCHIVE_BATCH_PAUSE = float(os.getenv("ARCHIVE_BATCH_PAUSE", "0.05"))
+
     @classmethod
     def is_production(cls) -> bool:
         return cls.ENVIRONMENT == "production"
@@ -48,6 +179,23 @@ class Settings:
         if not cls.DB_URL:
             errors.append("DB_URL is required")
 
+        if cls.RATE_LIMIT_BACKEND not in ("memory", "sqlite"):
+            errors.append("RATE_LIMIT_BACKEND must be 'memory' or 'sqlite'")
+        if not 30 <= cls.CHECKOUT_EXPIRES_MINUTES <= 1440:
+            errors.append("CHECKOUT_EXPIRES_MINUTES must be between 30 and 1440 (Stripe's limits)")
+        if cls.REAPER_TTL_MINUTES <= cls.CHECKOUT_EXPIRES_MINUTES:
+            errors.append("REAPER_TTL_MINUTES must be longer than CHECKOUT_EXPIRES_MINUTES, or payable orders get reaped")
+        if cls.IDEMPOTENCY_LEASE_SECONDS <= 0:
+            errors.append("IDEMPOTENCY_LEASE_SECONDS must be positive")
+        if cls.ADMIN_SESSION_BACKEND not in ("memory", "sqlite"):
+            errors.append("ADMIN_SESSION_BACKEND must be 'memory' or 'sqlite'")
+
+        store_urls = list(cls.STORE_DATABASES.values())
+        if len(set(store_urls)) != len(store_urls) or cls.DB_URL in store_urls:
+            errors.append("every store in STORE_DATABASES needs its own database, separate from DB_URL")
+        if cls.DEFAULT_STORE_ID in cls.STORE_DATABASES:
+            errors.append("DEFAULT_STORE_ID lives on DB_URL, leave it out of STORE_DATABASES")
+
         # In production, certain things MUST be set
         if cls.is_production():
             if cls.DISABLE_AUTH:
@@ -0,0 +1,74 @@
+"""
+Lazily built SDK clients
+
+Twilio and Stripe are only imported and configured the first time something asks for
+them, so importing the app (every worker, every test process) doesn't pay for them.
+
+    twilio = providers.get("twilio")
+    providers.override("twilio", FakeClient())  # local benchmarks
+"""
+import threading
+
+from config.config import settings
+
+_factories = {}
+_instances = {}
+_lock = threading.Lock()
+
+
+def register(name: str, factory):
+    _factories[name] = factory
+
+
+def get(name: str):
+    instance = _instances.get(name)
+    if instance is not None:
+        return instance
+    with _lock:
+        if name not in _instances:
+            _instances[name] = _factories[name]()
+        return _instances[name]
+
+
+def peek(name: str):
+    """The client if it has been built already, without building it"""
+    return _instances.get(name)
+
+
+def override(name: str, instance):
+    """Swap in a different client (fakes for benchmarks/local runs)"""
+    with _lock:
+        _instances[name] = instance
+
+
+def reset(name: str | None = None):
+    """Drop cached clients so the next get() rebuilds them"""
+    with _lock:
+        if name is None:
+            _instances.clear()
+        else:
+            _instances.pop(name, None)
+
+
+def _twilio():
+    from requests.adapters import HTTPAdapter
+    from twilio.http.http_client import TwilioHttpClient
+    from twilio.rest import Client
+
+    # one keep-alive session, with enough pooled connections for every SMS worker thread
+    http_client = TwilioHttpClient(pool_connections=True, timeout=settings.TWILIO_TIMEOUT_SECONDS)
+    http_client.session.mount("https://", HTTPAdapter(pool_maxsize=settings.SMS_CONCURRENCY))
+    return Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN, http_client=http_client)
+
+
+def _stripe():
+    import stripe
+    stripe.api_key = settings.STRIPE_SECRET_KEY
+    # the SDK default is 80s per attempt with 2 retries; the circuit breaker handles repeated failures
+    stripe.default_http_client = stripe.RequestsClient(timeout=settings.STRIPE_TIMEOUT_SECONDS)
+    stripe.max_network_retries = 0
+    return stripe
+
+
+register("twilio", _twilio)
+register("stripe", _stripe)
@@ -1,31 +1,38 @@
+from functools import partial
 from typing import List
-import stripe
-import uvicorn
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Header
 from sqladmin.templating import Jinja2Templates
-import os
-from dotenv import load_dotenv
 from starlette.responses import RedirectResponse
 from config.config import settings
+from config import providers
 from Database.dbModels import *
-from Database.dbConnect import dbSession, engine, Base
-from tests.seed import seed_database
-import logging
+from Database import inventory, menu, reviews, search, serializers
+from Database.serializers import respond, item_response, order_response
+from Database.dbConnect import dbSession, ReadSession, Base, replicas, shards, store_of
 from owner.admin import setup_admin
-from owner.notifications import notify_order_confirmed, send_sms
+from owner.notifications import notify_order_confirmed, send_sms, flush_sms
 from middleware.auth_middleware import auth_middleware
+from middleware import admin_sessions, bulkhead, circuit_breaker, metrics
+from middleware.log import request_context_middleware, setup_logging, stop_logging
+from middleware.circuit_breaker import CircuitOpenError
+from middleware.background import run_periodically, stop_all
+from middleware.idempotency import ensure_schema, idempotent, purge_expired
+from middleware.rate_limit import rate_limit_middleware, check_account, purge_idle
 from middleware.security import hash_password, verify_password, create_access_token, get_current_user, get_current_admin
 from typing import Annotated
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from owner.payments import StripeService
-from starlette.middleware.sessions import SessionMiddleware
+from owner import admin_api, analytics, archive, recommendations
+from owner.ingest import close_writer, ingest_order
+from owner.reaper import delete_unpaid_orders, reap_abandoned_checkouts
 from starlette.requests import Request
-load_dotenv()
 settings.validate()
 app = FastAPI(title="J-Bites")
-app.add_middleware(SessionMiddleware, secret_key=os.getenv("SECRET_KEY"))
 app.middleware("http")(auth_middleware)
+app.middleware("http")(bulkhead.bulkhead_middleware)
+app.middleware("http")(rate_limit_middleware)  # runs before the bulkheads, rejected requests never queue
+app.middleware("http")(request_context_middleware)  # added last so it runs first and logs every outcome
 
 # for frontend folder  ---------
 app.mount("/static", StaticFiles(directory="frontend"), name="static")
@@ -47,149 +54,208 @@ async def register_page():
 
 @app.get("/health")
 async def health_check():
+    # server.py flips this on SIGTERM so load balancers stop routing here before we exit
+    if getattr(app.state, "draining", False):
+        return JSONResponse(status_code=503, content={"status": "draining"})
     return {
         "status": "healthy",
         "enviornment": settings.ENVIRONMENT,
-        "auth_enabled": not (settings.DISABLE_AUTH and settings.is_development())
+        "auth_enabled": not (settings.DISABLE_AUTH and settings.is_development()),
+        # an open circuit degrades checkout/texts but doesn't make this worker unhealthy
+        "circuits": circuit_breaker.states(),
+        "bulkheads": bulkhead.usage(),
     }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    circuit_breaker.states()  # open circuits past their cool-down report half-open
+    return metrics.render()
+app.include_router(admin_api.router)  # before setup_admin, the sqladmin mount catches every /admin/* path
 setup_admin(app)
 
 CurrentUser = Annotated[User, Depends(get_current_user)]
 CurrentAdmin = Annotated[Admin, Depends(get_current_admin)]
+IdempotencyKeyHeader = Annotated[str | None, Header()]
+def init_database():
+    # every store database gets the full schema, the global tables just stay empty there
+    for store_id in shards.store_ids():
+        Base.metadata.create_all(shards.engine(store_id))
+    if settings.SEED_DATABASE:
+        from tests.seed import seed_database  # dev only, keep it out of normal imports
+        seed_database()
+        Base.metadata.create_all(shards.engine(settings.DEFAULT_STORE_ID))
+    ensure_schema(shards.engine(settings.DEFAULT_STORE_ID))
+    for store_id in shards.store_ids():
+        archive.ensure_autoincrement(shards.engine(store_id))
+        search.ensure_index(shards.engine(store_id))
+
 @app.on_event("startup")
 def reset_database():
-    Base.metadata.create_all(engine)
-    if os.getenv("SEED_DATABASE", "false").lower() == "true":
-        seed_database()
-        Base.metadata.create_all(engine)
+    setup_logging()
+    # server.py runs init_database once in the parent before forking workers
+    if not getattr(app.state, "database_initialized", False):
+        init_database()
+
+    # jobs that rewrite shared rows run once (server.py's worker 0), the rest keep per-process state fresh
+    primary = getattr(app.state, "worker_index", 0) == 0
+    if primary:
+        run_periodically("idempotency-purge", settings.IDEMPOTENCY_PURGE_INTERVAL, purge_expired)
+        run_periodically("checkout-reaper", settings.REAPER_INTERVAL_SECONDS, reap_abandoned_checkouts)
+        run_periodically("order-archive", settings.ARCHIVE_INTERVAL_SECONDS, archive.archive_old_orders)
+    restock = inventory.restock if primary else inventory.reload_sold_out
+    restock()
+    run_periodically("inventory-restock", settings.INVENTORY_REFRESH_SECONDS, restock)
+    recommendations.load()
+    run_periodically("recommendations", settings.RECOMMENDATIONS_REFRESH_SECONDS,
+                     partial(recommendations.refresh, snapshot=primary))
+    run_periodically("admin-session-purge", settings.ADMIN_SESSION_PURGE_INTERVAL, admin_sessions.purge_expired)
+    if replicas.engines:
+        replicas.refresh()
+        run_periodically("replica-health", settings.REPLICA_CHECK_INTERVAL, replicas.refresh)
+    if settings.RATE_LIMIT_ENABLED:
+        run_periodically("rate-limit-purge", settings.RATE_LIMIT_PURGE_INTERVAL, purge_idle)
+
+@app.on_event("startup")
+async def install_bulkheads():
+    # async so the limiters (and the threadpool resize) belong to the server's event loop
+    bulkhead.install()
+
+@app.on_event("shutdown")
+def stop_background_jobs():
+    stop_all()
+    close_writer()
+    flush_sms()
+    stop_logging()  # last, so the lines above get written
+
+# must be declared before /items/{item_id}, or "search" is parsed as an item id
+@app.get("/items/search", response_model=List[ItemResponse])
+def search_menu(q: str, session: ReadSession, limit: int = 20):
+    items = search.search_items(session, q, min(limit, 50))
+    return respond(serializers.item_list_adapter, [item_response(item) for item in items])
 
-    logging.basicConfig(level=logging.INFO)
 
 @app.get("/items/{item_id}", response_model=ItemResponse)
-def get_item(item_id: int, session: dbSession):
+def get_item(item_id: int, session: ReadSession):
     item = session.query(Item).filter(Item.id == item_id).first()
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
-    return item
+    return respond(serializers.item_adapter, item_response(item))
 
 
 @app.get("/items", response_model=List[ItemResponse])
-def get_all_items(session: dbSession):
-    items = session.query(Item).all()
-    return items
+def get_all_items(session: ReadSession):
+    # this store's menu, cached per worker (Database/menu.py)
+    return respond(serializers.item_list_adapter, serializers.menu_response(menu.items(session), store_of(session)))
 
-@app.post("/reviews", status_code=201, response_model=ReviewResponse)
-def create_review(review_data: ReviewCreate, current_user: CurrentUser, session: dbSession):
+@app.post("/reviews", status_code=201, response_model=ReviewCreatedResponse)
+def create_review(review_data: ReviewCreate, current_user: CurrentUser, session: dbSession,
+                  idempotency_key: IdempotencyKeyHeader = None):
     #sends to the DB a review that is pending and through /admin the admin will change
-    review = Review(
-        item_id=review_data.item_id,
-        rating=review_data.rating,
-        comment=review_data.comment,
-        user_id=current_user.user_id,
-        status=ReviewStatus.PENDING,
-    )
+    with idempotent(session, idempotency_key, f"{current_user.user_id}:/reviews", review_data) as request:
+        if request.cached is not None:
+            return request.cached
+
+        review = Review(
+            item_id=review_data.item_id,
+            rating=review_data.rating,
+            comment=review_data.comment,
+            user_id=current_user.user_id,
+            status=ReviewStatus.PENDING,
+        )
 
-    session.add(review)
-    session.commit()
-    return {"message": "Review created and submitted for approval.", "review": review.id}
+        session.add(review)
+        session.commit()
+        return request.save({"message": "Review created and submitted for approval.", "review": review.id})
 
 #shows approved reviews
 @app.get("/items/{item_id}/reviews")
-def get_reviews(item_id: int, session: dbSession):
-    #gets reviews based on id and approved status
-    reviews = session.query(Review).filter(
-        Review.item_id == item_id,
-        Review.status == ReviewStatus.APPROVED
-    ).all()
-    return reviews
-
-@app.post("/orders", status_code=201, response_model=OrderResponse)
-def create_order(order_data: OrderCreate, current_user: CurrentUser, session: dbSession):
-    order = Order(
-        status = OrderStatus.PENDING,
-        phone_num = order_data.phone_num,
-        user_id = current_user.user_id,  # Use the looked-up user_id
-        payment_status="pending"
-    )
-    session.add(order)
-    session.flush()
-
-    stripe_items = []
-    total_price = 0
-    for i_data in order_data.items:
-        db_item = session.query(Item).filter(Item.id == i_data.item_id).first()
-        if not db_item:
-            raise HTTPException(status_code=404, detail=f"Item with id {i_data.item_id} not found")
-
-        order_item = OrderItem(
-            order_id = order.id,
-            item_id = i_data.item_id,
-            quantity = i_data.quantity,
-            price_at_order=db_item.price
-        )
-        session.add(order_item)
-        stripe_items.append({
-            'name': db_item.name,
-            'quantity': i_data.quantity,
-            'price': db_item.price
-        })
-        total_price += db_item.price * i_data.quantity
-    session.commit()
-
-    try:
-        checkout_url = StripeService.create_checkout(
-            order_id=order.id,
-            items=stripe_items,
-            phone=order.phone_num,
-            success_url=f"http://localhost:8000/payment-success?order_id={order.id}",
-            cancel_url=f"http://localhost:8000/payment-cancelled?order_id={order.id}"
-        )
-        return {
-            "order_id": order.id,
-            "checkout_url": checkout_url,
-            "total": total_price,
-            "message": "Order created. Redirecting to payment..."
-        }
-    except Exception as e:
-        session.delete(order)
-        session.commit()
-        raise HTTPException(status_code=500, detail=f"Payment setup failure")
+def get_reviews(item_id: int, session: ReadSession):
+    #approved reviews for the item, cached per worker until moderation changes them
+    return reviews.approved(session, item_id)["reviews"]
+
+@app.get("/items/{item_id}/recommendations", response_model=List[ItemResponse])
+def get_recommendations(item_id: int, session: ReadSession, limit: int = 3):
+    #items most often in the same paid order, counted in memory by owner/recommendations.py
+    store_id = store_of(session)
+    ranked = [other for other, _ in recommendations.recommend(item_id, min(limit, settings.RECOMMENDATIONS_MAX), store_id)]
+    if not ranked:
+        return []
+    items = {item.id: item for item in session.query(Item).filter(Item.id.in_(ranked))}
+    suggestions = [items[other] for other in ranked if other in items and not inventory.is_sold_out(other, store_id)]
+    return respond(serializers.item_list_adapter, [item_response(item) for item in suggestions])
+
+@app.post("/orders", status_code=201, response_model=CheckoutResponse)
+def create_order(order_data: OrderCreate, current_user: CurrentUser, session: dbSession,
+                 idempotency_key: IdempotencyKeyHeader = None):
+    # retries with the same Idempotency-Key get the first response instead of a second order + checkout
+    check_account(f"user:{current_user.user_id}")
+    with idempotent(session, idempotency_key, f"{current_user.user_id}:/orders", order_data) as request:
+        if request.cached is not None:
+            return request.cached
+
+        order = ingest_order(session, current_user.user_id, order_data)
+        order_id = order["order_id"]
+
+        try:
+            store_id = store_of(session)
+            checkout_url = StripeService.create_checkout(
+                order_id=order_id,
+                items=order["stripe_items"],
+                phone=order_data.phone_num,
+                success_url=f"http://localhost:8000/payment-success?order_id={order_id}&store_id={store_id}",
+                cancel_url=f"http://localhost:8000/payment-cancelled?order_id={order_id}&store_id={store_id}",
+                store_id=store_id,
+            )
+            return request.save({
+                "order_id": order_id,
+                "checkout_url": checkout_url,
+                "total": order["total"],
+                "message": "Order created. Redirecting to payment..."
+            })
+        except Exception as e:
+            delete_unpaid_orders(session, [order_id])
+            session.commit()
+            if isinstance(e, CircuitOpenError):
+                raise HTTPException(status_code=503, detail="Payments are temporarily unavailable, please try again shortly",
+                                    headers={"Retry-After": str(int(e.retry_after))})
+            raise HTTPException(status_code=500, detail=f"Payment setup failure")
 
 
 
 
 @app.get("/orders/{order_id}", response_model=OrderResponse)
 def get_order(order_id: int, session: dbSession):
-    order = session.query(Order).filter(Order.id == order_id).first()
+    order = archive.find_order(session, order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
 
-    items_response = []
-    total_price = 0
-    for o_item in order.order_items:
-        items_response.append(
-            OrderItemResponse(
-                id=o_item.id,
-                item_id=o_item.item_id,
-                item_name=o_item.item.name,
-                quantity=o_item.quantity,
-                price=o_item.price_at_order
-            )
-        )
-        total_price += o_item.price_at_order * o_item.quantity
+    return respond(serializers.order_adapter, order_response(order))
 
-    return OrderResponse(
-        id = order.id,
-        status = order.status,
-        phone_num = order.phone_num,
-        items=items_response,
-        total_price=total_price
+@app.get("/me/orders", response_model=OrderPage)
+def get_my_orders(current_user: CurrentUser, session: ReadSession, limit: int = 20,
+                  before: int | None = None, status: OrderStatus | None = None):
+    """
+    The logged-in user's orders at the request's store (?store_id= / X-Store-ID), newest first.
+    Pass next_cursor back as ?before= (with the same store) for the next page.
 
-    )
+    One store per call on purpose: order ids are per store, so neither the cursor nor the ids
+    an app goes on to cancel or pay would mean anything in a cross-store list. An app showing
+    every store's history pages each store it knows about.
+    """
+    limit = max(1, min(limit, 50))
+    # keyset pagination on (user_id, id DESC): every page is one index range scan, however old it is,
+    # continuing into the archive once the hot orders run out
+    orders = archive.user_orders(session, current_user.user_id, limit + 1, before, status)
+
+    next_cursor = orders[limit - 1].id if len(orders) > limit else None
+    return respond(serializers.order_page_adapter, serializers.order_page(orders[:limit], next_cursor))
 
 @app.post("/orders/{order_id}/cancel")
 def cancel_order(order_id: int, session: dbSession):
     order = session.query(Order).filter(Order.id == order_id).first()
+    if not order:
+        # archived orders are all done or cancelled, say so rather than 404
+        order = session.get(ArchivedOrder, order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
 
@@ -222,42 +288,18 @@ def cancel_order(order_id: int, session: dbSession):
         raise HTTPException(status_code=500, detail=f"Cancellation Failed: {str(e)}")
 
 @app.get("/orders/search/{phone_num}", response_model=List[OrderResponse])
-def get_order_by_phone(phone_num: str, session: dbSession):
-    orders = session.query(Order).filter(Order.phone_num == phone_num).all()
+def get_order_by_phone(phone_num: str):
+    # a customer may have ordered at any location: ask every store at once
+    found = shards.gather(lambda db, store_id: [order_response(order) for order in archive.orders_by_phone(db, phone_num)])
+    orders = [order for store_id in sorted(found) for order in found[store_id]]
     if not orders:
         raise HTTPException(status_code=404, detail="Order not found")
-    response = []
-
-    for order in orders:
-        items_response = []
-        total_price = 0
-
-        for o_item in order.order_items:
-            items_response.append(
-                OrderItemResponse(
-                    id=o_item.id,
-                    item_id=o_item.item_id,
-                    item_name=o_item.item.name,
-                    quantity=o_item.quantity,
-                    price=o_item.price_at_order
-                )
-            )
-            total_price += o_item.price_at_order * o_item.quantity
-
-        response.append(
-            OrderResponse(
-                id=order.id,
-                status=order.status,
-                phone_num=order.phone_num,
-                items=items_response,
-                total_price=total_price,
-            )
-        )
 
-    return response
+    return respond(serializers.order_list_adapter, orders)
 
 @app.post("/login")
 def login(user: UserCreate, db: dbSession):
+    check_account(user.email)
     db_user = db.query(User).filter(User.email == user.email).first()
     if not db_user or not verify_password(user.password, db_user.password):
         raise HTTPException(status_code=401, detail="Invalid username or password")
@@ -267,6 +309,7 @@ def login(user: UserCreate, db: dbSession):
 
 @app.post("/register", response_model=UserResponse)
 def register(user: UserCreate, db: dbSession):
+    check_account(user.email)
     existing = db.query(User).filter(User.name == user.name).first()
     if existing:
         raise HTTPException(status_code=400, detail="Account already exists")
@@ -285,6 +328,7 @@ def register(user: UserCreate, db: dbSession):
 
 @app.post("/admin/login")
 def admin_login(email: str, password: str, db: dbSession):
+    check_account(f"admin:{email}")
     admin = db.query(Admin).filter(Admin.email == email).first()
 
     if not admin or not verify_password(password, admin.password):
@@ -293,48 +337,12 @@ def admin_login(email: str, password: str, db: dbSession):
     return {"access_token": token, "token_type": "bearer", "is_admin": True, "redirect_url": "/admin"}
 
 
-@app.get("/admin/orders/pending-cancellations", response_model=List[OrderResponse])
-def get_pending_cancellations(current_admin: CurrentAdmin, db: dbSession):
-    """Get all orders with cancellation requests - admin only"""
-
-    orders = db.query(Order).filter(Order.status == OrderStatus.CANCELLATION_REQUESTED).all()
-
-    response = []
-    for order in orders:
-        items_response = []
-        total_price = 0
-
-        for o_item in order.order_items:
-            items_response.append(
-                OrderItemResponse(
-                    id=o_item.id,
-                    item_id=o_item.item_id,
-                    item_name=o_item.item.name,
-                    quantity=o_item.quantity,
-                    price=o_item.price_at_order
-                )
-            )
-            total_price += o_item.price_at_order * o_item.quantity
-
-        response.append(
-            OrderResponse(
-                id=order.id,
-                status=order.status,
-                phone_num=order.phone_num,
-                items=items_response,
-                total_price=total_price,
-                username=order.user.name,
-                user_id=order.user_id,
-                payment_status=order.payment_status
-            )
-        )
-
-    return response
 @app.post("/stripe-webhook")
-async def stripe_webhook(request: Request, db: dbSession):
+async def stripe_webhook(request: Request):
     payload = await request.body()
     sig_header = request.headers.get("Stripe-Signature")
-    webhook_secret = os.getenv("SECRET_WEBHOOK")
+    webhook_secret = settings.STRIPE_WEBHOOK_SECRET
+    stripe = providers.get("stripe")
 
     try:
         event = stripe.Webhook.construct_event(payload, sig_header, webhook_secret)
@@ -343,17 +351,40 @@ async def stripe_webhook(request: Request, db: dbSession):
     except stripe.InvalidSignatureError:
         raise HTTPException(status_code=400, detail="Invalid signature")
 
-    if event["type"] == "checkout.session.completed":
-        session = event['data']['object']
-        order_id = session['metadata']['order_id']
+    if event["type"] not in ("checkout.session.completed", "checkout.session.expired"):
+        return {"status": "success"}
+
+    session = event['data']['object']
+    order_id = session['metadata']['order_id']
+    # checkouts from before sharding carry no store_id, they all belong to the default store
+    store_id = int(session['metadata'].get('store_id') or settings.DEFAULT_STORE_ID)
+    if store_id not in shards.store_ids():
+        raise HTTPException(status_code=400, detail=f"Unknown store {store_id}")
+
+    if event["type"] == "checkout.session.expired":
+        # never paid: give the held stock back now rather than when the reaper comes by
+        db = shards.session(store_id)
+        try:
+            delete_unpaid_orders(db, [int(order_id)])
+            db.commit()
+        finally:
+            db.close()
+        return {"status": "success"}
 
+    db = shards.session(store_id)
+    try:
         order = db.query(Order).filter(Order.id == order_id).first()
-        if order:
-            order.payment_status = order.payment_status = "paid"
+        # Stripe can deliver the same event twice, only count the first one
+        if order and order.payment_status != "paid":
+            order.payment_status = "paid"
+            order.paid_at = datetime.utcnow()
             order.stripe_session_id = session['id']
+            analytics.record_paid(db, order)
             db.commit()
 
             notify_order_confirmed(order.phone_num, order.id, session['amount_total']/100)
+    finally:
+        db.close()
     return {"status": "success"}
 
 @app.get("/payment-success")
@@ -362,11 +393,12 @@ async def payment_success(order_id: int):
 
 @app.get("/payment-cancelled")
 async def payment_cancelled(order_id: int, db: dbSession):
-    order = db.query(Order).filter(Order.id == order_id).first()
-    if order:
-        db.delete(order)
-        db.commit()
+    # only unpaid orders, a paid order can't be deleted by hitting this URL
+    delete_unpaid_orders(db, [order_id])
+    db.commit()
     return RedirectResponse(url="/?cancelled=true")
 
 if __name__ == "__main__":
+    import uvicorn  # only needed to run the file directly, workers and tests skip it
+
     uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
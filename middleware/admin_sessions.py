@@ -0,0 +1,246 @@
+"""
+Server-side sessions for the /admin panel
+
+The cookie only carries an opaque random id. The store maps it to the admin resolved at
+login ({"admin_id", "email"}), so an admin page neither verifies a signed cookie nor
+queries the admins table. Sessions expire after ADMIN_SESSION_IDLE_SECONDS without use
+(sliding) and each worker keeps the ADMIN_SESSION_MAX_ENTRIES most recently used in an
+LRU.
+
+With ADMIN_SESSION_BACKEND=sqlite sessions are also written to ADMIN_SESSION_SQLITE_PATH
+so every worker can resolve them (server.py switches to it when it forks more than one).
+A worker then re-reads a cached session at most every ADMIN_SESSION_RECHECK_SECONDS,
+which is also how a revocation made in another worker reaches it.
+
+AdminSessionMiddleware is installed on the sqladmin app only (owner/admin.py), so no
+other request pays anything for sessions. Deleting an Admin, or clearing its is_admin,
+revokes all of its sessions once the commit lands.
+"""
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+
+from config.config import settings
+from Database.dbConnect import mark_changed, on_commit
+from Database.dbModels import Admin
+
+logger = logging.getLogger(__name__)
+
+COOKIE_NAME = "jbites_admin"
+COOKIE_PATH = "/admin"
+
+
+class SessionStore:
+    """Opaque session id -> admin principal, an LRU per worker, optionally backed by SQLite"""
+
+    def __init__(self, path: str | None = None, max_entries: int = 10_000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # sid -> [principal, expires, checked]
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS admin_sessions "
+                "(sid TEXT PRIMARY KEY, admin_id INTEGER NOT NULL, email TEXT, expires REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_admin_sessions_admin_id ON admin_sessions (admin_id)")
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remember(self, sid: str, principal: dict, expires: float, now: float):
+        with self._lock:
+            self._entries[sid] = [principal, expires, now]
+            self._entries.move_to_end(sid)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def create(self, admin_id: int, email: str) -> str:
+        """New session for an admin who just logged in, returns its id"""
+        sid = secrets.token_urlsafe(32)
+        principal = {"admin_id": admin_id, "email": email}
+        now = time.time()
+        expires = now + settings.ADMIN_SESSION_IDLE_SECONDS
+        if self._conn is not None:
+            with self._lock:
+                self._conn.execute("INSERT INTO admin_sessions (sid, admin_id, email, expires) VALUES (?, ?, ?, ?)",
+                                   (sid, admin_id, email, expires))
+        self._remember(sid, principal, expires, now)
+        return sid
+
+    def get(self, sid: str) -> dict | None:
+        """The session's principal (None if unknown or expired), pushing its expiry forward"""
+        now = time.time()
+        expires = now + settings.ADMIN_SESSION_IDLE_SECONDS
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is not None:
+                if entry[1] <= now:
+                    del self._entries[sid]
+                    entry = None
+                elif self._conn is None or now - entry[2] < settings.ADMIN_SESSION_RECHECK_SECONDS:
+                    entry[1] = expires
+                    self._entries.move_to_end(sid)
+                    return entry[0]
+            if self._conn is None:
+                return None
+
+            # not cached here (or due a recheck): the shared file decides
+            row = self._conn.execute("SELECT admin_id, email, expires FROM admin_sessions WHERE sid = ?",
+                                     (sid,)).fetchone()
+            if row is None or row[2] <= now:
+                self._entries.pop(sid, None)
+                return None
+            self._conn.execute("UPDATE admin_sessions SET expires = ? WHERE sid = ?", (expires, sid))
+        principal = {"admin_id": row[0], "email": row[1]}
+        self._remember(sid, principal, expires, now)
+        return principal
+
+    def delete(self, sid: str):
+        with self._lock:
+            self._entries.pop(sid, None)
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM admin_sessions WHERE sid = ?", (sid,))
+
+    def revoke_admins(self, admin_ids) -> int:
+        """Drop every session of these admins, returns how many this worker knew of"""
+        admin_ids = set(admin_ids)
+        if not admin_ids:
+            return 0
+        with self._lock:
+            stale = [sid for sid, (principal, _, _) in self._entries.items() if principal["admin_id"] in admin_ids]
+            for sid in stale:
+                del self._entries[sid]
+            if self._conn is None:
+                return len(stale)
+            placeholders = ",".join("?" * len(admin_ids))
+            return self._conn.execute(f"DELETE FROM admin_sessions WHERE admin_id IN ({placeholders})",
+                                      tuple(admin_ids)).rowcount
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        with self._lock:
+            expired = [sid for sid, (_, expires, _) in self._entries.items() if expires <= now]
+            for sid in expired:
+                del self._entries[sid]
+            if self._conn is None:
+                return len(expired)
+            return self._conn.execute("DELETE FROM admin_sessions WHERE expires <= ?", (now,)).rowcount
+
+
+_store = None
+_store_pid = None
+
+
+def get_store() -> SessionStore:
+    global _store, _store_pid
+    if _store_pid != os.getpid():
+        # a forked worker must not share the parent's SQLite connection
+        path = settings.ADMIN_SESSION_SQLITE_PATH if settings.ADMIN_SESSION_BACKEND == "sqlite" else None
+        _store = SessionStore(path, settings.ADMIN_SESSION_MAX_ENTRIES)
+        _store_pid = os.getpid()
+    return _store
+
+
+def purge_expired():
+    """Periodic job: forget sessions nobody has used within the idle timeout"""
+    purged = get_store().purge_expired()
+    if purged:
+        logger.info(f"Purged {purged} expired admin sessions")
+
+
+# set by AdminAuth.login / logout, picked up when the response starts
+_NEW_SESSION = "jbites.admin_session.new"
+
+
+def start_session(scope, admin_id: int, email: str):
+    """Log the request's browser in: a new session, its cookie goes out with the response"""
+    end_session(scope)
+    scope[_NEW_SESSION] = get_store().create(admin_id, email)
+    scope["admin"] = {"admin_id": admin_id, "email": email}
+
+
+def end_session(scope):
+    sid = scope.get("admin_session")
+    if sid:
+        get_store().delete(sid)
+    scope["admin_session"] = None
+    scope["admin"] = None
+    scope[_NEW_SESSION] = ""
+
+
+def _cookie(value: str) -> str:
+    cookie = f"{COOKIE_NAME}={value}; Path={COOKIE_PATH}; HttpOnly; SameSite=lax"
+    if not value:
+        cookie += "; Max-Age=0"
+    if settings.is_production():
+        cookie += "; Secure"
+    return cookie
+
+
+class AdminSessionMiddleware:
+    """
+    Resolves the session cookie into scope["admin"] for the sqladmin app
+
+    Takes the place of the SessionMiddleware sqladmin's AuthenticationBackend installs;
+    nothing is signed, the cookie is just the id (no Max-Age, so it ends with the browser
+    session; the server side expires on its own).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        sid = HTTPConnection(scope).cookies.get(COOKIE_NAME)
+        principal = get_store().get(sid) if sid else None
+        scope["admin_session"] = sid if principal else None
+        scope["admin"] = principal
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                new_sid = scope.get(_NEW_SESSION)
+                if new_sid is not None:
+                    MutableHeaders(scope=message).append("Set-Cookie", _cookie(new_sid))
+                elif sid and principal is None:
+                    # expired or revoked, stop the browser sending it
+                    MutableHeaders(scope=message).append("Set-Cookie", _cookie(""))
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+# Revocation: admins deleted (or demoted) in a session lose their sessions after commit
+
+@event.listens_for(Admin, "after_delete")
+def _admin_deleted(mapper, connection, target):
+    db = Session.object_session(target)
+    if db is not None:
+        mark_changed(db, "revoked_admins", [target.id])
+
+
+@event.listens_for(Admin, "after_update")
+def _admin_updated(mapper, connection, target):
+    db = Session.object_session(target)
+    if db is not None and not target.is_admin:
+        mark_changed(db, "revoked_admins", [target.id])
+
+
+@on_commit("revoked_admins")
+def _after_commit(db, revoked):
+    count = get_store().revoke_admins(revoked)
+    logger.info("Revoked admin sessions", extra={"admin_ids": sorted(revoked), "sessions": count})
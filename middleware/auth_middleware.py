@@ -1,10 +1,11 @@
 from fastapi import Request, HTTPException
 from middleware.security import decode_access_token, verify_admin_token
-from Database.dbConnect import SessionLocal
+from Database.dbConnect import read_session
 from config.config import settings
 import logging
 
 logger = logging.getLogger(__name__)
+_warned_auth_disabled = False
 
 PUBLIC_ROUTES = (
     "/docs",
@@ -18,6 +19,7 @@ PUBLIC_ROUTES = (
     "/payment-cancelled",
     "/stripe-webhook",
     "/health",
+    "/metrics",
     "/",
     "/login.html",
     "/register.html",
@@ -33,7 +35,11 @@ async def auth_middleware(request: Request, call_next):
     # ONLY bypass auth in development with explicit flag
     # This should NEVER be true in production (validated in settings)
     if settings.DISABLE_AUTH and settings.is_development():
-        logger.warning(f"⚠️  AUTH DISABLED for {request.url.path} - DEVELOPMENT MODE ONLY")
+        global _warned_auth_disabled
+        if not _warned_auth_disabled:
+            # once per process, not once per request
+            logger.warning("⚠️  AUTH DISABLED - DEVELOPMENT MODE ONLY")
+            _warned_auth_disabled = True
         return await call_next(request)
 
     path = request.url.path
@@ -52,7 +58,7 @@ async def auth_middleware(request: Request, call_next):
         token = auth_header.split(" ")[1]
 
         # Verify admin token
-        db = SessionLocal()
+        db = read_session()
         try:
             if not verify_admin_token(token, db):
                 raise HTTPException(
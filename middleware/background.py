@@ -0,0 +1,31 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+_jobs = []
+
+
+def run_periodically(name: str, interval: float, fn):
+    """Run fn every `interval` seconds on a daemon thread until stop_all() is called"""
+    stop = threading.Event()
+
+    def loop():
+        while not stop.wait(interval):
+            try:
+                fn()
+            except Exception:
+                logger.exception(f"Background job '{name}' failed")
+
+    thread = threading.Thread(target=loop, name=name, daemon=True)
+    thread.start()
+    _jobs.append((stop, thread))
+    return thread
+
+
+def stop_all(timeout: float = 5.0):
+    """Signal every background job to stop and wait briefly for them to exit"""
+    while _jobs:
+        stop, thread = _jobs.pop()
+        stop.set()
+        thread.join(timeout)
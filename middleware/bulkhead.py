@@ -0,0 +1,85 @@
+"""
+Bulkheads: a separate concurrency pool per route group
+
+Sync endpoints all run on anyio's default threadpool, so without this a burst of bcrypt
+logins or slow Stripe checkouts can hold every thread while /items waits behind them.
+Each group (auth, checkout, reads, admin, webhooks) gets its own CapacityLimiter sized
+from settings.BULKHEADS. A request waits on the event loop (not on a thread) for a slot
+in its group, for at most BULKHEAD_MAX_WAIT_SECONDS, then gets 503 + Retry-After.
+
+install() resizes the default threadpool to the sum of the groups, so every group can
+always use its full share. Streaming responses release their slot once headers are sent.
+"""
+import time
+
+import anyio
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+from config.config import settings
+from middleware import metrics
+
+AUTH_PATHS = {"/login", "/register", "/admin/login"}
+EXEMPT_PATHS = {"/health", "/metrics"}
+
+_limiters = {}
+
+
+def route_group(method: str, path: str) -> str | None:
+    """Which bulkhead a request belongs to, None for routes that never queue"""
+    if path in EXEMPT_PATHS or path.startswith("/static"):
+        return None
+    if method == "POST" and path in AUTH_PATHS:
+        return "auth"
+    if path == "/stripe-webhook":
+        return "webhooks"
+    if path.startswith("/admin"):
+        return "admin"
+    if (method == "POST" and path.startswith("/orders")) or path.startswith("/payment-"):
+        return "checkout"
+    return "reads"
+
+
+def install():
+    """Create the limiters, call from an async startup hook (they belong to the running loop)"""
+    _limiters.clear()
+    for group, size in settings.BULKHEADS.items():
+        _limiters[group] = anyio.CapacityLimiter(size)
+        metrics.set_gauge("bulkhead_capacity", size, group=group)
+    anyio.to_thread.current_default_thread_limiter().total_tokens = sum(settings.BULKHEADS.values())
+
+
+def usage() -> dict[str, dict]:
+    return {group: {"in_use": limiter.borrowed_tokens, "waiting": limiter.statistics().tasks_waiting,
+                    "capacity": limiter.total_tokens} for group, limiter in _limiters.items()}
+
+
+def _busy() -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server busy, please retry"},
+        headers={"Retry-After": "1"},
+    )
+
+
+async def bulkhead_middleware(request: Request, call_next):
+    group = route_group(request.method, request.url.path)
+    limiter = _limiters.get(group)
+    if not settings.BULKHEADS_ENABLED or limiter is None:
+        return await call_next(request)
+
+    started = time.monotonic()
+    try:
+        with anyio.fail_after(settings.BULKHEAD_MAX_WAIT_SECONDS):
+            await limiter.acquire()
+    except TimeoutError:
+        metrics.inc("bulkhead_rejected_total", group=group)
+        return _busy()
+    metrics.observe("bulkhead_wait", time.monotonic() - started, group=group)
+    metrics.set_gauge("bulkhead_in_use", limiter.borrowed_tokens, group=group)
+
+    try:
+        return await call_next(request)
+    finally:
+        limiter.release()
+        metrics.set_gauge("bulkhead_in_use", limiter.borrowed_tokens, group=group)
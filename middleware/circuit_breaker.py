@@ -0,0 +1,131 @@
+"""
+Circuit breakers for outbound provider calls (Stripe, Twilio)
+
+    stripe_breaker = circuit_breaker.register("stripe", timeout=settings.STRIPE_TIMEOUT_SECONDS)
+    session = stripe_breaker.call(stripe.checkout.Session.create, **params)
+
+A breaker keeps the outcome of the last BREAKER_WINDOW calls. Once at least
+BREAKER_MIN_CALLS are in the window and BREAKER_FAILURE_RATE of them failed, it opens
+and calls raise CircuitOpenError straight away instead of tying up a worker thread on
+a provider that is down. After BREAKER_OPEN_SECONDS one trial call is let through
+(half-open): success closes the breaker, failure opens it again.
+
+The timeout budget itself is enforced by the SDK HTTP clients (config/providers.py).
+Here a call slower than `timeout` counts as a failure even if it eventually succeeds.
+State is per worker process, reported on /health and as circuit_* metrics.
+"""
+import threading
+import time
+from collections import deque
+
+from config.config import settings
+from middleware import metrics
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+_STATE_GAUGE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+_breakers = {}
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is unavailable, retry in {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, timeout: float | None = None, is_failure=None, window: int | None = None,
+                 min_calls: int | None = None, failure_rate: float | None = None,
+                 open_seconds: float | None = None, clock=time.monotonic):
+        self.name = name
+        self.timeout = timeout
+        self.is_failure = is_failure or (lambda exc: True)
+        self.min_calls = min_calls or settings.BREAKER_MIN_CALLS
+        self.failure_rate = failure_rate or settings.BREAKER_FAILURE_RATE
+        self.open_seconds = settings.BREAKER_OPEN_SECONDS if open_seconds is None else open_seconds
+        self.clock = clock
+        self._results = deque(maxlen=window or settings.BREAKER_WINDOW)  # True = failed
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+        metrics.set_gauge("circuit_state", _STATE_GAUGE[CLOSED], provider=name)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and self.clock() - self._opened_at >= self.open_seconds:
+            self._set(HALF_OPEN)
+        return self._state
+
+    def _set(self, state: str):
+        self._state = state
+        metrics.set_gauge("circuit_state", _STATE_GAUGE[state], provider=self.name)
+
+    def _open(self):
+        self._set(OPEN)
+        self._opened_at = self.clock()
+        self._results.clear()
+        metrics.inc("circuit_opened_total", provider=self.name)
+
+    def _acquire(self) -> bool:
+        """True if this call is the half-open trial, raises if the call isn't allowed"""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return False
+            if state == HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            retry_after = max(self.open_seconds - (self.clock() - self._opened_at), 1.0)
+        metrics.inc("circuit_calls_total", provider=self.name, outcome="rejected")
+        raise CircuitOpenError(self.name, retry_after)
+
+    def call(self, fn, *args, **kwargs):
+        trial = self._acquire()
+        started = self.clock()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as exc:
+            self._record(trial, self.is_failure(exc))
+            raise
+        slow = self.timeout is not None and self.clock() - started > self.timeout
+        self._record(trial, slow)
+        return result
+
+    def _record(self, trial: bool, failed: bool):
+        metrics.inc("circuit_calls_total", provider=self.name, outcome="failure" if failed else "success")
+        with self._lock:
+            if trial:
+                self._trial_running = False
+                if failed:
+                    self._open()
+                else:
+                    self._set(CLOSED)
+                return
+            if self._state != CLOSED:
+                return  # a call that started before the breaker opened
+            self._results.append(failed)
+            if len(self._results) >= self.min_calls and sum(self._results) / len(self._results) >= self.failure_rate:
+                self._open()
+
+
+def register(name: str, **options) -> CircuitBreaker:
+    breaker = CircuitBreaker(name, **options)
+    _breakers[name] = breaker
+    return breaker
+
+
+def get(name: str) -> CircuitBreaker:
+    return _breakers[name]
+
+
+def states() -> dict[str, str]:
+    """{provider: state} for /health (also moves expired open breakers to half-open)"""
+    return {name: breaker.state for name, breaker in _breakers.items()}
@@ -0,0 +1,171 @@
+import hashlib
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import inspect, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from config.config import settings
+from Database.dbConnect import SessionLocal, store_of
+from Database.dbModels import IdempotencyKey
+
+def ensure_schema(engine):
+    """Add request_hash to an idempotency_keys table created before it existed"""
+    columns = {column["name"] for column in inspect(engine).get_columns(IdempotencyKey.__tablename__)}
+    if "request_hash" not in columns:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE idempotency_keys ADD COLUMN request_hash VARCHAR"))
+
+
+# In-process single-flight: key -> [lock, waiters]
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+@contextmanager
+def _single_flight(key: str):
+    """Concurrent requests with the same key in this process queue behind the first one"""
+    with _locks_guard:
+        entry = _locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _locks_guard:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _locks[key]
+
+
+class IdempotentRequest:
+    def __init__(self, session: Session, key: str | None, cached=None):
+        self.session = session
+        self.key = key
+        self.cached = cached
+        self.saved = False
+
+    def save(self, body):
+        """Store the successful response so retries with the same key get it back"""
+        if self.key is None:
+            return body
+        row = self.session.get(IdempotencyKey, self.key)
+        row.response_body = json.dumps(jsonable_encoder(body))
+        self.session.commit()
+        self.saved = True
+        return body
+
+
+def _hash(payload) -> str | None:
+    if payload is None:
+        return None
+    return hashlib.sha256(json.dumps(jsonable_encoder(payload), sort_keys=True).encode()).hexdigest()
+
+
+def _claim(session: Session, key: str, request_hash: str | None = None):
+    """Claim the key, or wait for whoever holds it and return their stored response"""
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+    while True:
+        row = session.get(IdempotencyKey, key, populate_existing=True)
+        now = datetime.utcnow()
+        if row is not None and row.expires_at <= now:
+            session.delete(row)
+            session.commit()
+            row = None
+
+        if row is None:
+            session.add(IdempotencyKey(
+                key=key,
+                request_hash=request_hash,
+                created_at=now,
+                expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_TTL_SECONDS),
+            ))
+            try:
+                session.commit()
+                return None
+            except IntegrityError:
+                # another worker claimed it first
+                session.rollback()
+                continue
+
+        if row.request_hash is not None and request_hash is not None and row.request_hash != request_hash:
+            raise HTTPException(status_code=422,
+                                detail="This Idempotency-Key was already used with a different request")
+
+        if row.response_body is not None:
+            return json.loads(row.response_body)
+
+        lease_end = row.created_at + timedelta(seconds=settings.IDEMPOTENCY_LEASE_SECONDS)
+        if lease_end <= now:
+            # its worker died mid-request: take the claim over, unless another retry just did
+            taken = session.execute(
+                update(IdempotencyKey)
+                .where(IdempotencyKey.key == key, IdempotencyKey.response_body.is_(None),
+                       IdempotencyKey.created_at == row.created_at)
+                .values(created_at=now)
+            ).rowcount
+            session.commit()
+            if taken:
+                return None
+            continue
+
+        if time.monotonic() > deadline:
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+        time.sleep(0.05)
+
+
+def _release(session: Session, key: str):
+    """Drop an unfinished claim so the client can retry after a failure"""
+    session.rollback()
+    session.query(IdempotencyKey).filter(
+        IdempotencyKey.key == key,
+        IdempotencyKey.response_body.is_(None),
+    ).delete(synchronize_session=False)
+    session.commit()
+
+
+@contextmanager
+def idempotent(session: Session, idempotency_key: str | None, scope: str, payload=None):
+    """
+    Wrap a POST handler so retries with the same Idempotency-Key replay the first response
+
+    Args:
+        session: request DB session
+        idempotency_key: value of the Idempotency-Key header (None disables the check)
+        scope: namespaces the key, e.g. "<user_id>:/orders" (the session's store is added)
+        payload: the request body; reusing a key with a different one is a 422
+    """
+    if not idempotency_key:
+        yield IdempotentRequest(session, None)
+        return
+
+    key = f"{store_of(session)}:{scope}:{idempotency_key}"
+    with _single_flight(key):
+        request = IdempotentRequest(session, key, _claim(session, key, _hash(payload)))
+        try:
+            yield request
+        except BaseException:
+            if request.cached is None:
+                _release(session, key)
+            raise
+        if request.cached is None and not request.saved:
+            _release(session, key)
+
+
+def purge_expired() -> int:
+    """Delete expired keys, returns how many rows were removed"""
+    db = SessionLocal()
+    try:
+        deleted = db.query(IdempotencyKey).filter(
+            IdempotencyKey.expires_at <= datetime.utcnow()
+        ).delete(synchronize_session=False)
+        db.commit()
+        return deleted
+    finally:
+        db.close()
@@ -0,0 +1,159 @@
+"""
+Non-blocking structured logging
+
+setup_logging() puts a QueueHandler on the root logger, so a request thread (or the event
+loop) only pays for an enqueue. A QueueListener thread formats each record as one JSON
+line (LOG_FORMAT=text for a readable local console) and writes it to stdout.
+
+    logger.info("SMS sent", extra={"order_id": 12, "duration_ms": 84.2})
+    logger.info("Request", extra={"sampled": True, ...})  # high volume, kept at LOG_SAMPLE_RATE
+
+request_id and route are added to every record from contextvars set by
+request_context_middleware, which also writes one (sampled) line per request in place
+of uvicorn's access log. Warnings and errors are never sampled out.
+"""
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from fastapi import Request
+
+from config.config import settings
+
+request_id_var = ContextVar("request_id", default=None)
+route_var = ContextVar("route", default=None)
+
+# attributes every LogRecord has, anything else came in through extra=
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+_listener = None
+_listener_pid = None
+
+
+class _ContextFilter(logging.Filter):
+    """Runs on the caller's thread: stamp the request context and drop sampled-out records"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "sampled", False) and record.levelno < logging.WARNING:
+            if random.random() >= settings.LOG_SAMPLE_RATE:
+                return False
+            record.sample_rate = settings.LOG_SAMPLE_RATE
+        if not hasattr(record, "request_id"):
+            record.request_id = request_id_var.get()
+        if not hasattr(record, "route"):
+            record.route = route_var.get()
+        return True
+
+
+class _Handler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # the queue is in-process, so skip the stock prepare(): it formats the full message
+        # (traceback included) on this thread. Only resolve what can't wait.
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and key != "sampled" and value is not None:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = {key: value for key, value in vars(record).items()
+                  if key not in _RECORD_FIELDS and key != "sampled" and value is not None}
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+def setup_logging():
+    """Route all logging through the queue (once per process, safe to call again after fork)"""
+    global _listener, _listener_pid
+    if _listener_pid == os.getpid():
+        return
+
+    log_queue = queue.SimpleQueue()
+    handler = _Handler(log_queue)
+    handler.addFilter(_ContextFilter())
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(TextFormatter() if settings.LOG_FORMAT == "text" else JsonFormatter())
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(settings.LOG_LEVEL)
+    # uvicorn's own loggers write synchronously; send errors through the queue, and
+    # request_context_middleware replaces the access log
+    logging.getLogger("uvicorn.error").handlers = []
+    logging.getLogger("uvicorn.error").propagate = True
+    logging.getLogger("uvicorn.access").disabled = True
+
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    _listener_pid = os.getpid()
+
+
+def stop_logging():
+    """Write out everything still queued (called on shutdown)"""
+    global _listener_pid
+    if _listener is not None and _listener_pid == os.getpid():
+        _listener.stop()
+        _listener_pid = None
+
+
+access_logger = logging.getLogger("jbites.access")
+
+
+async def request_context_middleware(request: Request, call_next):
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    request_token = request_id_var.set(request_id)
+    route_token = route_var.set(request.url.path)
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        route = request.scope.get("route")
+        access_logger.info(
+            f"{request.method} {request.url.path} {status}",
+            extra={
+                "sampled": status < 500,
+                "method": request.method,
+                "route": getattr(route, "path", request.url.path),
+                "status": status,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+            },
+        )
+        request_id_var.reset(request_token)
+        route_var.reset(route_token)
@@ -0,0 +1,49 @@
+"""
+In-process metrics, rendered in Prometheus text format on GET /metrics
+
+    metrics.inc("reaper_orders_total", 12)
+    metrics.set_gauge("reaper_last_run_timestamp", time.time())
+
+Values are per worker process.
+"""
+import threading
+from collections import defaultdict
+
+_counters = defaultdict(float)
+_gauges = {}
+_lock = threading.Lock()
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name: str, value: float = 1, **labels):
+    with _lock:
+        _counters[_key(name, labels)] += value
+
+
+def set_gauge(name: str, value: float, **labels):
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name: str, seconds: float, **labels):
+    """Record a duration as <name>_seconds_sum / <name>_seconds_count"""
+    with _lock:
+        _counters[_key(f"{name}_seconds_sum", labels)] += seconds
+        _counters[_key(f"{name}_seconds_count", labels)] += 1
+
+
+def _line(key: tuple, value: float) -> str:
+    name, labels = key
+    if labels:
+        name += "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+    return f"{name} {value}"
+
+
+def render() -> str:
+    with _lock:
+        lines = [_line(key, value) for key, value in sorted(_counters.items())]
+        lines += [_line(key, value) for key, value in sorted(_gauges.items())]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,164 @@
+import logging
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+
+from config.config import settings
+
+logger = logging.getLogger(__name__)
+
+# (method, path) pairs that run bcrypt or open a Stripe checkout
+EXPENSIVE_ROUTES = {
+    ("POST", "/login"),
+    ("POST", "/register"),
+    ("POST", "/admin/login"),  # API login and the sqladmin login form
+    ("POST", "/orders"),
+}
+
+
+def _refill(tokens: float, updated: float, now: float, rate: float, burst: int) -> float:
+    return min(burst, tokens + (now - updated) * rate)
+
+
+class MemoryBackend:
+    """Token buckets for a single process, oldest keys are evicted past max_keys"""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: int) -> float:
+        """Take one token, returns 0 if allowed or the seconds to wait otherwise"""
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.pop(key, (burst, now))
+            tokens = _refill(tokens, updated, now, rate, burst)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            self.buckets[key] = (tokens, now)
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        return wait
+
+    def purge(self, idle_seconds: float) -> int:
+        cutoff = time.monotonic() - idle_seconds
+        with self.lock:
+            stale = [key for key, (_, updated) in self.buckets.items() if updated < cutoff]
+            for key in stale:
+                del self.buckets[key]
+        return len(stale)
+
+
+class SQLiteBackend:
+    """Token buckets in a local SQLite file so every worker process shares the same limits"""
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS ix_buckets_updated ON buckets (updated)")
+        self.lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: int) -> float:
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+                tokens = _refill(row[0], row[1], now, rate, burst) if row else burst
+                wait = 0.0
+                if tokens >= 1:
+                    tokens -= 1
+                else:
+                    wait = (1 - tokens) / rate
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                    (key, tokens, now),
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return wait
+
+    def purge(self, idle_seconds: float) -> int:
+        with self.lock:
+            return self.conn.execute("DELETE FROM buckets WHERE updated < ?", (time.time() - idle_seconds,)).rowcount
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        if settings.RATE_LIMIT_BACKEND == "sqlite":
+            _backend = SQLiteBackend(settings.RATE_LIMIT_SQLITE_PATH)
+        else:
+            _backend = MemoryBackend()
+    return _backend
+
+
+def purge_idle():
+    """Periodic job: drop buckets that have refilled, a missing bucket starts out full anyway"""
+    refill_seconds = max(settings.RATE_LIMIT_IP_BURST / (settings.RATE_LIMIT_IP_PER_MINUTE / 60),
+                         settings.RATE_LIMIT_ACCOUNT_BURST / (settings.RATE_LIMIT_ACCOUNT_PER_MINUTE / 60))
+    purged = get_backend().purge(refill_seconds)
+    if purged:
+        logger.info(f"Purged {purged} idle rate limit buckets")
+
+
+def _too_many(wait: float) -> JSONResponse:
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Too many requests, slow down"},
+        headers={"Retry-After": str(max(1, math.ceil(wait)))},
+    )
+
+
+def check_account(account: str):
+    """Per-account limit, call from handlers once the email/user is known"""
+    if not settings.RATE_LIMIT_ENABLED or not account:
+        return
+    wait = get_backend().take(
+        f"account:{account.lower()}",
+        settings.RATE_LIMIT_ACCOUNT_PER_MINUTE / 60,
+        settings.RATE_LIMIT_ACCOUNT_BURST,
+    )
+    if wait:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many attempts for this account",
+            headers={"Retry-After": str(max(1, math.ceil(wait)))},
+        )
+
+
+async def rate_limit_middleware(request: Request, call_next):
+    if not settings.RATE_LIMIT_ENABLED or (request.method, request.url.path) not in EXPENSIVE_ROUTES:
+        return await call_next(request)
+
+    # Per-IP bucket shared by all expensive routes
+    client_ip = request.client.host if request.client else "unknown"
+    backend = get_backend()
+    args = (f"ip:{client_ip}", settings.RATE_LIMIT_IP_PER_MINUTE / 60, settings.RATE_LIMIT_IP_BURST)
+    if isinstance(backend, SQLiteBackend):
+        # BEGIN IMMEDIATE can wait up to 5s on another worker, keep that off the event loop
+        wait = await run_in_threadpool(backend.take, *args)
+    else:
+        wait = backend.take(*args)
+    if wait:
+        return _too_many(wait)
+    # concurrency (so bcrypt/checkout can't take every thread from /items) is capped by the bulkheads
+    return await call_next(request)
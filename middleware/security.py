@@ -1,18 +1,15 @@
 from datetime import datetime, timedelta
 from typing import Optional
-import os
-from dotenv import load_dotenv
 from jose import jwt, JWTError
 import bcrypt
-from Database.dbConnect import get_db
+from Database.dbConnect import get_read_db, engine, SessionLocal
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from Database.dbModels import User, Admin
 from sqlalchemy.orm import Session
+from config.config import settings
 
-load_dotenv()
-
-SECRET_KEY = os.getenv('SECRET_KEY')
+SECRET_KEY = settings.SECRET_KEY
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 120
 security = HTTPBearer()
@@ -36,7 +33,23 @@ def decode_access_token(token: str):
     except JWTError:
         return None
 
-def get_current_user(info: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)) -> User:
+def _find_principal(model, email: str, db: Session):
+    """Look the user/admin up on the read replica, retrying on the primary in case it was just created"""
+    principal = db.query(model).filter_by(email=email).first()
+    if principal is None and db.get_bind(model) is not engine:
+        primary = SessionLocal()
+        try:
+            principal = primary.query(model).filter_by(email=email).first()
+        finally:
+            primary.close()
+    elif principal is not None:
+        # hand the connection back now: holding it while the endpoint checks out a write
+        # connection lets a burst of requests exhaust the pool and wait on each other
+        db.expunge(principal)
+        db.rollback()
+    return principal
+
+def get_current_user(info: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_read_db)) -> User:
     token = info.credentials
     payload = decode_access_token(token)
 
@@ -53,7 +66,7 @@ def get_current_user(info: HTTPAuthorizationCredentials = Depends(security), db:
             detail="Could not validate credentials"
         )
 
-    user = db.query(User).filter_by(email=email).first()
+    user = _find_principal(User, email, db)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -63,7 +76,7 @@ def get_current_user(info: HTTPAuthorizationCredentials = Depends(security), db:
     return user
 
 
-def get_current_admin(info: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)) -> Admin:
+def get_current_admin(info: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_read_db)) -> Admin:
     """Verify the current user is an admin"""
     token = info.credentials
     payload = decode_access_token(token)
@@ -89,7 +102,7 @@ def get_current_admin(info: HTTPAuthorizationCredentials = Depends(security), db
             detail="Could not validate credentials"
         )
 
-    admin = db.query(Admin).filter_by(email=email).first()
+    admin = _find_principal(Admin, email, db)
     if not admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -114,7 +127,7 @@ def verify_admin_token(token: str, db: Session) -> bool:
         if not email:
             return False
 
-        admin = db.query(Admin).filter_by(email=email).first()
+        admin = _find_principal(Admin, email, db)
         return admin is not None
 
     except Exception:
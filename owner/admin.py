@@ -1,29 +1,104 @@
-import secrets
-
-from sqladmin import Admin, ModelView, action
-from Database.dbConnect import engine
-from Database.dbModels import User, Item, Order, Review, OrderItem, OrderStatus, Admin as AdminModel
-import stripe
+import os
+import time
+from contextvars import ContextVar
+
+from sqladmin import Admin, BaseView, ModelView, action, expose
+from sqlalchemy import func, literal_column, or_, select, table
+from sqlalchemy.orm import Session, load_only, selectinload, sessionmaker, undefer
+from Database.dbConnect import engine, shards
+from Database import inventory, search
+from Database.dbModels import User, Item, Order, Review, OrderItem, OrderStatus, ReviewStatus, ArchivedOrder, Admin as AdminModel
 from Database.dbConnect import SessionLocal
+from fastapi import HTTPException
 from sqladmin.authentication import AuthenticationBackend
+from starlette.concurrency import run_in_threadpool
 from starlette.requests import Request
 from middleware.security import verify_password, create_access_token, decode_access_token
-import os
-from dotenv import load_dotenv
+from middleware.rate_limit import check_account
+from middleware.circuit_breaker import CircuitOpenError
+from middleware import admin_sessions
+from starlette.middleware import Middleware
+from starlette.datastructures import MutableHeaders
+from config import providers
+from config.config import settings
 
 from owner.notifications import notify_order_cancelled
+from owner import analytics, kitchen, moderation
+from owner.payments import stripe_breaker
 
-load_dotenv()
 import datetime
 
 
+# Every admin page works on one store: ?store_id=N (the Stores page links) picks it and a
+# cookie keeps it, so the views, forms and actions all open that store's database.
+STORE_COOKIE = "jbites_admin_store"
+_admin_store = ContextVar("admin_store", default=settings.DEFAULT_STORE_ID)
+
+
+def current_store() -> int:
+    return _admin_store.get()
+
+
+class AdminStoreMiddleware:
+    """Resolves the store the admin is working on for this request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request = Request(scope)
+        chosen = _parse_store(request.query_params.get("store_id"))
+        store_id = chosen or _parse_store(request.cookies.get(STORE_COOKIE)) or settings.DEFAULT_STORE_ID
+        _admin_store.set(store_id)
+
+        async def send_wrapper(message):
+            if chosen and message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append(
+                    "Set-Cookie", f"{STORE_COOKIE}={chosen}; Path=/admin; HttpOnly; SameSite=lax")
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def _parse_store(raw: str | None) -> int | None:
+    try:
+        store_id = int(raw)
+    except (TypeError, ValueError):
+        return None
+    return store_id if store_id in shards.store_ids() else None
+
+
+class StoreSessionMaker(sessionmaker):
+    """What sqladmin opens its sessions with: a session on the current admin store"""
+
+    def __call__(self, **local_kw) -> Session:
+        db = shards.session(current_store())
+        db.expire_on_commit = local_kw.get("expire_on_commit", True)
+        return db
+
+
 class AdminAuth(AuthenticationBackend):
+    def __init__(self):
+        # server-side sessions instead of the signed-cookie SessionMiddleware the base class adds
+        self.middlewares = [Middleware(admin_sessions.AdminSessionMiddleware), Middleware(AdminStoreMiddleware)]
+
     async def login(self, request: Request) -> bool:
         """Handle admin login"""
         form = await request.form()
         email = form.get("username")  # sqladmin uses "username" field
         password = form.get("password")
 
+        # same per-account bucket as POST /admin/login, fail before running bcrypt (the SQLite
+        # backend can wait on another worker's lock, so not on the event loop)
+        try:
+            await run_in_threadpool(check_account, f"admin:{email}")
+        except HTTPException:
+            return False
+
         db = SessionLocal()
         try:
             # Check if admin exists
@@ -33,13 +108,11 @@ class AdminAuth(AuthenticationBackend):
                 return False
 
             # Verify password
-            if not verify_password(password, admin.password):
+            if not admin.is_admin or not verify_password(password, admin.password):
                 return False
 
-            # Create token and store in session
-            request.session["admin_email"] = admin.email
-            request.session["is_admin"] = True
-
+            # resolved once here, later requests only look the session id up
+            admin_sessions.start_session(request.scope, admin.id, admin.email)
             return True
 
         finally:
@@ -47,31 +120,56 @@ class AdminAuth(AuthenticationBackend):
 
     async def logout(self, request: Request) -> bool:
         """Handle admin logout"""
-        request.session.clear()
+        admin_sessions.end_session(request.scope)
         return True
 
     async def authenticate(self, request: Request) -> bool:
-        """Check if user is authenticated"""
-        admin_email = request.session.get("admin_email")
-        is_admin = request.session.get("is_admin", False)
-
-        if not admin_email or not is_admin:
-            return False
+        """Check if user is authenticated (AdminSessionMiddleware already resolved the cookie)"""
+        return request.scope.get("admin") is not None
+
+class CachedCountMixin:
+    """
+    Cache the unfiltered row count used for pagination
+
+    Counting a big table on every list page is most of the page time. Postgres uses the
+    planner's estimate (pg_class.reltuples), everything else an exact count cached for
+    count_cache_seconds. Counts for searches are still exact.
+    """
+    count_cache_seconds = 30
+    _count_cache = {}
+
+    async def count(self, request, stmt=None):
+        if stmt is not None:
+            return await super().count(request, stmt)
+
+        key = (self.identity, current_store())
+        cached = self._count_cache.get(key)
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+
+        total = None
+        if engine.dialect.name == "postgresql":
+            estimate = select(literal_column("reltuples::bigint")).select_from(table("pg_class")).where(
+                literal_column("relname") == self.model.__tablename__
+            )
+            total = await super().count(request, estimate)
+            if total is not None and total < 1000:
+                total = None  # never analyzed or small enough to count exactly
+        if total is None:
+            total = await super().count(request)
+
+        self._count_cache[key] = (total, time.monotonic() + self.count_cache_seconds)
+        return total
 
-        # Verify admin still exists
-        db = SessionLocal()
-        try:
-            admin = db.query(AdminModel).filter(AdminModel.email == admin_email).first()
-            return admin is not None
-        finally:
-            db.close()
 
 #How admin sees users
-class UserAdmin(ModelView, model=User):
-    column_list = [User.user_id, User.name, User.email, User.orders]
+class UserAdmin(CachedCountMixin, ModelView, model=User):
+    # order_count instead of User.orders: the list page no longer loads every order of every user
+    column_list = [User.user_id, User.name, User.email, User.order_count]
     column_searchable_list = [User.name, User.email]
     column_sortable_list = [User.user_id, User.name]
     column_details_exclude_list = [User.password] #hides passwords
+    column_labels = {User.order_count: "Orders"}
     can_edit = True
     can_delete = True
     can_create = True
@@ -79,10 +177,15 @@ class UserAdmin(ModelView, model=User):
     name_plural = "Users"
     icon = "fa-user"
 
+    def list_query(self, request):
+        return select(User).options(load_only(User.user_id, User.name, User.email), undefer(User.order_count))
+
 class ItemAdmin(ModelView, model=Item):
-    column_list = [Item.id, Item.name, Item.description, Item.price]
-    column_searchable_list = [Item.name, Item.description, Item.price]
-    column_sortable_list = [Item.id, Item.name, Item.description, Item.price]
+    column_list = [Item.id, Item.name, Item.description, Item.price, Item.daily_stock, Item.remaining]
+    column_searchable_list = [Item.name, Item.description]
+    column_sortable_list = [Item.id, Item.name, Item.description, Item.price, Item.remaining]
+    form_excluded_columns = [Item.stock_day]
+    column_labels = {Item.daily_stock: "Daily stock", Item.remaining: "Left today"}
     can_create = True
     can_edit = True
     can_delete = True
@@ -91,16 +194,30 @@ class ItemAdmin(ModelView, model=Item):
     name_plural = "Items"
     icon = "fa-user fa-fries"
 
-class OrderAdmin(ModelView, model=Order):
-    column_list = [Order.id, Order.user, Order.status, Order.phone_num, Order.order_items, Order.payment_status]
+    def search_query(self, stmt, term):
+        # same full-text index as /items/search instead of LIKE '%term%' scans
+        condition = search.item_filter(term, engine.dialect.name)
+        return stmt if condition is None else stmt.filter(condition)
+
+class OrderAdmin(CachedCountMixin, ModelView, model=Order):
+    # item_count instead of Order.order_items: a count per row rather than every line item
+    column_list = [Order.id, Order.user, Order.status, Order.phone_num, Order.item_count, Order.payment_status]
     column_searchable_list = [Order.phone_num]
     column_sortable_list = [Order.id, Order.status]
+    column_labels = {Order.item_count: "Items"}
     can_edit = True
     can_delete = True
     name = "Order"
     name_plural = "Orders"
     icon = "fa-receipt"
 
+    def list_query(self, request):
+        return select(Order).options(
+            load_only(Order.id, Order.user_id, Order.status, Order.phone_num, Order.payment_status),
+            undefer(Order.item_count),
+            selectinload(Order.user).load_only(User.user_id, User.name),
+        )
+
     @action(
         name="approve_refund",
         label="✅ Approve & Refund",
@@ -112,8 +229,9 @@ class OrderAdmin(ModelView, model=Order):
 
         pks = request.query_params.get("pks", "").split(",")
 
-        db = SessionLocal()
+        db = shards.session(current_store())
         messages = []
+        stripe = providers.get("stripe")
 
         try:
             for pk in pks:
@@ -127,19 +245,23 @@ class OrderAdmin(ModelView, model=Order):
                     continue
 
                 refund_amount = None
+                was_paid = order.payment_status == "paid"
+                already_cancelled = order.status == OrderStatus.CANCELLED
 
                 # Process Stripe refund if paid
                 if order.payment_status == "paid" and order.stripe_session_id:
+                    # off the event loop, and fail fast while Stripe's circuit is open
                     try:
-                        stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
-                        stripe_session = stripe.checkout.Session.retrieve(order.stripe_session_id)
-                        refund = stripe.Refund.create(
-                            payment_intent=stripe_session.payment_intent
+                        stripe_session = await run_in_threadpool(
+                            stripe_breaker.call, stripe.checkout.Session.retrieve, order.stripe_session_id
+                        )
+                        refund = await run_in_threadpool(
+                            stripe_breaker.call, stripe.Refund.create, payment_intent=stripe_session.payment_intent
                         )
                         refund_amount = refund.amount / 100
                         order.payment_status = "refunded"
                         messages.append(f"Order #{pk}: Refunded ${refund_amount:.2f}")
-                    except stripe.error.StripeError as e:
+                    except (stripe.error.StripeError, CircuitOpenError) as e:
                         messages.append(f"Order #{pk}: Refund failed - {str(e)}")
                         continue
                 else:
@@ -148,7 +270,10 @@ class OrderAdmin(ModelView, model=Order):
                 # Update order status
                 order.status = OrderStatus.CANCELLED
                 if not order.cancelled_at:
-                    order.cancelled_at = datetime.utcnow()
+                    order.cancelled_at = datetime.datetime.utcnow()
+                if not already_cancelled:
+                    analytics.record_cancelled(db, order, was_paid)
+                    inventory.release(db, [order.id])
 
                 db.commit()
 
@@ -175,30 +300,66 @@ class OrderAdmin(ModelView, model=Order):
     )
     async def deny_cancellation(self, request):
         """Admin denies cancellation request"""
-        from Database.dbConnect import SessionLocal
         from starlette.responses import RedirectResponse
 
-        pks = request.query_params.get("pks", "").split(",")
+        await run_in_threadpool(self._bulk_status, request, OrderStatus.PENDING)
+        return RedirectResponse(url="/admin", status_code=302)
 
-        db = SessionLocal()
+    @action(
+        name="mark_done",
+        label="🍽️ Mark Done",
+        add_in_detail=True,
+        add_in_list=True
+    )
+    async def mark_done(self, request):
+        """Mark every selected order ready for pickup in one transaction"""
+        from starlette.responses import RedirectResponse
+
+        await run_in_threadpool(self._bulk_status, request, OrderStatus.DONE)
+        return RedirectResponse(url="/admin/order/list", status_code=302)
+
+    def _bulk_status(self, request, status):
+        # one transaction and commit, called through run_in_threadpool to keep it off the event loop
+        pks = [int(pk) for pk in request.query_params.get("pks", "").split(",") if pk]
+        if not pks:
+            return
+        db = shards.session(current_store())
         try:
-            for pk in pks:
-                if not pk:
-                    continue
+            kitchen.update_order_statuses(db, pks, status)
+        finally:
+            db.close()
+class ModerationActionsMixin:
+    """Approve/reject the selected reviews with one UPDATE per batch (owner/moderation.py)"""
 
-                order = db.query(Order).filter(Order.id == int(pk)).first()
+    @action(name="approve_reviews", label="✅ Approve", add_in_detail=True, add_in_list=True)
+    async def approve_reviews(self, request):
+        return await self._moderate(request, ReviewStatus.APPROVED)
+
+    @action(name="reject_reviews", label="❌ Reject", add_in_detail=True, add_in_list=True)
+    async def reject_reviews(self, request):
+        return await self._moderate(request, ReviewStatus.REJECTED)
 
-                if order and order.status == OrderStatus.CANCEL_REQUEST:
-                    order.status = OrderStatus.PENDING
-                    order.cancelled_at = None
-                    db.commit()
+    async def _moderate(self, request, status):
+        from starlette.responses import RedirectResponse
+
+        pks = [int(pk) for pk in request.query_params.get("pks", "").split(",") if pk]
+        if pks:
+            await run_in_threadpool(self._update_statuses, current_store(), pks, status)
+        return RedirectResponse(url=f"/admin/{self.identity}/list", status_code=302)
 
-            return RedirectResponse(url="/admin", status_code=302)
+    @staticmethod
+    def _update_statuses(store_id, pks, status):
+        db = shards.session(store_id)
+        try:
+            moderation.update_review_statuses(db, pks, status)
         finally:
             db.close()
-class ReviewAdmin(ModelView, model=Review):
+
+class ReviewAdmin(ModerationActionsMixin, ModelView, model=Review):
     column_list = [Review.id, Review.status, Review.rating, Review.user_id, Review.item_id]
-    column_searchable_list = [Review.user_id, Review.rating]
+    # searching user_id/rating directly made LIKE casts over integer columns; search_query
+    # matches a number exactly and anything else against the comment
+    column_searchable_list = [Review.comment]
     column_sortable_list = [Review.id, Review.user_id, Review.rating]
     can_edit = True
     can_delete = True
@@ -206,26 +367,81 @@ class ReviewAdmin(ModelView, model=Review):
     name_plural = "Reviews"
     icon = "fa-user fa-receipt"
 
-class OrderItemAdmin(ModelView, model=OrderItem):
-    column_list = [OrderItem.id, OrderItem.order_id, OrderItem.item, OrderItem.quantity, OrderItem.price_at_order]
+    def search_query(self, stmt, term):
+        term = term.strip()
+        if term.isdigit():
+            n = int(term)
+            return stmt.filter(or_(Review.id == n, Review.user_id == n, Review.item_id == n, Review.rating == n))
+        return stmt.filter(Review.comment.ilike(f"%{term}%"))
+
+class PendingReviewAdmin(ReviewAdmin, model=Review):
+    """Moderation queue: pending reviews oldest first, read off ix_reviews_status_id"""
+    column_default_sort = [(Review.id, False)]
+    can_create = False
+    name = "Pending Review"
+    name_plural = "Pending Reviews"
+    icon = "fa-hourglass-half"
+
+    def list_query(self, request):
+        return select(Review).where(Review.status == ReviewStatus.PENDING)
+
+    def count_query(self, request):
+        return select(func.count(Review.id)).where(Review.status == ReviewStatus.PENDING)
+
+# sqladmin names views after their model, give the queue its own URL (/admin/pending-review)
+PendingReviewAdmin.identity = "pending-review"
+
+class ArchivedOrderAdmin(CachedCountMixin, ModelView, model=ArchivedOrder):
+    """Read-only view of orders moved out by owner/archive.py"""
+    column_list = [ArchivedOrder.id, ArchivedOrder.user_id, ArchivedOrder.status, ArchivedOrder.phone_num,
+                   ArchivedOrder.payment_status, ArchivedOrder.created_at, ArchivedOrder.archived_at]
+    column_searchable_list = [ArchivedOrder.phone_num]
+    column_sortable_list = [ArchivedOrder.id, ArchivedOrder.created_at]
+    column_default_sort = [(ArchivedOrder.id, True)]
+    can_create = False
+    can_edit = False
+    can_delete = False
+    name = "Archived Order"
+    name_plural = "Archived Orders"
+    icon = "fa-box-archive"
+
+class OrderItemAdmin(CachedCountMixin, ModelView, model=OrderItem):
+    column_list = [OrderItem.id, OrderItem.order_id, OrderItem.item_name, OrderItem.quantity, OrderItem.price_at_order]
     column_searchable_list = [OrderItem.order_id]
     column_sortable_list = [OrderItem.id, OrderItem.order_id, OrderItem.quantity]
+    column_labels = {OrderItem.item_name: "Item"}
     can_edit = True
     can_delete = True
     name = "Order Item"
     name_plural = "Order Items"
     icon = "fa-shopping-cart"
 
+    def list_query(self, request):
+        return select(OrderItem).options(undefer(OrderItem.item_name))
+
+class StoreAdmin(BaseView):
+    """Pick the store every other admin page works on"""
+    name = "Stores"
+    icon = "fa-store"
+
+    @expose("/stores", methods=["GET"])
+    async def stores(self, request: Request):
+        return await self.templates.TemplateResponse(request, "stores.html", {
+            "title": "Stores", "stores": shards.store_ids(), "current": current_store(),
+        })
+
 def setup_admin(app):
-    secret_key = os.getenv("SECRET_KEY")
-    if not secret_key:
-        secret_key = secrets.token_urlsafe(32)
-    authentication_backend = AdminAuth(secret_key=secret_key)
-    admin = Admin(app, engine, title='J-Bites Admin', authentication_backend=authentication_backend)
+    authentication_backend = AdminAuth()
+    admin = Admin(app, engine, session_maker=StoreSessionMaker(class_=Session), title='J-Bites Admin',
+                  templates_dir=os.path.join(os.path.dirname(__file__), "templates"),
+                  authentication_backend=authentication_backend)
 
     admin.add_view(UserAdmin)
     admin.add_view(ItemAdmin)
     admin.add_view(OrderAdmin)
     admin.add_view(ReviewAdmin)
+    admin.add_view(PendingReviewAdmin)
     admin.add_view(OrderItemAdmin)
+    admin.add_view(ArchivedOrderAdmin)
+    admin.add_base_view(StoreAdmin)
     return admin
\ No newline at end of file
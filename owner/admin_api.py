@@ -0,0 +1,106 @@
+"""
+JSON endpoints for the owner, all admin-only
+
+This router has to be included before sqladmin is mounted at /admin, otherwise the
+mount swallows every /admin/* path. Endpoints work on one store (?store_id= or
+X-Store-ID, the default store otherwise); the analytics ones take all_stores=true to
+add up every store's rollups instead.
+"""
+from datetime import date, timedelta
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from Database.dbConnect import ReadSession, WriteSession, shards
+from Database import serializers
+from Database.dbModels import Admin, Order, OrderResponse, OrderStatus, OrderStatusUpdate, ReviewStatusUpdate
+from middleware.security import get_current_admin
+from owner import analytics, exports, kitchen, moderation
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+CurrentAdmin = Annotated[Admin, Depends(get_current_admin)]
+
+
+def _date_range(start: date | None, end: date | None) -> tuple[date, date]:
+    end = end or date.today()
+    start = start or end - timedelta(days=30)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    return start, end
+
+
+@router.get("/orders/pending-cancellations", response_model=list[OrderResponse])
+def get_pending_cancellations(current_admin: CurrentAdmin, db: WriteSession):
+    """Get all orders with cancellation requests - admin only"""
+    orders = (
+        db.query(Order)
+        .options(*serializers.ORDER_RESPONSE_OPTIONS)
+        .filter(Order.status == OrderStatus.CANCEL_REQUEST)
+        .all()
+    )
+    return serializers.respond(serializers.order_list_adapter, [serializers.order_response(o) for o in orders])
+
+
+@router.post("/orders/status")
+def update_order_status(update: OrderStatusUpdate, current_admin: CurrentAdmin, db: WriteSession):
+    """Move many orders to one status at once (e.g. clear finished tickets to done)"""
+    return kitchen.update_order_statuses(db, update.order_ids, update.status)
+
+
+@router.get("/reviews/pending")
+def get_pending_reviews(current_admin: CurrentAdmin, db: ReadSession, after: int | None = None,
+                        limit: int = Query(50, ge=1, le=200)):
+    """Moderation queue, oldest first; pass the last id seen as `after` for the next page"""
+    pending = moderation.pending_reviews(db, after, limit)
+    return {
+        "reviews": [{"id": r.id, "item_id": r.item_id, "user_id": r.user_id, "rating": r.rating, "comment": r.comment}
+                    for r in pending],
+        "next": pending[-1].id if len(pending) == limit else None,
+    }
+
+
+@router.post("/reviews/status")
+def update_review_status(update: ReviewStatusUpdate, current_admin: CurrentAdmin, db: WriteSession):
+    """Approve or reject many reviews at once"""
+    return moderation.update_review_statuses(db, update.review_ids, update.status)
+
+
+@router.get("/analytics/daily")
+def analytics_daily(current_admin: CurrentAdmin, db: ReadSession, start: date | None = None, end: date | None = None,
+                    all_stores: bool = False):
+    """Orders, revenue and cancellations per day (defaults to the last 30 days)"""
+    start, end = _date_range(start, end)
+    if not all_stores:
+        return {"start": start, "end": end, "days": analytics.daily(db, start, end)}
+    per_store = shards.gather(lambda store_db, store_id: analytics.daily(store_db, start, end))
+    return {"start": start, "end": end, "days": analytics.merge_daily(per_store.values())}
+
+
+@router.get("/analytics/top-items")
+def analytics_top_items(current_admin: CurrentAdmin, db: ReadSession, start: date | None = None,
+                        end: date | None = None, limit: int = 10, by: str = "revenue", all_stores: bool = False):
+    """Best sellers in the range, sorted by revenue or units"""
+    if by not in ("revenue", "units"):
+        raise HTTPException(status_code=400, detail="by must be 'revenue' or 'units'")
+    start, end = _date_range(start, end)
+    limit = min(limit, 100)
+    if not all_stores:
+        return {"start": start, "end": end, "items": analytics.top_items(db, start, end, limit, by)}
+    # each store's full ranking for the range, a store's #11 can still be the chain's #3
+    per_store = shards.gather(lambda store_db, store_id: analytics.top_items(store_db, start, end, None, by))
+    return {"start": start, "end": end, "items": analytics.merge_top_items(per_store.values(), limit, by)}
+
+
+@router.get("/export/orders")
+def export_orders(current_admin: CurrentAdmin, start: date | None = None, end: date | None = None, format: str = "csv"):
+    """Every order line in the range, from every store, as a gzipped CSV or JSON Lines download"""
+    if format not in ("csv", "jsonl"):
+        raise HTTPException(status_code=400, detail="format must be 'csv' or 'jsonl'")
+    start, end = _date_range(start, end)
+    return StreamingResponse(
+        exports.stream_orders(start, end, format),
+        media_type="application/gzip",
+        headers={"Content-Disposition": f'attachment; filename="orders-{start}-{end}.{format}.gz"'},
+    )
@@ -0,0 +1,221 @@
+"""
+Daily sales rollups for the owner dashboard
+
+Rollups are updated in the same transaction that marks an order paid (stripe_webhook)
+or cancelled (approve_refund), so range queries never touch order_items. Each store's
+rollups live in its own database next to its orders. Rebuild them from scratch with:
+
+    python -m owner.analytics backfill
+"""
+import itertools
+import logging
+import sys
+from datetime import date, datetime
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from Database.dbModels import ArchivedOrder, DailyItemSales, DailySales, Item, Order, OrderStatus
+
+logger = logging.getLogger(__name__)
+
+
+def _cents(price: float) -> int:
+    return int(round(price * 100))
+
+
+def _bump(db: Session, model, key: dict, deltas: dict):
+    """Add deltas to the rollup row for key, creating the row if needed"""
+    values = {getattr(model, column): getattr(model, column) + delta for column, delta in deltas.items()}
+    if db.query(model).filter_by(**key).update(values, synchronize_session=False):
+        return
+    try:
+        with db.begin_nested():
+            db.add(model(**key, **deltas))
+    except IntegrityError:
+        # another request created the row first
+        db.query(model).filter_by(**key).update(values, synchronize_session=False)
+
+
+def _order_day(order: Order) -> date:
+    return (order.created_at or datetime.utcnow()).date()
+
+
+def _lines_by_item(order: Order) -> dict:
+    """item_id -> (units, revenue cents) for one order"""
+    per_item = {}
+    for line in order.order_items:
+        units, cents = per_item.get(line.item_id, (0, 0))
+        per_item[line.item_id] = (units + line.quantity, cents + _cents(line.price_at_order) * line.quantity)
+    return per_item
+
+
+def record_paid(db: Session, order: Order):
+    """Call when an order becomes paid, before committing"""
+    day = _order_day(order)
+    per_item = _lines_by_item(order)
+    total = sum(cents for _, cents in per_item.values())
+    _bump(db, DailySales, {"day": day}, {"orders": 1, "revenue_cents": total})
+    for item_id, (units, cents) in per_item.items():
+        _bump(db, DailyItemSales, {"day": day, "item_id": item_id},
+              {"units": units, "revenue_cents": cents, "order_count": 1})
+
+
+def record_cancelled(db: Session, order: Order, was_paid: bool):
+    """Call when an order is cancelled, was_paid backs its sales out of the rollups"""
+    day = _order_day(order)
+    per_item = _lines_by_item(order)
+    deltas = {"cancellations": 1}
+    if was_paid:
+        deltas.update(orders=-1, revenue_cents=-sum(cents for _, cents in per_item.values()))
+    _bump(db, DailySales, {"day": day}, deltas)
+
+    for item_id, (units, cents) in per_item.items():
+        deltas = {"cancellations": 1}
+        if was_paid:
+            deltas.update(units=-units, revenue_cents=-cents, order_count=-1)
+        _bump(db, DailyItemSales, {"day": day, "item_id": item_id}, deltas)
+
+
+def daily(db: Session, start: date, end: date) -> list[dict]:
+    rows = db.query(DailySales).filter(DailySales.day >= start, DailySales.day <= end).order_by(DailySales.day)
+    return [
+        {
+            "day": row.day,
+            "orders": row.orders,
+            "revenue": row.revenue_cents / 100,
+            "cancellations": row.cancellations,
+        }
+        for row in rows
+    ]
+
+
+def top_items(db: Session, start: date, end: date, limit: int | None = 10, by: str = "revenue") -> list[dict]:
+    units = func.sum(DailyItemSales.units)
+    revenue = func.sum(DailyItemSales.revenue_cents)
+    rows = (
+        db.query(
+            DailyItemSales.item_id,
+            Item.name,
+            units,
+            revenue,
+            func.sum(DailyItemSales.order_count),
+            func.sum(DailyItemSales.cancellations),
+        )
+        .join(Item, Item.id == DailyItemSales.item_id)
+        .filter(DailyItemSales.day >= start, DailyItemSales.day <= end)
+        .group_by(DailyItemSales.item_id, Item.name)
+        .order_by((units if by == "units" else revenue).desc())
+        .limit(limit)
+    )
+    return [
+        {
+            "item_id": item_id,
+            "name": name,
+            "units": units,
+            "revenue": revenue_cents / 100,
+            "orders": orders,
+            "cancellations": cancellations,
+        }
+        for item_id, name, units, revenue_cents, orders, cancellations in rows
+    ]
+
+
+def merge_daily(per_store) -> list[dict]:
+    """Add up daily() results from several stores"""
+    days = {}
+    for rows in per_store:
+        for row in rows:
+            total = days.setdefault(row["day"], {"day": row["day"], "orders": 0, "revenue": 0, "cancellations": 0})
+            total["orders"] += row["orders"]
+            total["revenue"] = round(total["revenue"] + row["revenue"], 2)
+            total["cancellations"] += row["cancellations"]
+    return [days[day] for day in sorted(days)]
+
+
+def merge_top_items(per_store, limit: int = 10, by: str = "revenue") -> list[dict]:
+    """
+    Add up top_items() results from several stores and re-rank
+
+    Item ids are per store (every store has its own menu), so the same dish is matched
+    across stores by name and the merged rows carry the name only.
+    """
+    merged = {}
+    for rows in per_store:
+        for row in rows:
+            total = merged.setdefault(row["name"], {"name": row["name"], "units": 0, "revenue": 0,
+                                                    "orders": 0, "cancellations": 0})
+            total["units"] += row["units"]
+            total["revenue"] = round(total["revenue"] + row["revenue"], 2)
+            total["orders"] += row["orders"]
+            total["cancellations"] += row["cancellations"]
+    return sorted(merged.values(), key=lambda row: row[by], reverse=True)[:limit]
+
+
+def backfill(db: Session):
+    """Rebuild both rollup tables from orders/order_items and their archive"""
+    db.query(DailyItemSales).delete()
+    db.query(DailySales).delete()
+
+    # archived orders (owner/archive.py) still count towards their day
+    orders = itertools.chain.from_iterable(
+        db.query(model)
+        .filter((model.payment_status.in_(["paid", "refunded"])) | (model.status == OrderStatus.CANCELLED))
+        .order_by(model.id)
+        .yield_per(1000)
+        for model in (ArchivedOrder, Order)
+    )
+    days = {}
+    items = {}
+    for order in orders:
+        day = _order_day(order)
+        cancelled = order.status == OrderStatus.CANCELLED
+        paid = order.payment_status == "paid" and not cancelled
+        if not paid and not cancelled:
+            continue
+
+        totals = days.setdefault(day, {"orders": 0, "revenue_cents": 0, "cancellations": 0})
+        per_item = _lines_by_item(order)
+        if paid:
+            totals["orders"] += 1
+            totals["revenue_cents"] += sum(cents for _, cents in per_item.values())
+        else:
+            totals["cancellations"] += 1
+
+        for item_id, (units, cents) in per_item.items():
+            row = items.setdefault((day, item_id), {"units": 0, "revenue_cents": 0, "order_count": 0, "cancellations": 0})
+            if paid:
+                row["units"] += units
+                row["revenue_cents"] += cents
+                row["order_count"] += 1
+            else:
+                row["cancellations"] += 1
+
+    db.add_all(DailySales(day=day, **totals) for day, totals in days.items())
+    db.add_all(DailyItemSales(day=day, item_id=item_id, **row) for (day, item_id), row in items.items())
+    db.commit()
+    return len(days), len(items)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["backfill"]:
+        sys.exit("usage: python -m owner.analytics backfill")
+
+    import Database.dbModels  # noqa: F401  registers every table
+    from middleware.log import setup_logging, stop_logging
+    from Database.dbConnect import Base, shards
+
+    setup_logging()
+    try:
+        for store_id in shards.store_ids():
+            Base.metadata.create_all(shards.engine(store_id))
+            session = shards.session(store_id)
+            try:
+                day_count, item_count = backfill(session)
+            finally:
+                session.close()
+            logger.info(f"Rebuilt {day_count} daily rows and {item_count} item rows for store {store_id}",
+                        extra={"store_id": store_id, "days": day_count, "item_rows": item_count})
+    finally:
+        stop_logging()
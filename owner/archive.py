@@ -0,0 +1,195 @@
+"""
+Hot/cold archival of finished orders
+
+Every DONE or CANCELLED order older than ARCHIVE_AFTER_DAYS is moved, line items and
+all, into archived_orders / archived_order_items. The hot tables (and their indexes)
+then only hold orders someone is still likely to touch, small enough to stay in cache.
+
+Each batch of ARCHIVE_BATCH_SIZE orders is copied and deleted in one transaction, so a
+crash or restart leaves every order in exactly one place, and the next run simply
+carries on with whatever is still hot. Run a pass by hand (e.g. for the first, large
+move) with:
+
+    python -m owner.archive
+
+Reads go to the hot tables first and look in the archive when they come up empty there;
+a user's order history pages through both. Ids are never reused once archived (AUTOINCREMENT
+on SQLite, sequences on Postgres); ensure_autoincrement upgrades SQLite files made before.
+"""
+import logging
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import MetaData, delete, func, insert, select, text
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.orm import Session
+
+from config.config import settings
+from Database import serializers
+from Database.dbConnect import Base, shards
+from Database.dbModels import ArchivedOrder, ArchivedOrderItem, Order, OrderItem, OrderStatus
+from middleware import metrics
+
+logger = logging.getLogger(__name__)
+
+_ORDER_COLUMNS = ["id", "status", "user_id", "phone_num", "created_at", "cancelled_at", "stripe_session_id",
+                  "payment_status", "paid_at", "store_id"]
+_ITEM_COLUMNS = ["id", "order_id", "item_id", "quantity", "price_at_order", "store_id"]
+
+
+def archive_orders(db: Session, order_ids: list[int]) -> int:
+    """Move these orders and their line items to the archive tables, caller commits"""
+    moved = db.execute(
+        insert(ArchivedOrder).from_select(
+            _ORDER_COLUMNS,
+            select(*(getattr(Order, column) for column in _ORDER_COLUMNS)).where(Order.id.in_(order_ids)),
+        )
+    ).rowcount
+    items = db.execute(
+        insert(ArchivedOrderItem).from_select(
+            _ITEM_COLUMNS,
+            select(*(getattr(OrderItem, column) for column in _ITEM_COLUMNS)).where(OrderItem.order_id.in_(order_ids)),
+        )
+    ).rowcount
+    db.execute(delete(OrderItem).where(OrderItem.order_id.in_(order_ids)))
+    db.execute(delete(Order).where(Order.id.in_(order_ids)))
+    metrics.inc("archived_orders_total", moved)
+    metrics.inc("archived_order_items_total", items)
+    return moved
+
+
+def archive_old_orders() -> int:
+    """Archive finished orders older than ARCHIVE_AFTER_DAYS in every store, one short transaction per batch"""
+    if settings.ARCHIVE_AFTER_DAYS <= 0:
+        return 0
+    cutoff = datetime.utcnow() - timedelta(days=settings.ARCHIVE_AFTER_DAYS)
+    started = time.monotonic()
+    total = sum(_archive_store(store_id, cutoff) for store_id in shards.store_ids())
+
+    metrics.observe("archive_run", time.monotonic() - started)
+    metrics.set_gauge("archive_last_run_timestamp", time.time())
+    if total:
+        logger.info(f"Archived {total} orders older than {cutoff:%Y-%m-%d}")
+    return total
+
+
+def _archive_store(store_id: int, cutoff: datetime) -> int:
+    total = 0
+    while True:
+        db = shards.session(store_id)
+        try:
+            ids = [
+                order_id for (order_id,) in db.query(Order.id).filter(
+                    Order.status.in_([OrderStatus.DONE, OrderStatus.CANCELLED]),
+                    Order.created_at < cutoff,
+                ).order_by(Order.id).limit(settings.ARCHIVE_BATCH_SIZE)
+            ]
+            if not ids:
+                break
+            total += archive_orders(db, ids)
+            db.commit()
+        finally:
+            db.close()
+
+        if len(ids) < settings.ARCHIVE_BATCH_SIZE:
+            break
+        # let other writers take the lock between batches
+        time.sleep(settings.ARCHIVE_BATCH_PAUSE)
+    return total
+
+
+def ensure_autoincrement(engine):
+    """
+    SQLite: rebuild orders / order_items if they were created without AUTOINCREMENT
+
+    Safe to run on every startup, it does nothing once both tables have it. The new
+    sequence starts above the highest archived id as well as the highest hot one.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conn:
+        for table, archived in ((Order.__table__, ArchivedOrder), (OrderItem.__table__, ArchivedOrderItem)):
+            ddl = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                               {"name": table.name}).scalar()
+            if ddl is None or "AUTOINCREMENT" in ddl.upper():
+                continue
+            # the usual SQLite rebuild: new table, copy, drop the old one, rename into place
+            metadata = MetaData()
+            for other in Base.metadata.sorted_tables:
+                other.to_metadata(metadata)
+            rebuilt = table.to_metadata(metadata, name=f"{table.name}_rebuild")
+            columns = ", ".join(column.name for column in table.columns)
+            conn.execute(CreateTable(rebuilt))
+            conn.execute(text(f"INSERT INTO {rebuilt.name} ({columns}) SELECT {columns} FROM {table.name}"))
+            conn.execute(text(f"DROP TABLE {table.name}"))
+            conn.execute(text(f"ALTER TABLE {rebuilt.name} RENAME TO {table.name}"))
+            for index in table.indexes:
+                index.create(conn)
+
+            newest = max(conn.execute(select(func.max(table.c.id))).scalar() or 0,
+                         conn.execute(select(func.max(archived.id))).scalar() or 0)
+            conn.execute(text("DELETE FROM sqlite_sequence WHERE name = :name"), {"name": table.name})
+            conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)"),
+                         {"name": table.name, "seq": newest})
+            logger.info(f"Rebuilt {table.name} with AUTOINCREMENT, new ids start after {newest}")
+
+
+# Read fallbacks: hot tables first, the archive only on a miss
+
+
+def find_order(db: Session, order_id: int, for_response: bool = True):
+    """The order with this id, hot or archived (None if neither)"""
+    hot = db.query(Order)
+    cold = db.query(ArchivedOrder)
+    if for_response:
+        hot = hot.options(*serializers.ORDER_RESPONSE_OPTIONS)
+        cold = cold.options(*serializers.ARCHIVED_ORDER_RESPONSE_OPTIONS)
+    return hot.filter(Order.id == order_id).first() or cold.filter(ArchivedOrder.id == order_id).first()
+
+
+def orders_by_phone(db: Session, phone_num: str) -> list:
+    """Hot orders for this number, or its archived history if it has none"""
+    orders = db.query(Order).options(*serializers.ORDER_RESPONSE_OPTIONS).filter(Order.phone_num == phone_num).all()
+    if orders:
+        return orders
+    return (
+        db.query(ArchivedOrder)
+        .options(*serializers.ARCHIVED_ORDER_RESPONSE_OPTIONS)
+        .filter(ArchivedOrder.phone_num == phone_num)
+        .all()
+    )
+
+
+def user_orders(db: Session, user_id: int, limit: int, before: int | None = None,
+                status: OrderStatus | None = None) -> list:
+    """
+    Up to `limit` of a user's orders with id < before, newest first
+
+    Orders are archived when they finish, not in id order, so archived ids sit between
+    hot ones: both tables give their own keyset page and the two are merged.
+    """
+    pages = []
+    for model, options in ((Order, serializers.ORDER_RESPONSE_OPTIONS),
+                           (ArchivedOrder, serializers.ARCHIVED_ORDER_RESPONSE_OPTIONS)):
+        query = db.query(model).options(*options).filter(model.user_id == user_id)
+        if status is not None:
+            query = query.filter(model.status == status)
+        if before is not None:
+            query = query.filter(model.id < before)
+        pages.extend(query.order_by(model.id.desc()).limit(limit).all())
+    return sorted(pages, key=lambda order: order.id, reverse=True)[:limit]
+
+
+if __name__ == "__main__":
+    if sys.argv[1:]:
+        sys.exit("usage: python -m owner.archive")
+
+    from middleware.log import setup_logging, stop_logging
+
+    setup_logging()
+    for store_id in shards.store_ids():
+        Base.metadata.create_all(shards.engine(store_id))
+        ensure_autoincrement(shards.engine(store_id))
+    logger.info("Archive pass finished", extra={"orders": archive_old_orders()})
+    stop_logging()
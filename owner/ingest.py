@@ -0,0 +1,225 @@
+"""
+Order ingestion: writing a new order, optionally through a group-commit writer
+
+By default create_order writes and commits its own order. With ORDER_GROUP_COMMIT=true
+requests hand their validated order to a writer thread (one per store, per process). It takes
+everything queued (up to ORDER_BATCH_SIZE, lingering ORDER_BATCH_LINGER_MS for more),
+writes the batch in one transaction and one commit (one fsync on SQLite), then resolves
+each request's Future with its order. A sold-out or unknown item only fails that order.
+If the commit itself fails the batch is retried one order per transaction, so one bad
+order can't take the others down with it. A request that gives up waiting
+(ORDER_INGEST_TIMEOUT) gets a 503 and its order is dropped: skipped if it's still queued,
+deleted (stock and all) if the writer already had it.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent import futures
+from concurrent.futures import Future
+from functools import partial
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from config import providers
+from config.config import settings
+from Database import inventory
+from Database.dbConnect import shards, store_of
+from Database.dbModels import Item, Order, OrderCreate, OrderItem, OrderStatus
+from middleware import metrics
+from owner.reaper import delete_unpaid_orders
+
+logger = logging.getLogger(__name__)
+
+
+def write_order(db: Session, user_id: int, order_data: OrderCreate) -> dict:
+    """
+    Reserve stock and insert one pending order, caller commits
+
+    Raises HTTPException (404 unknown item, 409 sold out) without leaving anything
+    written in the session. Returns {"order_id", "stripe_items", "total"}.
+    """
+    item_ids = {line.item_id for line in order_data.items}
+    items = {item.id: item for item in db.query(Item).filter(Item.id.in_(item_ids))}
+    for line in order_data.items:
+        if line.item_id not in items:
+            raise HTTPException(status_code=404, detail=f"Item with id {line.item_id} not found")
+
+    quantities = {}
+    for line in order_data.items:
+        quantities[line.item_id] = quantities.get(line.item_id, 0) + line.quantity
+    sold_out = inventory.reserve(db, quantities)
+    if sold_out:
+        names = ", ".join(items[item_id].name for item_id in sold_out)
+        raise HTTPException(status_code=409, detail=f"Sold out: {names}")
+
+    store_id = store_of(db)
+    order = Order(
+        status=OrderStatus.PENDING,
+        phone_num=order_data.phone_num,
+        user_id=user_id,
+        payment_status="pending",
+        store_id=store_id,
+    )
+    db.add(order)
+    db.flush()
+
+    stripe_items = []
+    total_price = 0
+    for line in order_data.items:
+        item = items[line.item_id]
+        db.add(OrderItem(order_id=order.id, item_id=item.id, quantity=line.quantity, price_at_order=item.price,
+                         store_id=store_id))
+        stripe_items.append({'name': item.name, 'quantity': line.quantity, 'price': item.price})
+        total_price += item.price * line.quantity
+    return {"order_id": order.id, "stripe_items": stripe_items, "total": total_price}
+
+
+class _Job:
+    def __init__(self, user_id: int, order_data: OrderCreate):
+        self.user_id = user_id
+        self.order_data = order_data
+        self.future = Future()
+        self.queued = time.monotonic()
+
+
+class OrderWriter:
+    """Single writer thread that commits one store's queued orders in groups"""
+
+    def __init__(self, batch_size: int | None = None, linger: float | None = None, store_id: int | None = None):
+        self.store_id = store_id
+        self.batch_size = batch_size or settings.ORDER_BATCH_SIZE
+        self.linger = settings.ORDER_BATCH_LINGER_MS / 1000 if linger is None else linger
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=f"order-writer-{store_id}", daemon=True)
+        self._thread.start()
+
+    def submit(self, user_id: int, order_data: OrderCreate) -> Future:
+        """Queue an order, the Future resolves to write_order's result or raises its HTTPException"""
+        job = _Job(user_id, order_data)
+        self._queue.put(job)
+        return job.future
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join(timeout=10)
+
+    def _next_batch(self) -> list[_Job] | None:
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        # whatever queued up during the last commit, then a short linger for stragglers
+        deadline = time.monotonic() + self.linger
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                job = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is None:
+                self._queue.put(None)  # stop after this batch
+                break
+            batch.append(job)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            # requests that timed out while queued cancelled their job, leave those out
+            batch = [job for job in batch if job.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                self._write(batch)
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0].future.set_exception(e)
+                    continue
+                logger.exception(f"Group commit of {len(batch)} orders failed, retrying one by one")
+                metrics.inc("order_batch_failures_total")
+                for job in batch:
+                    try:
+                        self._write([job])
+                    except Exception as e:
+                        job.future.set_exception(e)
+
+    def _write(self, batch: list[_Job]):
+        started = time.monotonic()
+        results = []
+        db = shards.session(self.store_id)
+        try:
+            for job in batch:
+                try:
+                    results.append((job, write_order(db, job.user_id, job.order_data), None))
+                except HTTPException as e:
+                    results.append((job, None, e))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        metrics.inc("order_batches_total")
+        metrics.inc("order_batch_orders_total", len(batch))
+        metrics.observe("order_batch_commit", time.monotonic() - started)
+        for job, result, error in results:
+            metrics.observe("order_ingest_wait", time.monotonic() - job.queued)
+            if error is None:
+                job.future.set_result(result)
+            else:
+                job.future.set_exception(error)
+
+
+def _writer(store_id: int) -> OrderWriter:
+    name = f"order_writer:{store_id}"
+    if providers.peek(name) is None:
+        providers.register(name, lambda: OrderWriter(store_id=store_id))
+    return providers.get(name)
+
+
+def ingest_order(db: Session, user_id: int, order_data: OrderCreate) -> dict:
+    """Write and commit one order, through the store's group-commit writer when it's enabled"""
+    if settings.ORDER_GROUP_COMMIT:
+        store_id = store_of(db)
+        future = _writer(store_id).submit(user_id, order_data)
+        try:
+            return future.result(timeout=settings.ORDER_INGEST_TIMEOUT)
+        except futures.TimeoutError:
+            if not future.cancel():
+                # the writer already has it: undo the order once it's committed
+                future.add_done_callback(partial(_discard, store_id))
+            metrics.inc("order_ingest_timeouts_total")
+            raise HTTPException(status_code=503, detail="Too many orders right now, please try again shortly",
+                                headers={"Retry-After": "1"})
+    result = write_order(db, user_id, order_data)
+    db.commit()
+    return result
+
+
+def _discard(store_id: int, future: Future):
+    """Delete an order whose request gave up on it, giving its stock back"""
+    if future.cancelled() or future.exception() is not None:
+        return
+    db = shards.session(store_id)
+    try:
+        delete_unpaid_orders(db, [future.result()["order_id"]])
+        db.commit()
+    except Exception:
+        logger.exception("Could not delete an order abandoned by its request")
+    finally:
+        db.close()
+
+
+def close_writer():
+    """Commit anything still queued (called on shutdown)"""
+    for store_id in shards.store_ids():
+        name = f"order_writer:{store_id}"
+        writer = providers.peek(name)
+        if writer is not None:
+            writer.close()
+            providers.reset(name)
@@ -0,0 +1,94 @@
+"""
+Bulk order status changes for the kitchen
+
+Statuses are validated in memory, then applied with one UPDATE ... WHERE id IN (...)
+per target status and a single commit. Customer texts go out after the commit.
+"""
+from datetime import datetime
+
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session, selectinload
+
+from Database import inventory
+from Database.dbModels import Order, OrderStatus
+from owner import analytics
+from owner.notifications import notify_order_cancelled, notify_order_ready
+
+# current status -> statuses it may move to
+ALLOWED_TRANSITIONS = {
+    OrderStatus.PENDING: {OrderStatus.DONE, OrderStatus.CANCELLED},
+    OrderStatus.CANCEL_REQUEST: {OrderStatus.CANCELLED, OrderStatus.PENDING},  # PENDING = request denied
+}
+
+
+def _sources(target: OrderStatus) -> list[OrderStatus]:
+    return [source for source, targets in ALLOWED_TRANSITIONS.items() if target in targets]
+
+
+def update_order_statuses(db: Session, order_ids: list[int], status: OrderStatus) -> dict:
+    """
+    Move every order in order_ids to status in one transaction
+
+    Returns {"updated": [ids], "errors": {id: reason}}. Orders that can't make the
+    transition are reported and skipped, the rest are still applied.
+    """
+    rows = db.query(Order.id, Order.status, Order.payment_status).filter(Order.id.in_(order_ids)).all()
+    found = {row.id: row for row in rows}
+
+    updated = []
+    errors = {}
+    for order_id in dict.fromkeys(order_ids):
+        row = found.get(order_id)
+        if row is None:
+            errors[order_id] = "Order not found"
+        elif status not in ALLOWED_TRANSITIONS.get(row.status, ()):
+            errors[order_id] = f"Cannot change a {row.status.value} order to {status.value}"
+        elif status == OrderStatus.CANCELLED and row.payment_status == "paid":
+            errors[order_id] = "Paid orders must be cancelled with Approve & Refund"
+        else:
+            updated.append(order_id)
+
+    if not updated:
+        return {"updated": [], "errors": errors}
+
+    values = {Order.status: status}
+    if status == OrderStatus.CANCELLED:
+        values[Order.cancelled_at] = func.coalesce(Order.cancelled_at, datetime.utcnow())
+    elif status == OrderStatus.PENDING:
+        values[Order.cancelled_at] = None
+
+    # the status condition guards against a concurrent change since the SELECT above; only
+    # the rows this UPDATE really changed get their stock, rollups and texts
+    guard = [Order.id.in_(updated), Order.status.in_(_sources(status))]
+    if status == OrderStatus.CANCELLED:
+        guard.append(Order.payment_status != "paid")
+    changed = set(db.execute(
+        update(Order).where(*guard).values(values).returning(Order.id).execution_options(synchronize_session=False)
+    ).scalars())
+    for order_id in updated:
+        if order_id not in changed:
+            errors[order_id] = "Order was changed by someone else, reload and try again"
+    updated = [order_id for order_id in updated if order_id in changed]
+    if not updated:
+        db.commit()
+        return {"updated": [], "errors": errors}
+
+    notify = []
+    if status == OrderStatus.CANCELLED:
+        inventory.release(db, updated)
+    if status in (OrderStatus.DONE, OrderStatus.CANCELLED):
+        orders = db.query(Order).options(selectinload(Order.order_items)).filter(Order.id.in_(updated)).all()
+        for order in orders:
+            if status == OrderStatus.CANCELLED:
+                analytics.record_cancelled(db, order, was_paid=False)
+            notify.append((order.phone_num, order.id))
+    db.commit()
+
+    # bulk UPDATE skips the before_update SMS hook, so notify here once everything is committed
+    for phone, order_id in notify:
+        if status == OrderStatus.DONE:
+            notify_order_ready(phone, order_id)
+        else:
+            notify_order_cancelled(phone, order_id)
+
+    return {"updated": updated, "errors": errors}
@@ -0,0 +1,52 @@
+"""
+Bulk review moderation
+
+Approving or rejecting a backlog of reviews is one UPDATE ... WHERE id IN (...) per
+MODERATION_BATCH_SIZE ids and a single commit, never a load-and-save per review. The
+affected items' cached review listings are dropped once the commit lands.
+"""
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from config.config import settings
+from Database import reviews
+from Database.dbModels import Review, ReviewStatus
+
+
+def update_review_statuses(db: Session, review_ids: list[int], status: ReviewStatus) -> dict:
+    """
+    Move every review in review_ids to status in one transaction
+
+    Returns {"updated": [ids], "errors": {id: reason}} like kitchen.update_order_statuses.
+    Reviews that don't exist or already have that status are reported and skipped.
+    """
+    review_ids = list(dict.fromkeys(review_ids))
+    updated = []
+    item_ids = set()
+    for start in range(0, len(review_ids), settings.MODERATION_BATCH_SIZE):
+        batch = review_ids[start:start + settings.MODERATION_BATCH_SIZE]
+        rows = db.execute(
+            update(Review)
+            .where(Review.id.in_(batch), Review.status != status)
+            .values(status=status)
+            .returning(Review.id, Review.item_id)
+        ).all()
+        updated.extend(row.id for row in rows)
+        item_ids.update(row.item_id for row in rows)
+
+    # bulk UPDATE skips the ORM flush events, so tell the cache directly
+    reviews.changed(db, item_ids)
+    db.commit()
+
+    done = set(updated)
+    errors = {review_id: f"Review not found or already {status.value}"
+              for review_id in review_ids if review_id not in done}
+    return {"updated": sorted(done), "errors": errors}
+
+
+def pending_reviews(db: Session, after: int | None = None, limit: int = 50) -> list[Review]:
+    """Oldest pending reviews first, keyset-paged on (status, id) so it's an index range scan"""
+    query = db.query(Review).filter(Review.status == ReviewStatus.PENDING)
+    if after is not None:
+        query = query.filter(Review.id > after)
+    return query.order_by(Review.id).limit(limit).all()
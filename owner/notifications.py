@@ -1,46 +1,242 @@
-import os
-from twilio.rest import Client
-from dotenv import load_dotenv
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
 
-load_dotenv()
+from config import providers
+from config.config import settings
+from middleware import circuit_breaker
+from middleware.circuit_breaker import CircuitOpenError
+from middleware.log import request_id_var
 
-client = Client(
-    os.getenv("TWILIO_ACCOUNT_SID"),
-    os.getenv("TWILIO_AUTH_TOKEN"),
-)
+logger = logging.getLogger(__name__)
 
-TWILIO_NUMBER = os.getenv("TWILIO_PHONE_NUMBER")
+TWILIO_NUMBER = settings.TWILIO_PHONE_NUMBER
+MAX_SMS_BODY = 1600  # Twilio rejects longer bodies
 
+_PHONE_PUNCTUATION = str.maketrans("", "", "- ()")
 
-def send_sms(to_phone: str, message: str):
-    """
-    Send SMS from your Twilio number to customer's number
 
-    Args:
-        to_phone: Customer's phone (e.g., "555-1234" or "+15551234567")
-        message: Text message to send
-    """
-    try:
-        # Format customer's phone number (add +1 for US)
-        if not to_phone.startswith('+'):
-            # Remove dashes, spaces, parentheses from #
-            clean_phone = to_phone.replace("-", "").replace(" ", "").replace("(", "").replace(")", "")
-            to_phone = f'+1{clean_phone}'
-
-        # Sends SMS FROM Twilio # to customer
-        msg = client.messages.create(
+@lru_cache(maxsize=10_000)
+def normalize_phone(phone: str) -> str:
+    """"555-1234" / "(555) 123-4567" -> E.164 ("+1..."), numbers already starting with + are kept"""
+    if phone.startswith('+'):
+        return phone
+    return f"+1{phone.translate(_PHONE_PUNCTUATION)}"
+
+
+def _is_outage(exc: Exception) -> bool:
+    # a bad number (4xx) is the message's problem, not Twilio being down
+    from twilio.base.exceptions import TwilioRestException
+    return not (isinstance(exc, TwilioRestException) and exc.status < 500 and exc.status != 429)
+
+
+twilio_breaker = circuit_breaker.register("twilio", timeout=settings.TWILIO_TIMEOUT_SECONDS, is_failure=_is_outage)
+
+
+class TwilioTransport:
+    def send(self, to_phone: str, body: str) -> str:
+        msg = providers.get("twilio").messages.create(
             to=to_phone,  # Customer's phone
             from_=TWILIO_NUMBER,  # Twilio number
-            body=message
+            body=body
         )
-
-        print(f"✅ SMS sent to {to_phone}")
-        print(f"   Message SID: {msg.sid}")
         return msg.sid
 
-    except Exception as e:
-        print(f"❌ Failed to send SMS: {str(e)}")
-        return None
+
+class FakeTransport:
+    """Stand-in for Twilio when benchmarking locally, sleeps `latency` seconds per message"""
+
+    def __init__(self, latency: float = 0.05):
+        self.latency = latency
+        self.sent = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def send(self, to_phone: str, body: str) -> str:
+        time.sleep(self.latency)
+        with self._lock:
+            self.sent.append((to_phone, body))
+            return f"SMfake{next(self._ids)}"
+
+
+def _masked(phone: str) -> str:
+    # enough to tell texts apart in the logs without writing customers' numbers out
+    return f"***{phone[-4:]}"
+
+
+class _Batch:
+    def __init__(self, message: str):
+        self.messages = [message]
+        self.size = len(message)
+        self.future = Future()
+        self.created = time.monotonic()
+        self.request_id = request_id_var.get()  # the sender threads don't share the request's context
+
+
+class SmsDispatcher:
+    """
+    Sends SMS on a bounded thread pool instead of the caller's thread
+
+    Messages for the same phone that arrive within `coalesce_window` seconds are joined
+    into one text. submit() returns a Future that resolves to the message SID (or None).
+    While Twilio's circuit is open, batches are held and retried once it half-opens,
+    for up to SMS_RETRY_MAX_SECONDS.
+    """
+
+    def __init__(self, transport=None, concurrency: int | None = None, coalesce_window: float | None = None,
+                 breaker=None):
+        self.transport = transport or TwilioTransport()
+        self.breaker = breaker or twilio_breaker
+        self.coalesce_window = settings.SMS_COALESCE_SECONDS if coalesce_window is None else coalesce_window
+        self.executor = ThreadPoolExecutor(concurrency or settings.SMS_CONCURRENCY, thread_name_prefix="sms")
+        self._pending = {}  # phone -> _Batch waiting for its window to close
+        self._deadlines = deque()  # (deadline, phone), in the order batches were opened
+        self._cond = threading.Condition()
+        self._flusher = None
+        self._held = []  # batches waiting for the Twilio circuit to close
+        self._retry_timer = None
+        self._closed = False
+
+    def submit(self, to_phone: str, message: str) -> Future:
+        to_phone = normalize_phone(to_phone)
+        if self.coalesce_window <= 0:
+            batch = _Batch(message)
+            self._dispatch(to_phone, batch)
+            return batch.future
+
+        with self._cond:
+            batch = self._pending.get(to_phone)
+            if batch is not None and batch.size + len(message) + 1 <= MAX_SMS_BODY:
+                batch.messages.append(message)
+                batch.size += len(message) + 1
+                return batch.future
+
+            if batch is not None:
+                # too long to merge, send what we have and start a new batch
+                self._pending.pop(to_phone)
+                self._dispatch(to_phone, batch)
+
+            batch = _Batch(message)
+            self._pending[to_phone] = batch
+            self._deadlines.append((time.monotonic() + self.coalesce_window, to_phone, batch))
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="sms-flusher", daemon=True)
+                self._flusher.start()
+            self._cond.notify()
+        return batch.future
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                while not self._deadlines:
+                    self._cond.wait()
+                deadline, to_phone, batch = self._deadlines[0]
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                self._deadlines.popleft()
+                if self._pending.get(to_phone) is not batch:
+                    continue  # already sent early
+                del self._pending[to_phone]
+            self._dispatch(to_phone, batch)
+
+    def flush(self):
+        """Send every batch that is still waiting for its window"""
+        with self._cond:
+            batches = list(self._pending.items())
+            self._pending.clear()
+        for to_phone, batch in batches:
+            self._dispatch(to_phone, batch)
+
+    def _dispatch(self, to_phone: str, batch: _Batch):
+        # a retry timer or the flusher can still fire after close(), the executor is gone by then
+        with self._cond:
+            if not self._closed:
+                self.executor.submit(self._send, to_phone, batch)
+                return
+        batch.future.set_result(None)
+
+    def close(self):
+        self.flush()
+        with self._cond:
+            self._closed = True
+            if self._retry_timer is not None:
+                self._retry_timer.cancel()
+                self._retry_timer = None
+            held, self._held = self._held, []
+        for _, batch in held:
+            batch.future.set_result(None)
+        self.executor.shutdown(wait=True)
+
+    def _hold(self, to_phone: str, batch: _Batch, retry_after: float):
+        if time.monotonic() - batch.created > settings.SMS_RETRY_MAX_SECONDS:
+            logger.error("Gave up on SMS, Twilio unavailable",
+                         extra={"to": _masked(to_phone), "request_id": batch.request_id})
+            batch.future.set_result(None)
+            return
+        with self._cond:
+            if self._closed:
+                batch.future.set_result(None)
+                return
+            self._held.append((to_phone, batch))
+            if self._retry_timer is None:
+                self._retry_timer = threading.Timer(retry_after, self._release_held)
+                self._retry_timer.daemon = True
+                self._retry_timer.start()
+
+    def _release_held(self):
+        with self._cond:
+            held, self._held = self._held, []
+            self._retry_timer = None
+        for to_phone, batch in held:
+            self._dispatch(to_phone, batch)
+
+    def _send(self, to_phone: str, batch: _Batch):
+        started = time.perf_counter()
+        try:
+            sid = self.breaker.call(self.transport.send, to_phone, "\n".join(batch.messages))
+            logger.info("SMS sent", extra={
+                "sampled": True,
+                "sid": sid,
+                "to": _masked(to_phone),
+                "messages": len(batch.messages),
+                "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                "request_id": batch.request_id,
+            })
+            batch.future.set_result(sid)
+        except CircuitOpenError as e:
+            self._hold(to_phone, batch, e.retry_after)
+        except Exception as e:
+            logger.error(f"Failed to send SMS: {e}", extra={"to": _masked(to_phone), "request_id": batch.request_id})
+            batch.future.set_result(None)
+
+
+providers.register("sms", SmsDispatcher)
+
+
+def flush_sms():
+    """Send anything still waiting in a coalescing window (called on shutdown)"""
+    dispatcher = providers.peek("sms")
+    if dispatcher is not None:
+        dispatcher.close()
+
+
+def send_sms(to_phone: str, message: str) -> Future:
+    """
+    Queue an SMS from your Twilio number to the customer's number
+
+    Args:
+        to_phone: Customer's phone (e.g., "555-1234" or "+15551234567")
+        message: Text message to send
+
+    Returns a Future with the message SID (None if sending failed)
+    """
+    return providers.get("sms").submit(to_phone, message)
 
 
 # Your notification functions (unchanged)
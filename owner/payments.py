@@ -1,12 +1,23 @@
-import os
-import stripe
-from dotenv import load_dotenv
-load_dotenv()
-stripe.api_key = os.getenv('SECRET_STR_KEY')
+import time
+
+from config import providers
+from config.config import settings
+from middleware import circuit_breaker
+
+
+def _is_outage(exc: Exception) -> bool:
+    # card declines and bad requests are the caller's problem, not Stripe being down
+    stripe = providers.get("stripe")
+    return isinstance(exc, (stripe.error.APIConnectionError, stripe.error.APIError, stripe.error.RateLimitError))
+
+
+stripe_breaker = circuit_breaker.register("stripe", timeout=settings.STRIPE_TIMEOUT_SECONDS, is_failure=_is_outage)
 
 class StripeService:
     @staticmethod
-    def create_checkout(order_id: int, items: list, phone:str, success_url:str, cancel_url:str) -> str:
+    def create_checkout(order_id: int, items: list, phone:str, success_url:str, cancel_url:str,
+                        store_id: int | None = None) -> str:
+        stripe = providers.get("stripe")
         try:
             line_items = []
             for item in items:
@@ -20,15 +31,19 @@ class StripeService:
                     },
                     'quantity': item['quantity'],
                 })
-            session = stripe.checkout.Session.create(
+            session = stripe_breaker.call(
+                    stripe.checkout.Session.create,
                     payment_method_types=['card'],
                     line_items=line_items,
                     mode='payment',
                     success_url=success_url,
                     cancel_url=cancel_url,
+                    # the order holds stock until it's paid, don't let an abandoned page keep it
+                    expires_at=int(time.time()) + settings.CHECKOUT_EXPIRES_MINUTES * 60,
                     metadata={
                         'phone': phone,
-                        'order_id': order_id
+                        'order_id': order_id,
+                        'store_id': store_id if store_id is not None else settings.DEFAULT_STORE_ID,
                     }
                 )
             return session.url
@@ -37,8 +52,10 @@ class StripeService:
 
     @staticmethod
     def create_refund(pay_intent_id: str):
+        stripe = providers.get("stripe")
         try:
-            refund = stripe.Refund.create(
+            refund = stripe_breaker.call(
+                stripe.Refund.create,
                 payment_intent=pay_intent_id
             )
             return refund.amount / 100
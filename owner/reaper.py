@@ -0,0 +1,96 @@
+"""
+Clean-up of abandoned checkouts
+
+create_order writes the order (and takes its stock) before sending the customer to
+Stripe. Checkout sessions expire after CHECKOUT_EXPIRES_MINUTES and the
+checkout.session.expired webhook deletes the order then. For a page closed without
+hitting /payment-cancelled and a missed webhook, a background job deletes unpaid orders
+older than REAPER_TTL_MINUTES in small batches, giving their stock back.
+"""
+import logging
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, update
+from sqlalchemy.orm import Session
+
+from config.config import settings
+from Database import inventory
+from Database.dbConnect import shards
+from Database.dbModels import Order, OrderItem, OrderStatus
+from middleware import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def delete_unpaid_orders(db: Session, order_ids: list[int]) -> int:
+    """
+    Bulk delete the given orders and their line items if they are still unpaid, caller commits
+
+    The orders are claimed with one guarded UPDATE ... RETURNING first, so an order the
+    webhook marks paid after the caller picked it is left alone, and only the claimed
+    orders give their stock back. (Claim then delete, rather than deleting the orders
+    straight away: order_items has to go before the orders it points at.)
+    """
+    if not order_ids:
+        return 0
+    ids = db.execute(
+        update(Order)
+        .where(Order.id.in_(order_ids), Order.payment_status == "pending")
+        .values(payment_status="expired")
+        .returning(Order.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    if not ids:
+        return 0
+
+    inventory.release(db, ids)
+    items = db.execute(delete(OrderItem).where(OrderItem.order_id.in_(ids))).rowcount
+    deleted = db.execute(
+        delete(Order).where(Order.id.in_(ids), Order.payment_status == "expired")
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    metrics.inc("unpaid_orders_deleted_total", deleted)
+    metrics.inc("unpaid_order_items_deleted_total", items)
+    return deleted
+
+
+def reap_abandoned_checkouts() -> int:
+    """Delete unpaid orders older than the TTL in every store, one short transaction per batch"""
+    cutoff = datetime.utcnow() - timedelta(minutes=settings.REAPER_TTL_MINUTES)
+    started = time.monotonic()
+    total = sum(_reap_store(store_id, cutoff) for store_id in shards.store_ids())
+
+    metrics.inc("reaper_runs_total")
+    metrics.inc("reaper_orders_reaped_total", total)
+    metrics.observe("reaper_run", time.monotonic() - started)
+    metrics.set_gauge("reaper_last_run_timestamp", time.time())
+    if total:
+        logger.info(f"Reaped {total} abandoned checkouts older than {cutoff:%Y-%m-%d %H:%M}")
+    return total
+
+
+def _reap_store(store_id: int, cutoff: datetime) -> int:
+    total = 0
+    while True:
+        db = shards.session(store_id)
+        try:
+            ids = [
+                order_id for (order_id,) in db.query(Order.id).filter(
+                    Order.status == OrderStatus.PENDING,
+                    Order.payment_status == "pending",
+                    Order.created_at < cutoff,
+                ).order_by(Order.id).limit(settings.REAPER_BATCH_SIZE)
+            ]
+            if not ids:
+                break
+            total += delete_unpaid_orders(db, ids)
+            db.commit()
+        finally:
+            db.close()
+
+        if len(ids) < settings.REAPER_BATCH_SIZE:
+            break
+        # let other writers take the lock between batches
+        time.sleep(settings.REAPER_BATCH_PAUSE)
+    return total
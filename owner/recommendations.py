@@ -0,0 +1,253 @@
+"""
+"Frequently bought together" from paid orders
+
+Each worker keeps a sparse item x item co-occurrence matrix per store in memory: per item,
+a sorted array of the items bought in the same order and a parallel array of how many
+paid orders had both. GET /items/{item_id}/recommendations reads the top of one row, so it never
+self-joins order_items.
+
+The matrix follows orders.paid_at: every RECOMMENDATIONS_REFRESH_SECONDS refresh() adds
+the orders paid since its watermark. It stops RECOMMENDATIONS_SYNC_LAG_SECONDS short of
+now, so a webhook transaction that is still committing is picked up next time instead of
+being skipped. Snapshots (matrix + watermark) are written to
+RECOMMENDATIONS_SNAPSHOT_PATH (".storeN" appended for stores other than the default)
+every RECOMMENDATIONS_SNAPSHOT_SECONDS, so a restart loads the file and only catches up
+on the gap. Without a snapshot the first refresh builds
+from every paid order. Rebuild the snapshot from scratch with:
+
+    python -m owner.recommendations rebuild
+"""
+import logging
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import literal_column, select, union_all
+from sqlalchemy.orm import Session
+
+from config.config import settings
+from Database.dbConnect import shards
+from Database.dbModels import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b"JBREC1\n"
+_HEADER = struct.Struct("<dI")  # watermark (epoch seconds, NaN = none), row count
+_ROW = struct.Struct("<qI")  # item id, neighbour count
+
+
+class CoOccurrence:
+    """Sparse symmetric co-purchase counts, one pair of arrays per item"""
+
+    def __init__(self):
+        self._rows = {}  # item_id -> (array('i') neighbour ids, sorted; array('q') counts)
+        self._top = {}  # item_id -> [(item_id, count), ...] best first, dropped when the row changes
+        self._lock = threading.Lock()
+        self.watermark = None  # every order paid up to here is counted
+
+    def __len__(self):
+        return len(self._rows)
+
+    def add(self, pairs: dict):
+        """Merge {(a, b): orders} into the matrix; pass each unordered pair once"""
+        by_row = {}
+        for (a, b), count in pairs.items():
+            by_row.setdefault(a, {})[b] = count
+            by_row.setdefault(b, {})[a] = count
+        with self._lock:
+            for item_id, deltas in by_row.items():
+                ids, counts = self._rows.get(item_id) or (array("i"), array("q"))
+                for other in sorted(deltas):
+                    i = bisect_left(ids, other)
+                    if i < len(ids) and ids[i] == other:
+                        counts[i] += deltas[other]
+                    else:
+                        ids.insert(i, other)
+                        counts.insert(i, deltas[other])
+                self._rows[item_id] = (ids, counts)
+                self._top.pop(item_id, None)
+
+    def top(self, item_id: int, limit: int) -> list[tuple[int, int]]:
+        """[(item_id, orders together), ...] most frequent first"""
+        best = self._top.get(item_id)
+        if best is None:
+            with self._lock:
+                row = self._rows.get(item_id)
+                if row is None:
+                    return []
+                ids, counts = row
+                best = sorted(zip(ids, counts), key=lambda pair: (-pair[1], pair[0]))[:settings.RECOMMENDATIONS_MAX]
+                self._top[item_id] = best
+        return best[:limit]
+
+    def save(self, path: str):
+        """Write the matrix and watermark atomically (other workers may write the same file)"""
+        with self._lock:
+            rows = [(item_id, ids.tobytes(), counts.tobytes(), len(ids)) for item_id, (ids, counts) in self._rows.items()]
+            watermark = self.watermark
+        stamp = float("nan") if watermark is None else watermark.replace(tzinfo=timezone.utc).timestamp()
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(_MAGIC)
+            f.write(_HEADER.pack(stamp, len(rows)))
+            for item_id, ids, counts, n in rows:
+                f.write(_ROW.pack(item_id, n))
+                f.write(ids)
+                f.write(counts)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "CoOccurrence":
+        matrix = cls()
+        with open(path, "rb") as f:
+            if f.read(len(_MAGIC)) != _MAGIC:
+                raise ValueError(f"{path} is not a recommendations snapshot")
+            stamp, row_count = _HEADER.unpack(f.read(_HEADER.size))
+            for _ in range(row_count):
+                item_id, n = _ROW.unpack(f.read(_ROW.size))
+                ids, counts = array("i"), array("q")
+                ids.fromfile(f, n)
+                counts.fromfile(f, n)
+                matrix._rows[item_id] = (ids, counts)
+        if stamp == stamp:  # not NaN
+            matrix.watermark = datetime.fromtimestamp(stamp, timezone.utc).replace(tzinfo=None)
+        return matrix
+
+
+def _pairs(order_lines) -> dict:
+    """Count unordered item pairs over (order_id, item_id) rows sorted by order_id"""
+    pairs = {}
+    current, items = None, set()
+
+    def flush():
+        ordered = sorted(items)
+        for i, a in enumerate(ordered):
+            for b in ordered[i + 1:]:
+                pairs[(a, b)] = pairs.get((a, b), 0) + 1
+
+    for order_id, item_id in order_lines:
+        if order_id != current:
+            flush()
+            current, items = order_id, set()
+        items.add(item_id)
+    flush()
+    return pairs
+
+
+def _lines(order, line, condition):
+    return (
+        select(line.order_id, line.item_id)
+        .join(order, order.id == line.order_id)
+        .where(order.payment_status == "paid", condition)
+    )
+
+
+def _paid_lines(db: Session, since: datetime | None, until: datetime):
+    if since is None:
+        # full build: archived orders too, and orders paid before paid_at existed
+        query = union_all(
+            _lines(Order, OrderItem, (Order.paid_at <= until) | Order.paid_at.is_(None)),
+            _lines(ArchivedOrder, ArchivedOrderItem, (ArchivedOrder.paid_at <= until) | ArchivedOrder.paid_at.is_(None)),
+        ).order_by(literal_column("order_id"))
+    else:
+        # anything paid since the last sync is still far too new to be archived
+        query = _lines(Order, OrderItem, Order.paid_at > since).where(Order.paid_at <= until).order_by(OrderItem.order_id)
+    return db.execute(query.execution_options(yield_per=10_000))
+
+
+def catch_up(db: Session, matrix: CoOccurrence) -> int:
+    """Add orders paid since matrix.watermark, returns how many item pairs changed"""
+    until = datetime.utcnow() - timedelta(seconds=settings.RECOMMENDATIONS_SYNC_LAG_SECONDS)
+    pairs = _pairs(_paid_lines(db, matrix.watermark, until))
+    matrix.add(pairs)
+    matrix.watermark = until
+    return len(pairs)
+
+
+def rebuild(db: Session) -> CoOccurrence:
+    """A new matrix from every paid order"""
+    matrix = CoOccurrence()
+    catch_up(db, matrix)
+    return matrix
+
+
+_matrices = {}  # store_id -> CoOccurrence, every store has its own menu and orders
+_last_snapshot = time.monotonic()
+
+
+def _matrix(store_id: int) -> CoOccurrence:
+    matrix = _matrices.get(store_id)
+    if matrix is None:
+        matrix = _matrices.setdefault(store_id, CoOccurrence())
+    return matrix
+
+
+def snapshot_path(store_id: int) -> str:
+    path = settings.RECOMMENDATIONS_SNAPSHOT_PATH
+    return path if store_id == settings.DEFAULT_STORE_ID else f"{path}.store{store_id}"
+
+
+def recommend(item_id: int, limit: int, store_id: int) -> list[tuple[int, int]]:
+    return _matrix(store_id).top(item_id, limit)
+
+
+def load():
+    """Warm start every store from its snapshot, where there is a usable one"""
+    for store_id in shards.store_ids():
+        path = snapshot_path(store_id)
+        if not os.path.exists(path):
+            continue
+        try:
+            _matrices[store_id] = CoOccurrence.load(path)
+        except (OSError, ValueError, struct.error, EOFError) as e:
+            logger.warning(f"Ignoring recommendations snapshot {path}: {e}")
+            continue
+        logger.info("Recommendations loaded from snapshot", extra={
+            "store_id": store_id, "items": len(_matrices[store_id]), "watermark": _matrices[store_id].watermark,
+        })
+
+
+def refresh(snapshot: bool = True):
+    """Periodic job: add newly paid orders in every store, snapshot when one is due (and `snapshot`)"""
+    for store_id in shards.store_ids():
+        db = shards.session(store_id)
+        try:
+            catch_up(db, _matrix(store_id))
+        finally:
+            db.close()
+    if snapshot and time.monotonic() - _last_snapshot >= settings.RECOMMENDATIONS_SNAPSHOT_SECONDS:
+        save()
+
+
+def save():
+    global _last_snapshot
+    for store_id, matrix in list(_matrices.items()):
+        matrix.save(snapshot_path(store_id))
+    _last_snapshot = time.monotonic()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("usage: python -m owner.recommendations rebuild")
+
+    from middleware.log import setup_logging, stop_logging
+
+    setup_logging()
+    for store_id in shards.store_ids():
+        started = time.perf_counter()
+        db = shards.session(store_id)
+        try:
+            _matrices[store_id] = rebuild(db)
+        finally:
+            db.close()
+        logger.info("Recommendations rebuilt", extra={
+            "store_id": store_id, "items": len(_matrices[store_id]), "path": snapshot_path(store_id),
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+        })
+    save()
+    stop_logging()
@@ -0,0 +1,127 @@
+"""
+Production entry point
+
+    python server.py --workers 4 --port 8000
+
+The app is imported and the database initialized once in the parent, then N workers
+are forked and share the listening socket. On SIGTERM each worker reports 503
+"draining" on /health for DRAIN_SECONDS, then stops accepting and finishes in-flight
+requests (up to GRACEFUL_TIMEOUT). Jobs that rewrite shared rows (checkout reaper, order
+archive, daily restock, ...) only run in worker 0, a restarted worker keeps its index.
+Use `python main.py` for local development.
+"""
+import argparse
+import logging
+import os
+import signal
+import sys
+import threading
+
+import uvicorn
+
+from config.config import settings
+
+logger = logging.getLogger("uvicorn.error")  # configured by uvicorn.Config
+
+
+class DrainingServer(uvicorn.Server):
+    def __init__(self, config, app):
+        super().__init__(config)
+        self.app = app
+        self.draining = False
+
+    def handle_exit(self, sig, frame):
+        if self.draining or sig != signal.SIGTERM:
+            return super().handle_exit(sig, frame)
+
+        self.draining = True
+        self.app.state.draining = True
+        threading.Timer(settings.DRAIN_SECONDS, super().handle_exit, (sig, frame)).start()
+
+
+def run_worker(config, sock, app):
+    from Database.dbConnect import engine, replicas, shards
+
+    # connections opened by the parent must not be shared with the forked worker
+    engine.dispose(close=False)
+    for replica in [*replicas.engines, *shards.engines.values()]:
+        replica.dispose(close=False)
+
+    DrainingServer(config, app).run(sockets=[sock])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run J-Bites with multiple worker processes")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=settings.WEB_WORKERS or os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    # split the database connection budget between workers (must happen before the engine is built)
+    if not settings.DB_POOL_SIZE:
+        settings.__class__.DB_POOL_SIZE = max(1, settings.DB_POOL_TOTAL // args.workers)
+    # an admin logged in on one worker must stay logged in on the others
+    if args.workers > 1 and settings.ADMIN_SESSION_BACKEND == "memory":
+        settings.__class__.ADMIN_SESSION_BACKEND = "sqlite"
+
+    if not hasattr(os, "fork"):
+        # no preload on platforms without fork, uvicorn spawns and imports main in each worker
+        uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers)
+        return
+
+    from main import app, init_database
+
+    init_database()
+    app.state.database_initialized = True
+
+    config = uvicorn.Config(app, host=args.host, port=args.port,
+                            timeout_graceful_shutdown=settings.GRACEFUL_TIMEOUT)
+    sock = config.bind_socket()
+
+    children = {}  # pid -> worker index
+    stopping = False
+
+    def spawn(index: int):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            app.state.worker_index = index
+            try:
+                run_worker(config, sock, app)
+            finally:
+                os._exit(0)
+        children[pid] = index
+
+    def shutdown(sig, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    for index in range(args.workers):
+        spawn(index)
+    logger.info(f"Started {args.workers} workers on {args.host}:{args.port} (pool size {settings.DB_POOL_SIZE}/worker)")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index = children.pop(pid, None)
+        if index is not None and not stopping:
+            logger.warning(f"Worker {pid} exited with status {status}, restarting")
+            spawn(index)
+
+    sock.close()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
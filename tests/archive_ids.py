@@ -0,0 +1,98 @@
+"""
+Archived order ids are never handed out again
+
+    python tests/archive_ids.py
+
+Builds throwaway SQLite databases and, for a fresh one and for one created before the
+hot tables had AUTOINCREMENT (upgraded by archive.ensure_autoincrement), archives the
+newest order, places another and archives that too. Exits non-zero if the new order
+reuses an archived id or the second archive run fails.
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_db_dir = tempfile.mkdtemp(prefix="jbites-archive-")
+os.environ["DB_URL"] = f"sqlite:///{_db_dir}/archive_ids.db"
+os.environ.setdefault("SECRET_KEY", "archive-ids")
+os.environ["ORDER_GROUP_COMMIT"] = "false"
+
+from sqlalchemy import MetaData  # noqa: E402
+
+from Database.dbConnect import Base, SessionLocal, engine  # noqa: E402
+from Database.dbModels import ArchivedOrder, Item, Order, OrderCreate, OrderStatus, User  # noqa: E402
+from owner.archive import archive_orders, ensure_autoincrement  # noqa: E402
+from owner.ingest import write_order  # noqa: E402
+
+
+def place_order(item_id: int) -> int:
+    db = SessionLocal()
+    try:
+        order = write_order(db, 1, OrderCreate(phone_num="+15555550100", username="Customer",
+                                               items=[{"item_id": item_id, "quantity": 1}]))
+        db.commit()
+        return order["order_id"]
+    finally:
+        db.close()
+
+
+def archive(order_id: int):
+    db = SessionLocal()
+    try:
+        db.query(Order).filter(Order.id == order_id).update(
+            {"status": OrderStatus.DONE, "created_at": datetime.utcnow() - timedelta(days=365)})
+        archive_orders(db, [order_id])
+        db.commit()
+    finally:
+        db.close()
+
+
+def check(label: str, legacy: bool) -> list[str]:
+    Base.metadata.drop_all(engine)
+    if legacy:
+        # the schema as it was before: hot tables without AUTOINCREMENT
+        metadata = MetaData()
+        for table in Base.metadata.sorted_tables:
+            table.to_metadata(metadata).dialect_options["sqlite"]["autoincrement"] = False
+        metadata.create_all(engine)
+    else:
+        Base.metadata.create_all(engine)
+
+    db = SessionLocal()
+    db.add(User(name="Customer", email="c@archive.test", password="x"))
+    item = Item(name="Tres Leche", price=6.5)
+    db.add(item)
+    db.commit()
+    item_id = item.id
+    db.close()
+
+    first = place_order(item_id)
+    archive(first)
+    ensure_autoincrement(engine)
+    second = place_order(item_id)
+    failures = []
+    if second == first:
+        failures.append(f"{label}: new order reused archived id {first}")
+    try:
+        archive(second)
+    except Exception as e:
+        failures.append(f"{label}: archiving the next order failed: {e}")
+
+    db = SessionLocal()
+    archived = sorted(order_id for (order_id,) in db.query(ArchivedOrder.id))
+    db.close()
+    print(f"{label}: archived {first}, next order got {second}, archive holds {archived}")
+    return failures
+
+
+def main():
+    failures = check("fresh", legacy=False) + check("upgraded", legacy=True)
+    if failures:
+        sys.exit("FAIL: " + "; ".join(failures))
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Circuit breaker check against local fake providers that inject latency and errors
+
+    python tests/circuit_breakers.py
+
+1. breaker state machine: opens on failure rate, fails fast, half-opens, closes/reopens,
+   slow successes count against the timeout budget
+2. SMS: texts sent while the fake Twilio is down are held and delivered once it recovers
+3. checkout: a failing fake Stripe trips the breaker, then POST /orders answers 503 with
+   Retry-After without calling Stripe, and /health + /metrics show the open circuit
+
+Exits non-zero on the first failed check.
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_db_dir = tempfile.mkdtemp(prefix="jbites-breakers-")
+os.environ["DB_URL"] = f"sqlite:///{_db_dir}/breakers.db"
+os.environ.setdefault("SECRET_KEY", "breakers")
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["ENABLE_SMS"] = "false"
+os.environ["BREAKER_MIN_CALLS"] = "3"
+os.environ["BREAKER_OPEN_SECONDS"] = "1"
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from config import providers  # noqa: E402
+from middleware.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError  # noqa: E402
+from owner.notifications import SmsDispatcher  # noqa: E402
+
+
+def check(condition: bool, message: str):
+    if not condition:
+        sys.exit(f"FAIL: {message}")
+    print(f"ok   {message}")
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def fail():
+    raise ConnectionError("provider down")
+
+
+def state_machine():
+    clock = FakeClock()
+    breaker = CircuitBreaker("fake", timeout=2.0, window=10, min_calls=4, failure_rate=0.5, open_seconds=30, clock=clock)
+
+    for _ in range(3):
+        try:
+            breaker.call(fail)
+        except ConnectionError:
+            pass
+    check(breaker.state == CLOSED, "stays closed below min_calls")
+    try:
+        breaker.call(fail)
+    except ConnectionError:
+        pass
+    check(breaker.state == OPEN, "opens at the failure rate")
+
+    calls = []
+    try:
+        breaker.call(calls.append, 1)
+        check(False, "open circuit rejects calls")
+    except CircuitOpenError as e:
+        check(not calls and e.retry_after == 30, "open circuit rejects without calling the provider")
+
+    clock.now += 30
+    check(breaker.state == HALF_OPEN, "half-opens after open_seconds")
+    try:
+        breaker.call(fail)
+    except ConnectionError:
+        pass
+    check(breaker.state == OPEN, "failed trial reopens")
+
+    clock.now += 30
+    breaker.call(lambda: None)
+    check(breaker.state == CLOSED, "successful trial closes")
+
+    def slow():
+        clock.now += 5  # over the 2s budget
+    for _ in range(4):
+        breaker.call(slow)
+    check(breaker.state == OPEN, "slow calls count as failures")
+
+
+class FlakyTransport:
+    """Fake Twilio: fails until `down_until`, then answers after `latency` seconds"""
+
+    def __init__(self, down_for: float, latency: float = 0.01):
+        self.down_until = time.monotonic() + down_for
+        self.latency = latency
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def send(self, to_phone, body):
+        time.sleep(self.latency)
+        if time.monotonic() < self.down_until:
+            raise ConnectionError("twilio down")
+        with self._lock:
+            self.sent.append(to_phone)
+            return f"SMfake{len(self.sent)}"
+
+
+def sms_held_until_recovery():
+    transport = FlakyTransport(down_for=0.5)
+    breaker = CircuitBreaker("fake-twilio", window=10, min_calls=3, failure_rate=0.5, open_seconds=0.3)
+    dispatcher = SmsDispatcher(transport, concurrency=1, coalesce_window=0, breaker=breaker)
+
+    futures = [dispatcher.submit(f"+1555000{n:04d}", "order ready") for n in range(20)]
+    sids = [future.result(timeout=10) for future in futures]
+    dispatcher.close()
+
+    lost = sids.count(None)
+    check(lost <= 3, f"texts sent during the outage were held, not dropped ({lost} lost before the circuit opened)")
+    check(len(transport.sent) == 20 - lost, "held texts delivered once the provider recovered")
+
+
+class FakeStripe:
+    class error:
+        class StripeError(Exception):
+            pass
+
+        class APIConnectionError(StripeError):
+            pass
+
+        class APIError(StripeError):
+            pass
+
+        class RateLimitError(StripeError):
+            pass
+
+    calls = 0
+
+    class checkout:
+        class Session:
+            @staticmethod
+            def create(**kwargs):
+                FakeStripe.calls += 1
+                time.sleep(0.05)
+                raise FakeStripe.error.APIConnectionError("stripe down")
+
+
+def checkout_fails_fast():
+    from Database.dbConnect import Base, SessionLocal, engine
+    from Database.dbModels import Item, User
+    from middleware.security import create_access_token
+
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    db.add(Item(name="Empanada", price=3.5))
+    db.add(User(name="Customer", email="c@breakers.test", password="x"))
+    db.commit()
+    db.close()
+
+    providers.override("stripe", FakeStripe)
+    import main as app_module
+
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'c@breakers.test'})}"}
+    order = {"phone_num": "+15555550100", "username": "Customer", "items": [{"item_id": 1, "quantity": 1}]}
+    with TestClient(app_module.app) as client:
+        statuses = [client.post("/orders", json=order, headers=headers).status_code for _ in range(3)]
+        check(statuses == [500, 500, 500], "provider errors surface as 500 until the breaker trips")
+
+        started = time.perf_counter()
+        response = client.post("/orders", json=order, headers=headers)
+        elapsed = time.perf_counter() - started
+        check(response.status_code == 503 and "Retry-After" in response.headers, "open circuit answers 503 + Retry-After")
+        check(FakeStripe.calls == 3 and elapsed < 0.05, f"without calling Stripe ({elapsed * 1000:.1f} ms)")
+
+        check(client.get("/health").json()["circuits"]["stripe"] == OPEN, "/health reports the open circuit")
+        check('circuit_state{provider="stripe"} 2' in client.get("/metrics").text, "/metrics reports the open circuit")
+
+        time.sleep(1.1)
+        check(client.get("/health").json()["circuits"]["stripe"] == HALF_OPEN, "half-open after BREAKER_OPEN_SECONDS")
+
+
+if __name__ == "__main__":
+    state_machine()
+    sms_held_until_recovery()
+    checkout_fails_fast()
+    print("OK")
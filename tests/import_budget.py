@@ -0,0 +1,64 @@
+"""
+Cold-import budget check for the app
+
+    python tests/import_budget.py              # budget from IMPORT_BUDGET_MS (default 800)
+    python tests/import_budget.py --budget-ms 600
+
+Runs `python -X importtime -c "import main"` in a fresh interpreter and exits non-zero
+if the cumulative import time of `main` is over budget. Needs the same env as the app
+(DB_URL, SECRET_KEY). Takes the best of a few runs to smooth out disk cache noise.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(module: str) -> tuple[int, list[tuple[int, str]]]:
+    """Returns (cumulative microseconds for module, [(cumulative us, name)] of its slowest imports)"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        sys.exit(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    total = None
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        name = name[1:]  # nested imports are indented two spaces per level
+        if name == module:
+            total = int(cumulative_us)
+        elif name.startswith("  ") and not name.startswith("   "):
+            # direct imports of the top-level module
+            imports.append((int(cumulative_us), name.strip()))
+    if total is None:
+        sys.exit(f"no importtime entry for {module}")
+    return total, sorted(imports, reverse=True)[:10]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", "800")))
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    best, slowest = min(measure(args.module) for _ in range(args.runs))
+    best_ms = best / 1000
+
+    print(f"import {args.module}: {best_ms:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    for cumulative_us, name in slowest:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    if best_ms > args.budget_ms:
+        sys.exit(f"import budget exceeded by {best_ms - args.budget_ms:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
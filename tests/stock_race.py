@@ -0,0 +1,120 @@
+"""
+Concurrency check for sell-outs: many customers racing for the last few units
+
+    python tests/stock_race.py                      # 300 orders for the last 5 units
+    python tests/stock_race.py --orders 500 --stock 20 --quantity 2
+
+Builds a throwaway SQLite database, gives one item a small stock and fires --orders
+simultaneous POST /orders at it through the app (Stripe replaced by a local fake).
+Exits non-zero unless exactly as many orders succeed as the stock allows, every other
+one gets 409, stock never goes negative and /items flags the item once it hits zero.
+Then it cancels one unpaid order and checks its units come back.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_db_dir = tempfile.mkdtemp(prefix="jbites-race-")
+os.environ["DB_URL"] = f"sqlite:///{_db_dir}/stock_race.db"
+os.environ.setdefault("SECRET_KEY", "stock-race")
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["ENABLE_SMS"] = "false"
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from config import providers  # noqa: E402
+from Database.dbConnect import Base, SessionLocal, engine  # noqa: E402
+from Database.dbModels import Item, Order, User  # noqa: E402
+from middleware.security import create_access_token  # noqa: E402
+
+
+class FakeStripe:
+    class error:
+        StripeError = Exception
+
+    class checkout:
+        class Session:
+            @staticmethod
+            def create(**kwargs):
+                return SimpleNamespace(url=f"https://checkout.test/{kwargs['metadata']['order_id']}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=300)
+    parser.add_argument("--stock", type=int, default=5)
+    parser.add_argument("--quantity", type=int, default=1)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    item = Item(name="Tres Leche", price=6.5, daily_stock=args.stock)
+    db.add(item)
+    db.add_all(User(name=f"Customer {n}", email=f"c{n}@race.test", password="x") for n in range(args.orders))
+    db.commit()
+    item_id = item.id
+    db.close()
+
+    providers.override("stripe", FakeStripe)
+    import main as app_module
+
+    # wait until every request is ready, then release them together
+    start = threading.Barrier(args.orders)
+
+    with TestClient(app_module.app) as client:
+        def place_order(n):
+            token = create_access_token({"sub": f"c{n}@race.test"})
+            start.wait()
+            order = {
+                "phone_num": "+15555550100",
+                "username": f"Customer {n}",
+                "items": [{"item_id": item_id, "quantity": args.quantity}],
+            }
+            response = client.post("/orders", json=order, headers={"Authorization": f"Bearer {token}"})
+            return response.status_code
+
+        with ThreadPoolExecutor(max_workers=args.orders) as pool:
+            statuses = Counter(pool.map(place_order, range(args.orders)))
+
+        db = SessionLocal()
+        remaining = db.get(Item, item_id).remaining
+        orders = db.query(Order.id).all()
+        db.close()
+        listed = {row["id"]: row["available"] for row in client.get("/items").json()}
+
+        expected = min(args.orders, args.stock // args.quantity)
+        print(f"statuses: {dict(statuses)}  orders: {len(orders)}  remaining: {remaining}")
+        failures = []
+        if statuses[201] != expected or len(orders) != expected:
+            failures.append(f"expected {expected} orders, got {statuses[201]} responses / {len(orders)} rows")
+        if statuses[409] != args.orders - expected:
+            failures.append(f"expected {args.orders - expected} sold-out responses")
+        if remaining != args.stock - expected * args.quantity:
+            failures.append(f"stock ended at {remaining}")
+        if remaining == 0 and listed[item_id]:
+            failures.append("/items still shows the item as available")
+
+        # an abandoned checkout gives its units back
+        if orders:
+            client.get(f"/payment-cancelled?order_id={orders[0].id}", follow_redirects=False)
+            db = SessionLocal()
+            restored = db.get(Item, item_id).remaining
+            db.close()
+            if restored != remaining + args.quantity:
+                failures.append(f"cancelled order didn't restore stock ({remaining} -> {restored})")
+            elif client.get(f"/items/{item_id}").json()["available"] is not True:
+                failures.append("item still flagged sold out after stock came back")
+
+    if failures:
+        sys.exit("FAIL: " + "; ".join(failures))
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()